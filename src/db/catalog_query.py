@@ -0,0 +1,274 @@
+import os
+import sqlite3
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db.db_reader import Release, Track, normalise_path, release_of, track_from_row
+from db.facet_index import FACETS, MULTI_VALUE_FACETS
+from db.materialised_views import source_table
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Columns matched by the free text search
+SEARCH_COLUMNS = ("label", "catalog_number", "album_title", "track_artist", "track_title", "format", "year", "country", "file_location")
+
+# Columns a query can be ordered by
+ORDER_COLUMNS = {"track_id", "label", "catalog_number", "discogs_id", "album_title", "track_artist", "track_title", "format", "disc_number", "track_number", "year", "country", "file_location"}
+
+KeysetKey = Tuple[object, object]  # (value of the order column, track_id) of the last row of a page
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass
+class TrackQuery:
+    """
+    Filters over the uber_tracks rows, turned into parameterised SQL. All set filters are AND'ed together;
+    facet values are OR'ed within a facet, like the FacetIndex.
+    """
+
+    label: Optional[str] = None
+    discogs_id: Optional[int] = None
+    catalog_number: Optional[str] = None
+    facets: Dict[str, Iterable[str]] = field(default_factory=dict)
+    text: str = ""
+    order_by: str = "track_id"
+    descending: bool = False
+
+    def where(self) -> Tuple[str, list]:
+        """Returns the WHERE clause (empty if there is no filter) and its parameters."""
+        clauses = []
+        params: list = []
+        if self.label is not None:
+            clauses.append("label = ?")
+            params.append(self.label)
+        if self.discogs_id is not None:
+            clauses.append("discogs_id = ?")
+            params.append(self.discogs_id)
+        if self.catalog_number is not None:
+            clauses.append("catalog_number = ?")
+            params.append(self.catalog_number)
+
+        for facet, values in self.facets.items():
+            values = list(values)
+            if not values:
+                continue
+            if facet in MULTI_VALUE_FACETS:
+                # "House, Techno" matches House or Techno: compare whole items of the comma separated list
+                item_list = f"(',' || REPLACE(REPLACE(TRIM({facet}), ', ', ','), ' ,', ',') || ',')"
+                clauses.append("(" + " OR ".join(f"instr({item_list}, ',' || ? || ',') > 0" for _ in values) + ")")
+            else:
+                clauses.append(f"CAST({facet} AS TEXT) IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+        text = self.text.strip()
+        if text:
+            pattern = f"%{_escape_like(text)}%"
+            clauses.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ")")
+            params.extend([pattern] * len(SEARCH_COLUMNS))
+
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def __order_column(self) -> str:
+        if self.order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot order tracks by {self.order_by}")
+        return self.order_by
+
+    def __order_clause(self) -> str:
+        direction = "DESC" if self.descending else "ASC"
+        column = self.__order_column()
+        if column == "track_id":
+            return f" ORDER BY track_id {direction}"
+        return f" ORDER BY {column} {direction}, track_id {direction}"
+
+    def select_sql(self, source: str, limit: Optional[int] = None, offset: int = 0) -> Tuple[str, list]:
+        """SELECT with LIMIT/OFFSET pagination."""
+        where, params = self.where()
+        sql = f"SELECT * FROM {source}{where}{self.__order_clause()}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return sql, params
+
+    def count_sql(self, source: str) -> Tuple[str, list]:
+        where, params = self.where()
+        return f"SELECT COUNT(*) FROM {source}{where}", params
+
+    def page_sql(self, source: str, after: Optional[KeysetKey], limit: int) -> Tuple[str, list]:
+        """
+        SELECT of the page following the row with the given keyset key (None for the first page).
+        Unlike OFFSET, the cost of a page does not grow with its position. NULLs sort first ascending, last descending.
+        """
+        where, params = self.where()
+        column = self.__order_column()
+        if after is not None:
+            value, track_id = after
+            op = "<" if self.descending else ">"
+            if column == "track_id":
+                keyset, keyset_params = f"track_id {op} ?", [track_id]
+            elif value is None:
+                keyset = f"({column} IS NULL AND track_id {op} ?)" + ("" if self.descending else f" OR {column} IS NOT NULL")
+                keyset_params = [track_id]
+            else:
+                keyset = f"({column}, track_id) {op} (?, ?)" + (f" OR {column} IS NULL" if self.descending else "")
+                keyset_params = [value, track_id]
+            where = f"{where} AND ({keyset})" if where else f" WHERE ({keyset})"
+            params += keyset_params
+        return f"SELECT * FROM {source}{where}{self.__order_clause()} LIMIT ?", params + [limit]
+
+    def key_of(self, track: Track) -> KeysetKey:
+        """Returns the keyset key of a track, to pass as 'after' for the next page."""
+        return getattr(track, self.order_by), track.track_id
+
+
+def _fetch_tracks(conn: sqlite3.Connection, sql: str, params: list) -> List[Track]:
+    conn.row_factory = sqlite3.Row
+    try:
+        return [track for track in (track_from_row(row) for row in conn.execute(sql, params)) if track is not None]
+    finally:
+        conn.row_factory = None
+
+
+def query_tracks(conn: sqlite3.Connection, query: TrackQuery, limit: Optional[int] = None, offset: int = 0) -> List[Track]:
+    """Returns the tracks matching the query, optionally one LIMIT/OFFSET page of them."""
+    return _fetch_tracks(conn, *query.select_sql(source_table(conn, "uber_tracks"), limit, offset))
+
+
+def count_tracks(conn: sqlite3.Connection, query: TrackQuery) -> int:
+    return conn.execute(*query.count_sql(source_table(conn, "uber_tracks"))).fetchone()[0]
+
+
+def query_page(conn: sqlite3.Connection, query: TrackQuery, after: Optional[KeysetKey] = None, limit: int = 500) -> Tuple[List[Track], Optional[KeysetKey]]:
+    """Returns a keyset page of tracks and the key to fetch the next page with (None after the last page)."""
+    tracks = _fetch_tracks(conn, *query.page_sql(source_table(conn, "uber_tracks"), after, limit))
+    next_key = query.key_of(tracks[-1]) if len(tracks) == limit else None
+    return tracks, next_key
+
+
+def facet_counts(conn: sqlite3.Connection, query: TrackQuery, facet: str) -> Dict[str, int]:
+    """
+    Returns the number of tracks matching the query for each value of a facet. Values are split and trimmed like
+    FacetIndex.split_values, and empty values are not counted.
+    """
+    if facet not in FACETS:
+        raise ValueError(f"Unknown facet {facet}")
+    source = source_table(conn, "uber_tracks")
+    where, params = query.where()
+    if facet in MULTI_VALUE_FACETS:
+        # Split the comma separated lists with a recursive CTE, counting each matching row once per value
+        sql = f"""
+            WITH RECURSIVE matching(n, rest) AS (SELECT ROW_NUMBER() OVER (), {facet} || ',' FROM {source}{where}),
+            items(n, value, rest) AS (
+                SELECT n, NULL, rest FROM matching
+                UNION ALL
+                SELECT n, TRIM(substr(rest, 1, instr(rest, ',') - 1)), substr(rest, instr(rest, ',') + 1) FROM items WHERE rest != ''
+            )
+            SELECT value, COUNT(DISTINCT n) FROM items WHERE value != '' GROUP BY value
+        """
+    else:
+        sql = f"SELECT TRIM(CAST({facet} AS TEXT)) AS value, COUNT(*) FROM {source}{where} GROUP BY value HAVING value != ''"
+    return dict(conn.execute(sql, params).fetchall())
+
+
+def labels_and_releases(conn: sqlite3.Connection) -> Tuple[Dict[str, set], Dict[int, Release]]:
+    """
+    Returns the Discogs ids of the releases of each label and the releases by Discogs id, as MusicCatalogDB_2 derives
+    them from its tracks, reading one row per label and release instead of every track.
+    """
+    sql = f"SELECT *, MIN(track_id) FROM {source_table(conn, 'uber_tracks')} WHERE discogs_id IS NOT NULL GROUP BY discogs_id, label ORDER BY MIN(track_id)"
+    label_to_releases: Dict[str, set] = {}
+    releases: Dict[int, Release] = {}
+    for track in _fetch_tracks(conn, sql, []):
+        label_to_releases.setdefault(track.label or "", set()).add(track.discogs_id)
+        releases.setdefault(track.discogs_id, release_of(track))
+    return label_to_releases, releases
+
+
+def track_by_path(conn: sqlite3.Connection, path: str) -> Optional[Track]:
+    """
+    Returns the track stored at a file path, or None. The path is matched as written and with normalised separators,
+    through the file_location index of a materialised view, then compared like MusicCatalogDB_2.get_track_by_path.
+    """
+    candidates = list(dict.fromkeys([path, os.path.normpath(path), os.path.normpath(path).replace("\\", "/"), os.path.normpath(path).replace("/", "\\")]))
+    sql = f"SELECT * FROM {source_table(conn, 'uber_tracks')} WHERE file_location IN ({', '.join('?' * len(candidates))}) ORDER BY track_id LIMIT 1"
+    tracks = _fetch_tracks(conn, sql, candidates)
+    return tracks[0] if tracks and normalise_path(tracks[0].file_location) == normalise_path(path) else None
+
+
+def track_files(conn: sqlite3.Connection) -> List[Tuple[int, str]]:
+    """Returns (file_id, file_location) of every track, e.g. for an integrity check, without keeping the tracks."""
+    conn.row_factory = sqlite3.Row
+    try:
+        files = []
+        for row in conn.execute(f"SELECT * FROM {source_table(conn, 'uber_tracks')}"):
+            track = track_from_row(row)
+            if track is not None:
+                files.append((track.file_id, track.file_location))
+        return files
+    finally:
+        conn.row_factory = None
+
+
+class SqlFacetIndex:
+    """
+    Facet selection and counts computed in SQL, with the interface of FacetIndex, for the paged track view where the
+    tracks are not held in memory. There is no mask: the selection is applied as the facets of a TrackQuery.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.connection = conn
+        self._selected: Dict[str, set] = {facet: set() for facet in FACETS}
+        self._totals: Dict[str, Dict[str, int]] = {}  # Counts over all tracks, which is also the list of values
+        for facet in FACETS:
+            counts = self.__counts(TrackQuery(), facet)
+            self._totals[facet] = {value: counts[value] for value in sorted(counts, key=str.casefold)}
+        logger.info("Read facet values from the database: " + ", ".join(f"{facet}={len(values)}" for facet, values in self._totals.items()))
+
+    def values(self, facet: str) -> List[str]:
+        """Returns the values of a facet, sorted case-insensitively."""
+        return list(self._totals[facet])
+
+    def selected(self, facet: str) -> set:
+        return set(self._selected[facet])
+
+    def select(self, facet: str, value: str, selected: bool = True) -> None:
+        if selected:
+            self._selected[facet].add(value)
+        else:
+            self._selected[facet].discard(value)
+
+    def clear(self, facets: Optional[Iterable[str]] = None) -> None:
+        """Clears the selection of the given facets, or of all facets."""
+        for facet in facets or FACETS:
+            self._selected[facet].clear()
+
+    def is_active(self) -> bool:
+        return any(self._selected.values())
+
+    def selection(self, exclude: Optional[str] = None) -> Dict[str, set]:
+        """Returns the selected values of every facet with a selection (optionally skipping one), for TrackQuery.facets."""
+        return {facet: set(values) for facet, values in self._selected.items() if values and facet != exclude}
+
+    def mask(self, exclude: Optional[str] = None) -> None:
+        """There is no in-memory mask: see selection()."""
+        return None
+
+    def counts(self, facet: str, base_query: Optional[TrackQuery] = None) -> Dict[str, int]:
+        """
+        Returns the number of tracks for each value of a facet, given the selections of the *other* facets
+        and an optional base query (e.g. the label/search filter).
+        """
+        query = replace(base_query or TrackQuery(), facets=self.selection(exclude=facet))
+        if not query.where()[0]:
+            return self._totals[facet]
+        return self.__counts(query, facet)
+
+    def __counts(self, query: TrackQuery, facet: str) -> Dict[str, int]:
+        try:
+            return facet_counts(self.connection, query, facet)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to count the {facet} facet values: {e}")
+            return {}
@@ -0,0 +1,260 @@
+import hashlib
+import sqlite3
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from db.change_log import CHANGES_TABLE
+from db.materialised_views import MATERIALISED_VIEWS, STATE_TABLE
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Tables holding state local to one copy of the catalogue: the change log, materialised views (kept current by their
+# triggers as synced rows land), scan checkpoints and the file status of the last integrity check
+LOCAL_TABLES = {CHANGES_TABLE, STATE_TABLE, "library_scan_checkpoint", "file_status", *MATERIALISED_VIEWS.values()}
+
+LEAF_ROWS = 64  # Average rows per leaf
+FANOUT = 32  # Average children per inner node
+
+
+class Node(NamedTuple):
+    """A node of a table's Merkle tree: the primary key range it covers and the hash of the rows in that range."""
+
+    lo: tuple
+    hi: tuple
+    digest: bytes
+    first_child: int = 0
+    child_count: int = 0
+
+
+@dataclass
+class TableSpec:
+    name: str
+    key_columns: List[str]
+    columns: List[str]  # Key columns first
+
+    @property
+    def key_size(self) -> int:
+        return len(self.key_columns)
+
+
+@dataclass
+class TableChanges:
+    inserts: List[tuple] = field(default_factory=list)
+    updates: List[tuple] = field(default_factory=list)
+    deletes: List[tuple] = field(default_factory=list)  # Keys
+    ranges: int = 0  # Primary key ranges whose rows were compared
+
+    def __len__(self) -> int:
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+
+@dataclass
+class SyncResult:
+    tables: Dict[str, TableChanges] = field(default_factory=dict)
+    rows_compared: int = 0
+    changeset_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def changes(self) -> int:
+        return sum(len(changes) for changes in self.tables.values())
+
+
+def table_specs(conn: sqlite3.Connection) -> Dict[str, TableSpec]:
+    """
+    Returns the tables to sync, keyed on the key of their b-tree: the rowid (or the INTEGER PRIMARY KEY aliasing it),
+    or the primary key of WITHOUT ROWID tables. Keeping rowids the same in both copies keeps the ids views derive
+    from them the same too.
+    """
+    specs = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"):
+        if name in LOCAL_TABLES:
+            continue
+        info = conn.execute(f'PRAGMA table_info("{name}")').fetchall()
+        columns = [row[1] for row in info]
+        primary_key = [row for row in sorted((row for row in info if row[5]), key=lambda row: row[5])]
+        try:
+            conn.execute(f'SELECT rowid FROM "{name}" LIMIT 0')
+            has_rowid = True
+        except sqlite3.OperationalError:
+            has_rowid = False  # WITHOUT ROWID
+        if not has_rowid:
+            key_columns = [row[1] for row in primary_key]
+        elif len(primary_key) == 1 and primary_key[0][2].upper() == "INTEGER":
+            key_columns = [primary_key[0][1]]
+        else:
+            key_columns = ["rowid"]
+        specs[name] = TableSpec(name, key_columns, key_columns + [column for column in columns if column not in key_columns])
+    return specs
+
+
+def _is_boundary(key: tuple, level: int, fanout: int) -> bool:
+    """Node boundaries depend on the key alone, so both copies split the same key range at the same places."""
+    return zlib.crc32(repr((level, key)).encode()) % fanout == 0
+
+
+def build_tree(conn: sqlite3.Connection, spec: TableSpec) -> List[List[Node]]:
+    """
+    Hashes a table's rows in key order into a Merkle tree. Returns its levels, leaves first. The root is the single
+    node of the last level; an empty table has no levels.
+    """
+    keys = ", ".join(f'"{column}"' for column in spec.key_columns)
+    columns = ", ".join(f'"{column}"' for column in spec.columns)
+    leaves: List[Node] = []
+    hasher, lo, hi = hashlib.blake2b(digest_size=16), None, None
+    for row in conn.execute(f'SELECT {columns} FROM "{spec.name}" ORDER BY {keys}'):
+        hi = row[: spec.key_size]
+        if lo is None:
+            lo = hi
+        hasher.update(repr(row).encode())
+        if _is_boundary(hi, 0, LEAF_ROWS):
+            leaves.append(Node(lo, hi, hasher.digest()))
+            hasher, lo = hashlib.blake2b(digest_size=16), None
+    if lo is not None:
+        leaves.append(Node(lo, hi, hasher.digest()))
+
+    levels = [leaves] if leaves else []
+    while levels and len(levels[-1]) > 1:
+        children, parents, first = levels[-1], [], 0
+        for position, child in enumerate(children):
+            if _is_boundary(child.hi, len(levels), FANOUT) or position == len(children) - 1:
+                digest = hashlib.blake2b(b"".join(node.digest for node in children[first : position + 1]), digest_size=16).digest()
+                parents.append(Node(children[first].lo, child.hi, digest, first, position + 1 - first))
+                first = position + 1
+        levels.append(parents)
+    return levels
+
+
+def differing_ranges(source: List[List[Node]], target: List[List[Node]]) -> Set[Tuple[tuple, tuple]]:
+    """
+    Compares two trees level by level from the top, descending only into nodes that have no identical node (same key
+    range and hash) in the other tree. Returns the key ranges of the leaves left, which hold every differing row.
+    """
+    if not source or not target:
+        return {(leaf.lo, leaf.hi) for leaf in (source or target or [[]])[0]}
+
+    level = min(len(source), len(target)) - 1
+    source_nodes, target_nodes = source[level], target[level]
+    while True:
+        target_set = {(node.lo, node.hi, node.digest) for node in target_nodes}
+        source_set = {(node.lo, node.hi, node.digest) for node in source_nodes}
+        source_nodes = [node for node in source_nodes if (node.lo, node.hi, node.digest) not in target_set]
+        target_nodes = [node for node in target_nodes if (node.lo, node.hi, node.digest) not in source_set]
+        if level == 0:
+            return {(node.lo, node.hi) for node in source_nodes + target_nodes}
+        level -= 1
+        source_nodes = [child for node in source_nodes for child in source[level][node.first_child : node.first_child + node.child_count]]
+        target_nodes = [child for node in target_nodes for child in target[level][node.first_child : node.first_child + node.child_count]]
+
+
+def _rows_in_range(conn: sqlite3.Connection, spec: TableSpec, lo: tuple, hi: tuple) -> Dict[tuple, tuple]:
+    keys = ", ".join(f'"{column}"' for column in spec.key_columns)
+    columns = ", ".join(f'"{column}"' for column in spec.columns)
+    placeholders = ", ".join("?" * spec.key_size)
+    sql = f'SELECT {columns} FROM "{spec.name}" WHERE ({keys}) >= ({placeholders}) AND ({keys}) <= ({placeholders})'
+    return {row[: spec.key_size]: row for row in conn.execute(sql, lo + hi)}
+
+
+def table_changes(source: sqlite3.Connection, target: sqlite3.Connection, spec: TableSpec, result: SyncResult) -> TableChanges:
+    """Returns the changes that make the target table equal to the source table."""
+    source_tree, target_tree = build_tree(source, spec), build_tree(target, spec)
+    changes = TableChanges()
+    ranges = differing_ranges(source_tree, target_tree)
+    changes.ranges = len(ranges)
+    seen: Set[tuple] = set()
+    for lo, hi in ranges:
+        source_rows = _rows_in_range(source, spec, lo, hi)
+        target_rows = _rows_in_range(target, spec, lo, hi)
+        result.rows_compared += len(source_rows) + len(target_rows)
+        for key, row in source_rows.items():
+            if key in seen:
+                continue
+            seen.add(key)
+            if key not in target_rows:
+                changes.inserts.append(row)
+            elif target_rows[key] != row:
+                changes.updates.append(row)
+        for key in target_rows:
+            if key not in source_rows and key not in seen:
+                seen.add(key)
+                changes.deletes.append(key)
+    return changes
+
+
+def apply_changes(conn: sqlite3.Connection, spec: TableSpec, changes: TableChanges) -> None:
+    """Writes the changes to a table with plain INSERT/UPDATE/DELETE statements, so the table's triggers see them."""
+    key_match = " AND ".join(f'"{column}" = ?' for column in spec.key_columns)
+    values = spec.columns[spec.key_size :]
+    if changes.deletes:
+        conn.executemany(f'DELETE FROM "{spec.name}" WHERE {key_match}', changes.deletes)
+    if changes.updates and values:
+        assignments = ", ".join(f'"{column}" = ?' for column in values)
+        conn.executemany(f'UPDATE "{spec.name}" SET {assignments} WHERE {key_match}', [row[spec.key_size :] + row[: spec.key_size] for row in changes.updates])
+    if changes.inserts:
+        columns = ", ".join(f'"{column}"' for column in spec.columns)
+        conn.executemany(f'INSERT INTO "{spec.name}" ({columns}) VALUES ({", ".join("?" * len(spec.columns))})', changes.inserts)
+
+
+def sync(source_path: str, target_path: str, dry_run: bool = False) -> SyncResult:
+    """
+    Makes the catalogue at target_path equal to the one at source_path.
+
+    Each table present in both with the same columns is hashed into a Merkle tree over its rows in key order. Leaf
+    and node boundaries are chosen from the keys, so an inserted or deleted row only changes the nodes above it. The trees are compared level by level and only the rows under differing leaves are read and compared;
+    the changes are applied to the target in one transaction. Nothing is written with dry_run.
+    """
+    started = time.perf_counter()
+    result = SyncResult()
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        source_specs, target_specs = table_specs(source), table_specs(target)
+        specs = []
+        for name, spec in source_specs.items():
+            other = target_specs.get(name)
+            if other is None or other.columns != spec.columns:
+                logger.warning(f"Catalogue sync: skipping table {name}, it is missing or has different columns in {target_path}")
+                continue
+            specs.append(spec)
+
+        for spec in specs:
+            changes = table_changes(source, target, spec, result)
+            result.tables[spec.name] = changes
+            result.changeset_bytes += sum(len(repr(row)) for row in changes.inserts + changes.updates + changes.deletes)
+            if changes:
+                logger.info(
+                    f"Catalogue sync: {spec.name}: {len(changes.inserts)} inserted, {len(changes.updates)} updated, {len(changes.deletes)} deleted "
+                    f"({changes.ranges} key ranges compared)"
+                )
+
+        if not dry_run and result.changes:
+            with target:
+                for spec in specs:
+                    apply_changes(target, spec, result.tables[spec.name])
+    finally:
+        source.close()
+        target.close()
+
+    result.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Catalogue sync {source_path} -> {target_path}{' (dry run)' if dry_run else ''}: {result.changes} changes, "
+        f"{result.rows_compared} rows compared, {result.changeset_bytes} bytes of changes in {result.elapsed:.1f}s"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    # python -m db.catalog_sync <source db> <target db> [--dry-run]
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    if len(arguments) != 2:
+        print("Usage: python -m db.catalog_sync <source db> <target db> [--dry-run]")
+        sys.exit(1)
+    sync_result = sync(arguments[0], arguments[1], dry_run="--dry-run" in sys.argv)
+    for table_name, table_result in sync_result.tables.items():
+        if table_result:
+            print(f"{table_name}: {len(table_result.inserts)} inserted, {len(table_result.updates)} updated, {len(table_result.deletes)} deleted")
+    print(f"{sync_result.changes} changes, {sync_result.changeset_bytes} bytes, {sync_result.elapsed:.1f}s")
@@ -0,0 +1,82 @@
+import sqlite3
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from db.db_reader import track_from_row
+from db.materialised_views import source_table
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class CatalogueLoader(QThread):
+    """
+    Reads the uber_tracks view (or its materialised table) on a worker thread and streams the tracks to the GUI
+    thread in batches.
+
+    The worker has its own connection and only builds Track objects; the receiver applies each batch to its
+    MusicCatalogDB_2 with add_tracks(), so the store is only ever touched on the GUI thread.
+    """
+
+    batchLoaded = pyqtSignal(object)  # list of Track
+    progressChanged = pyqtSignal(int, int)  # tracks loaded, total tracks (0 until counted)
+    loadFinished = pyqtSignal(bool)  # True if the whole view was read
+
+    QUERY = "SELECT * FROM {source}"
+    COUNT_QUERY = "SELECT COUNT(*) FROM {source}"
+
+    def __init__(self, db_path: str, batch_size: int = 2000, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.batch_size = batch_size
+
+    def run(self):
+        try:
+            connection = sqlite3.connect(self.db_path)
+        except sqlite3.Error as e:
+            logger.error(f"Catalogue loader: error connecting to database {self.db_path}: {e}")
+            self.loadFinished.emit(False)
+            return
+
+        loaded = 0
+        total = 0
+        try:
+            source = source_table(connection, "uber_tracks")
+            connection.row_factory = sqlite3.Row
+            cursor = connection.execute(self.QUERY.format(source=source))
+            while not self.isInterruptionRequested():
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                tracks = [track for track in (track_from_row(row) for row in rows) if track is not None]
+                loaded += len(tracks)
+                self.batchLoaded.emit(tracks)
+
+                # Count once the first rows are on screen, so the count never delays them
+                if not total:
+                    total = max(connection.execute(self.COUNT_QUERY.format(source=source)).fetchone()[0], loaded)
+                self.progressChanged.emit(loaded, total)
+            cursor.close()
+        except sqlite3.Error as e:
+            logger.error(f"Catalogue loader: failed to read tracks from {self.db_path}: {e}")
+            self.loadFinished.emit(False)
+            return
+        finally:
+            connection.close()
+
+        completed = not self.isInterruptionRequested()
+        logger.info(f"Catalogue loader: loaded {loaded} tracks from {self.db_path}" + ("" if completed else " (interrupted)"))
+        self.loadFinished.emit(completed)
+
+
+class DatabaseLoadWorker(QThread):
+    """Runs the load() of a catalogue object on a worker thread. The catalogue must not be used until loaded is emitted."""
+
+    loaded = pyqtSignal(bool)
+
+    def __init__(self, catalogue, parent=None):
+        super().__init__(parent)
+        self.catalogue = catalogue
+
+    def run(self):
+        self.loaded.emit(bool(self.catalogue.load()))
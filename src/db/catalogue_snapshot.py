@@ -0,0 +1,383 @@
+import json
+import os
+import time
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db.db_reader import Release, Track
+from db.facet_index import FACETS, FacetIndex
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_VERSION = 1
+MANIFEST = "manifest.json"
+TRACK_ATTRS = [f.name for f in fields(Track)]
+RELEASE_ATTRS = [f.name for f in fields(Release)]
+
+
+def snapshot_dir(db_path: str) -> str:
+    """The snapshot of a database lives next to it, e.g. keefy.db -> keefy.db.snapshot/"""
+    return f"{db_path}.snapshot"
+
+
+def db_signature(db_path: str) -> Optional[dict]:
+    """
+    Returns the size and mtime of the database file (and its WAL file if present), or None if it does not exist.
+    Any write to the database changes one of them, so a snapshot taken with the same signature is current.
+    """
+    signature = {}
+    for suffix in ("", "-wal"):
+        try:
+            st = os.stat(db_path + suffix)
+        except OSError:
+            if not suffix:
+                return None
+            continue
+        signature[suffix or "db"] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+
+def _encode_column(values: list) -> Tuple[str, Dict[str, np.ndarray]]:
+    """
+    Encodes a column of track values as flat arrays.
+    Integer columns are stored as int64 values, other columns as utf-8 bytes plus offsets ('str' for text, 'json' for mixed types).
+    """
+    count = len(values)
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=count)
+    if all(value is None or (isinstance(value, int) and not isinstance(value, bool)) for value in values):
+        try:
+            ints = np.fromiter((0 if value is None else value for value in values), dtype=np.int64, count=count)
+            return "int", {"values": ints, "nulls": nulls}
+        except OverflowError:
+            pass
+
+    if all(value is None or isinstance(value, str) for value in values):
+        kind = "str"
+        encoded = [b"" if value is None else value.encode("utf-8", "surrogatepass") for value in values]
+    else:
+        kind = "json"
+        encoded = [json.dumps(value).encode("utf-8") for value in values]
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=count), out=offsets[1:])
+    # Never empty: an empty .npy file cannot be memory mapped
+    data = np.frombuffer(b"".join(encoded) + b"\0", dtype=np.uint8)
+    return kind, {"offsets": offsets, "data": data, "nulls": nulls}
+
+
+class _SnapshotColumn:
+    """A memory mapped column of track values, decoded one value at a time."""
+
+    def __init__(self, kind: str, arrays: Dict[str, np.ndarray]) -> None:
+        self.kind = kind
+        self.nulls = arrays["nulls"]
+        self.values = arrays.get("values")
+        self.offsets = arrays.get("offsets")
+        self.data = arrays.get("data")
+
+    def __getitem__(self, position: int):
+        if self.nulls[position]:
+            return None
+        if self.kind == "int":
+            return int(self.values[position])
+        raw = self.data[self.offsets[position] : self.offsets[position + 1]].tobytes().decode("utf-8", "surrogatepass")
+        return raw if self.kind == "str" else json.loads(raw)
+
+    def all_values(self) -> list:
+        """Decodes the whole column at once, much faster than reading it value by value."""
+        nulls = self.nulls.tolist()
+        if self.kind == "int":
+            return [None if null else value for value, null in zip(self.values.tolist(), nulls)]
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        values = [None if nulls[i] else data[offsets[i] : offsets[i + 1]].decode("utf-8", "surrogatepass") for i in range(len(nulls))]
+        return values if self.kind == "str" else [None if value is None else json.loads(value) for value in values]
+
+
+class SnapshotTrackList(Sequence):
+    """List of tracks backed by memory mapped columns. A Track object is only built the first time its row is read."""
+
+    def __init__(self, columns: Dict[str, _SnapshotColumn], size: int) -> None:
+        self._columns = columns
+        self._size = size
+        self._tracks: List[Optional[Track]] = [None] * size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._size))]
+        position = int(index)
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError("track index out of range")
+
+        track = self._tracks[position]
+        if track is None:
+            track = Track(**{attr: column[position] for attr, column in self._columns.items()})
+            self._tracks[position] = track
+        return track
+
+    def __iter__(self):
+        for position in range(self._size):
+            yield self[position]
+
+    def column_values(self, attr: str) -> list:
+        """Returns one attribute of every track, read from its column without building the Track objects."""
+        return self._columns[attr].all_values()[: self._size]
+
+
+class SnapshotTrackMap(Mapping):
+    """track_id -> Track over a SnapshotTrackList. The id lookup table is built on first use."""
+
+    def __init__(self, track_ids: _SnapshotColumn, tracks: SnapshotTrackList) -> None:
+        self._track_ids = track_ids
+        self._tracks = tracks
+        self._positions: Optional[Dict] = None
+
+    @property
+    def positions(self) -> Dict:
+        if self._positions is None:
+            if self._track_ids.kind == "int":
+                self._positions = dict(zip(self._track_ids.values.tolist(), range(len(self._tracks))))
+            else:
+                self._positions = {self._track_ids[position]: position for position in range(len(self._tracks))}
+        return self._positions
+
+    def __getitem__(self, track_id) -> Track:
+        return self._tracks[self.positions[track_id]]
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+
+class SnapshotReleaseTracks(Mapping):
+    """discogs_id -> set of track_ids over the mapped columns. The groups are built on first use."""
+
+    def __init__(self, release_ids: _SnapshotColumn, track_ids: _SnapshotColumn, size: int) -> None:
+        self._release_ids = release_ids
+        self._track_ids = track_ids
+        self._size = size
+        self._groups: Optional[Dict[int, set]] = None
+
+    @property
+    def groups(self) -> Dict[int, set]:
+        if self._groups is None:
+            self._groups = {}
+            for position in range(self._size):
+                release_id = self._release_ids[position]
+                if release_id is not None:
+                    self._groups.setdefault(release_id, set()).add(self._track_ids[position])
+        return self._groups
+
+    def __getitem__(self, release_id) -> set:
+        return self.groups[release_id]
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def __iter__(self):
+        return iter(self.groups)
+
+
+@dataclass
+class SnapshotContents:
+    tracks: SnapshotTrackList
+    tracks_by_id: SnapshotTrackMap
+    releases: Dict[int, Release]
+    labels: List[str]
+    label_to_releases: Dict[str, set]
+    release_to_tracks: SnapshotReleaseTracks
+    permutations: Dict[tuple, np.ndarray]
+    load_facet_index: Callable[[], Optional[FacetIndex]]
+
+
+class CatalogueSnapshot:
+    """
+    On-disk snapshot of a loaded MusicCatalogDB_2: the track columns, sort permutations and facet bitsets as .npy
+    files that are memory mapped on load, plus a manifest holding the releases/labels and the database signature.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.directory = snapshot_dir(db_path)
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def __read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.__path(MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable catalogue snapshot manifest in {self.directory}: {e}")
+            return None
+
+    def __write_manifest(self, manifest: dict) -> None:
+        tmp_path = self.__path(MANIFEST + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.__path(MANIFEST))
+
+    def __save_array(self, manifest_files: List[str], name: str, array: np.ndarray) -> str:
+        file_name = f"{manifest_files[0]}_{name}.npy"
+        np.save(self.__path(file_name), np.ascontiguousarray(array), allow_pickle=False)
+        manifest_files.append(file_name)
+        return file_name
+
+    def __load_array(self, file_name: str) -> np.ndarray:
+        return np.load(self.__path(file_name), mmap_mode="r", allow_pickle=False)
+
+    def __remove_unreferenced_files(self, manifest: dict) -> None:
+        """Removes the files of older snapshots. Files still mapped by this process (on Windows) are left for next time."""
+        referenced = set(manifest["files"][1:]) | {MANIFEST}
+        for name in os.listdir(self.directory):
+            if name not in referenced:
+                try:
+                    os.remove(self.__path(name))
+                except OSError:
+                    pass
+
+    def load(self) -> Optional[SnapshotContents]:
+        """Maps the snapshot if it matches the current database, otherwise returns None."""
+        manifest = self.__read_manifest()
+        if manifest is None:
+            return None
+        signature = db_signature(self.db_path)
+        if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("signature") != signature or signature is None:
+            logger.info(f"Catalogue snapshot in {self.directory} is out of date, ignoring it")
+            return None
+
+        try:
+            size = manifest["size"]
+            columns = {}
+            for attr in TRACK_ATTRS:
+                kind, arrays = manifest["columns"][attr]
+                columns[attr] = _SnapshotColumn(kind, {name: self.__load_array(file_name) for name, file_name in arrays.items()})
+            tracks = SnapshotTrackList(columns, size)
+
+            releases = {}
+            for values in manifest["releases"]:
+                release = Release(**dict(zip(RELEASE_ATTRS, values)))
+                releases[release.discogs_id] = release
+            label_to_releases = {label: set(release_ids) for label, release_ids in manifest["label_to_releases"]}
+            permutations = {(attr, descending): self.__load_array(file_name) for attr, descending, file_name in manifest["permutations"]}
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            logger.warning(f"Failed to map catalogue snapshot in {self.directory}: {e}")
+            return None
+
+        def load_facet_index() -> Optional[FacetIndex]:
+            bitsets = {}
+            for facet in FACETS:
+                values, file_name = manifest["facets"].get(facet, ([], None))
+                packed = np.unpackbits(self.__load_array(file_name), axis=1, count=size).astype(bool) if file_name else []
+                bitsets[facet] = dict(zip(values, packed))
+            return FacetIndex.from_bitsets(size, bitsets)
+
+        logger.info(f"Mapped catalogue snapshot of {size} tracks from {self.directory}")
+        return SnapshotContents(
+            tracks=tracks,
+            tracks_by_id=SnapshotTrackMap(columns["track_id"], tracks),
+            releases=releases,
+            labels=manifest["labels"],
+            label_to_releases=label_to_releases,
+            release_to_tracks=SnapshotReleaseTracks(columns["discogs_id"], columns["track_id"], size),
+            permutations=permutations,
+            load_facet_index=load_facet_index,
+        )
+
+    def save(
+        self,
+        signature: Optional[dict],
+        tracks: Sequence,
+        releases: Dict[int, Release],
+        labels: List[str],
+        label_to_releases: Dict[str, set],
+        permutations: Dict[tuple, np.ndarray],
+        facet_index: Optional[FacetIndex],
+    ) -> bool:
+        """Writes a snapshot of the given catalogue, taken when the database had the given signature."""
+        if signature is None:
+            return False
+        start = time.perf_counter()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # The manifest goes first so a half written snapshot is never picked up
+            if os.path.exists(self.__path(MANIFEST)):
+                os.remove(self.__path(MANIFEST))
+
+            files = [str(time.time_ns())]  # Prefix of this generation's files, so mapped files are never overwritten
+            columns = {}
+            for attr in TRACK_ATTRS:
+                kind, arrays = _encode_column([getattr(track, attr) for track in tracks])
+                columns[attr] = [kind, {name: self.__save_array(files, f"{attr}_{name}", array) for name, array in arrays.items()}]
+
+            manifest_permutations = [
+                [attr, descending, self.__save_array(files, f"perm_{attr}_{'desc' if descending else 'asc'}", permutation)] for (attr, descending), permutation in permutations.items()
+            ]
+
+            facets = {}
+            if facet_index is not None and facet_index.size == len(tracks):
+                for facet in FACETS:
+                    bitsets = facet_index.bitsets(facet)
+                    if bitsets:
+                        packed = np.packbits(np.stack(list(bitsets.values())), axis=1)
+                        facets[facet] = [list(bitsets.keys()), self.__save_array(files, f"facet_{facet}", packed)]
+
+            manifest = {
+                "version": SNAPSHOT_VERSION,
+                "signature": signature,
+                "size": len(tracks),
+                "columns": columns,
+                "permutations": manifest_permutations,
+                "facets": facets,
+                "releases": [[getattr(release, attr) for attr in RELEASE_ATTRS] for release in releases.values()],
+                "labels": list(labels),
+                "label_to_releases": [[label, list(release_ids)] for label, release_ids in label_to_releases.items()],
+                "files": files,
+            }
+            self.__write_manifest(manifest)
+            self.__remove_unreferenced_files(manifest)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to write catalogue snapshot to {self.directory}: {e}")
+            return False
+
+        logger.info(f"Wrote catalogue snapshot of {len(tracks)} tracks to {self.directory} in {time.perf_counter() - start:.2f}s")
+        return True
+
+    def save_permutations(self, permutations: Dict[tuple, np.ndarray]) -> bool:
+        """
+        Adds sort permutations computed since the snapshot was written, so the next start does not sort again.
+        Nothing is added if the database changed since, as the permutations may be of a different catalogue.
+        """
+        manifest = self.__read_manifest()
+        if manifest is None:
+            return False
+        if manifest.get("signature") != db_signature(self.db_path):
+            logger.info(f"Catalogue snapshot in {self.directory} is out of date, not adding sort permutations")
+            return False
+        saved = {(attr, descending) for attr, descending, _ in manifest["permutations"]}
+        new = {key: permutation for key, permutation in permutations.items() if key not in saved and len(permutation) == manifest["size"]}
+        if not new:
+            return True
+        try:
+            files = manifest["files"]
+            for (attr, descending), permutation in new.items():
+                manifest["permutations"].append([attr, descending, self.__save_array(files, f"perm_{attr}_{'desc' if descending else 'asc'}", permutation)])
+            self.__write_manifest(manifest)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to add sort permutations to catalogue snapshot {self.directory}: {e}")
+            return False
+        logger.info(f"Added {len(new)} sort permutations to catalogue snapshot {self.directory}")
+        return True
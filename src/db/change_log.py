@@ -0,0 +1,142 @@
+import configparser
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+CHANGES_TABLE = "changes"
+VIEW = "uber_tracks"
+
+# View columns that hold the rowid of a base table, and the Track attribute holding the same value (None if the
+# Track does not carry it). Tables are matched on <table>_id / <singular table>_id unless set in config.ini [change_log].
+TRACK_ATTR_OF_COLUMN = {"track_id": "track_id", "file_id": "file_id", "track_file_id": "file_id", "file_location": "file_location"}
+
+# Tables whose changes are logged with a column value (row_key) as well as the rowid, for views that show the column
+# but not the rowid. digital_media rows are keyed on their file location, which every track carries.
+ROW_KEY_COLUMNS = {"digital_media": "file_location"}
+
+
+def change_log_enabled() -> bool:
+    """
+    Changes are only logged when config.ini [db] change_log is set: the triggers add a write to every write of the
+    base tables, by the scanner or any other tool.
+    """
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    return config.getboolean("db", "change_log", fallback=False)
+
+
+def view_base_tables(conn: sqlite3.Connection, view: str = VIEW) -> List[str]:
+    """Returns the tables read by a view, found from the b-trees its query plan opens."""
+    root_pages = {row[0]: row[1] for row in conn.execute("SELECT rootpage, tbl_name FROM sqlite_master WHERE type IN ('table', 'index') AND rootpage > 0")}
+    tables = set()
+    for row in conn.execute(f"EXPLAIN SELECT * FROM {view}"):
+        opcode, p2 = row[1], row[3]
+        if opcode == "OpenRead" and p2 in root_pages:
+            tables.add(root_pages[p2])
+    tables.discard(CHANGES_TABLE)
+    return sorted(tables)
+
+
+def install_change_log(conn: sqlite3.Connection, view: str = VIEW) -> List[str]:
+    """
+    Creates the changes table and the triggers that log every insert, update and delete on the base tables of the view.
+    Safe to call repeatedly. Returns the tables being tracked.
+    """
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE}
+        (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER,
+            row_key TEXT,
+            op TEXT NOT NULL
+        )
+    """
+    )
+    if "row_key" not in {row[1] for row in conn.execute(f"PRAGMA table_info({CHANGES_TABLE})")}:
+        conn.execute(f"ALTER TABLE {CHANGES_TABLE} ADD COLUMN row_key TEXT")
+    existing = {row[0]: row[1] for row in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")}
+    tracked = []
+    for table in view_base_tables(conn, view):
+        log = f"INSERT INTO {CHANGES_TABLE} (table_name, row_id, row_key, op) VALUES ('{table}'"
+        key = ROW_KEY_COLUMNS.get(table)
+        if key is not None and key not in {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}:
+            key = None
+        old, new = (f"OLD.{key}", f"NEW.{key}") if key else ("NULL", "NULL")
+        triggers = {
+            f"{CHANGES_TABLE}_{table}_insert": f"AFTER INSERT ON \"{table}\" BEGIN {log}, NEW.rowid, {new}, 'I'); END",
+            f"{CHANGES_TABLE}_{table}_update": f"AFTER UPDATE ON \"{table}\" BEGIN {log}, OLD.rowid, {old}, 'U'); {log}, NEW.rowid, {new}, 'U'); END",
+            f"{CHANGES_TABLE}_{table}_delete": f"AFTER DELETE ON \"{table}\" BEGIN {log}, OLD.rowid, {old}, 'D'); END",
+        }
+        try:
+            for name, body in triggers.items():
+                if name in existing and body not in existing[name]:
+                    # Written by an older version, e.g. without the row_key
+                    conn.execute(f'DROP TRIGGER "{name}"')
+                if name not in existing or body not in existing[name]:
+                    conn.execute(f"CREATE TRIGGER IF NOT EXISTS \"{name}\" {body}")
+            tracked.append(table)
+        except sqlite3.Error as e:
+            # e.g. WITHOUT ROWID tables: changes to them are only picked up by a full reload
+            logger.warning(f"Cannot track changes to table {table}: {e}")
+    conn.commit()
+    return tracked
+
+
+def high_water_mark(conn: sqlite3.Connection) -> int:
+    """Returns the sequence number of the latest logged change."""
+    return conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {CHANGES_TABLE}").fetchone()[0]
+
+
+def changes_since(conn: sqlite3.Connection, seq: int) -> List[Tuple[int, str, int, Optional[str], str]]:
+    """Returns the (seq, table_name, row_id, row_key, op) changes logged after seq, oldest first."""
+    return conn.execute(f"SELECT seq, table_name, row_id, row_key, op FROM {CHANGES_TABLE} WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+
+
+def prune_changes(conn: sqlite3.Connection, seq: int) -> int:
+    """
+    Deletes the changes logged before seq, once they have been applied. The change at seq itself is kept, so that a
+    reader behind seq can tell its changes were pruned (see changes_pruned). Returns the number of changes deleted.
+    """
+    deleted = conn.execute(f"DELETE FROM {CHANGES_TABLE} WHERE seq < ?", (seq,)).rowcount
+    conn.commit()
+    return deleted
+
+
+def changes_pruned(conn: sqlite3.Connection, seq: int) -> bool:
+    """Returns True if changes logged after seq have been pruned, i.e. the oldest logged change is past the next one."""
+    oldest = conn.execute(f"SELECT MIN(seq) FROM {CHANGES_TABLE}").fetchone()[0]
+    return oldest is not None and oldest > seq + 1
+
+
+def view_key_columns(conn: sqlite3.Connection, view: str = VIEW) -> Dict[str, str]:
+    """
+    Maps each base table of the view to the view column holding its rowid, or for the tables of ROW_KEY_COLUMNS the
+    column holding their row_key, where there is one.
+    """
+    view_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({view})")}
+
+    configured = {}
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    if config.has_section("change_log"):
+        configured = {table: column for table, column in config["change_log"].items() if column in view_columns}
+
+    keys = {}
+    for table in view_base_tables(conn, view):
+        if table.lower() in configured:
+            keys[table] = configured[table.lower()]
+            continue
+        if ROW_KEY_COLUMNS.get(table) in view_columns:
+            keys[table] = ROW_KEY_COLUMNS[table]
+            continue
+        candidates = [f"{table}_id", f"{table[:-1]}_id" if table.endswith("s") else None]
+        for column in candidates:
+            if column and column in view_columns:
+                keys[table] = column
+                break
+    return keys
@@ -1,6 +1,8 @@
 import os
 import sqlite3
 import configparser
+from db.change_log import CHANGES_TABLE, install_change_log
+from db.materialised_views import STATE_TABLE
 from log_config import get_logger
 
 logger = get_logger(__name__)
@@ -38,6 +40,34 @@ def setup_database():
     db_location = os.path.join(config['db']['location'],config['db']['name'])
     logger.info(f"Connecting to database: {db_location}")
     conn = sqlite3.connect(db_location)
+    create_tables(conn)
+    conn.close()
+
+
+# A release can have several copies (e.g. a WAV and an MP3 folder), so digital_media rows are keyed on their file as
+# well as their track
+DIGITAL_MEDIA_TABLE = '''
+        CREATE TABLE IF NOT EXISTS {name}
+        (
+            release_id INTEGER,
+            track_name TEXT,
+            track_artist TEXT,
+            track_number INTEGER,
+            file_path TEXT,
+            file_name TEXT,
+            file_location TEXT,
+            file_size INTEGER,
+            media_type INTEGER,
+            file_mtime_ns INTEGER,
+            file_inode INTEGER,
+            FOREIGN KEY(release_id) REFERENCES release(release_id),
+            PRIMARY KEY(release_id, track_number, file_location)
+        )
+    '''
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Creates the release, tracks, media_types, _vinyl_copies and digital_media tables if they do not exist."""
     c = __create_db_tables(
         conn,
         '''
@@ -70,21 +100,17 @@ def setup_database():
         )
     ''',
     )
-    # Connect to the SQLite database
-    conn = sqlite3.connect(config['db']['location'])
-    c = __create_db_tables(
-        conn,
-        '''
+    c.execute('''
         CREATE TABLE IF NOT EXISTS media_types
         (
             id INTEGER PRIMARY KEY,
             format TEXT UNIQUE
         )
-    ''',
-        "INSERT OR IGNORE INTO media_types (format) VALUES ('WAV')",
-    )
+    ''')
+    c.execute("INSERT OR IGNORE INTO media_types (format) VALUES ('WAV')")
     c.execute("INSERT OR IGNORE INTO media_types (format) VALUES ('MP3')")
     c.execute("INSERT OR IGNORE INTO media_types (format) VALUES ('VINYL')")
+    c.execute("INSERT OR IGNORE INTO media_types (format) VALUES ('FLAC')")
 
     c.execute('''
         CREATE TABLE IF NOT EXISTS _vinyl_copies
@@ -96,34 +122,58 @@ def setup_database():
 
     # create table for digital media. This table will store the digital media files that are associated with a release
     # colums: release_id, track name, track_artist, track_number, file_path, file_name, file_location, file_size, media_type
+    # and the file_mtime_ns / file_inode that, with file_size, fingerprint the file for incremental rescans
     # create an index of release_id, create another index of artist, create another index of track name
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS digital_media
-        (
-            release_id INTEGER,
-            track_name TEXT,
-            track_artist TEXT,
-            track_number INTEGER,
-            file_path TEXT,
-            file_name TEXT,
-            file_location TEXT,
-            file_size INTEGER,
-            media_type INTEGER,
-            FOREIGN KEY(release_id) REFERENCES release(release_id),
-            PRIMARY KEY(release_id, track_number)
-        )
-    ''')
+    c.execute(DIGITAL_MEDIA_TABLE.format(name="digital_media"))
+    # Databases created before the fingerprint columns existed
+    columns = {row[1] for row in c.execute("PRAGMA table_info(digital_media)")}
+    for column in ("file_mtime_ns", "file_inode"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE digital_media ADD COLUMN {column} INTEGER")
+    __key_digital_media_on_file_location(c)
     c.execute("CREATE INDEX IF NOT EXISTS idx_release_id ON digital_media(release_id)")
     c.execute("CREATE INDEX IF NOT EXISTS idx_artist ON digital_media(track_artist)")
     c.execute("CREATE INDEX IF NOT EXISTS idx_track_name ON digital_media(track_name)")
     c.execute("CREATE INDEX IF NOT EXISTS idx_media_type ON digital_media(media_type)")
-
+    c.execute("CREATE INDEX IF NOT EXISTS idx_file_location ON digital_media(file_location)")
 
     # Commit the changes
     conn.commit()
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+
+
+def __key_digital_media_on_file_location(c: sqlite3.Cursor) -> None:
+    """
+    Rebuilds a digital_media table keyed on (release_id, track_number) only, where a second copy of a release
+    overwrote the rows of the first, with the file_location in its primary key. Rowids are kept.
+    Dropping the old table drops its triggers, so materialised views are marked stale until they are rebuilt and
+    the change log triggers are installed again.
+    """
+    key = [row[1] for row in sorted(c.execute("PRAGMA table_info(digital_media)"), key=lambda row: row[5]) if row[5]]
+    if "file_location" in key:
+        return
+    logger.info("Adding file_location to the primary key of the digital_media table")
+    columns = ", ".join(row[1] for row in c.execute("PRAGMA table_info(digital_media)"))
+    c.execute("DROP TABLE IF EXISTS digital_media_rekeyed")
+    c.execute(DIGITAL_MEDIA_TABLE.format(name="digital_media_rekeyed"))
+    c.execute(f"INSERT INTO digital_media_rekeyed (rowid, {columns}) SELECT rowid, {columns} FROM digital_media")
+    c.execute("DROP TABLE digital_media")
+    # Views over digital_media (e.g. uber_tracks) are left as they are rather than pointed at the renamed table
+    c.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        c.execute("ALTER TABLE digital_media_rekeyed RENAME TO digital_media")
+    finally:
+        c.execute("PRAGMA legacy_alter_table = OFF")
+
+    tables = {row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if STATE_TABLE in tables:
+        c.execute(f"UPDATE {STATE_TABLE} SET stale = 1")
+        logger.info("Materialised views are stale until rebuilt: python -m db.materialised_views rebuild")
+    if CHANGES_TABLE in tables:
+        try:
+            install_change_log(c.connection)
+        except sqlite3.Error as e:
+            # Changes to digital_media are then only picked up by a full reload
+            logger.warning(f"Cannot reinstall the change log triggers on digital_media: {e}")
 
 
 def __create_db_tables(conn, arg1, arg2):
@@ -1,11 +1,43 @@
+import os
+import re
 import sqlite3
 from dataclasses import dataclass
 
+import numpy as np
+
+from db.facet_index import FacetIndex
+from db.materialised_views import source_table
 from log_config import get_logger
 from typing import Dict, Optional, Any
 
 logger = get_logger(__name__)
 
+# Track attributes that are ordered "naturally" i.e. A2 before A10, CAT-9 before CAT-10
+NATURAL_SORT_ATTRS = {"catalog_number", "track_number"}
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_sort_key(value) -> tuple:
+    """Sort key that orders the digit runs of a value numerically, e.g. 'CAT 9' < 'CAT 10'."""
+    if value is None:
+        return ()
+    parts = _DIGITS.split(str(value).casefold())
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in parts if part)
+
+
+def normalise_path(path: str) -> str:
+    """Case-folded form of a file path with '/' separators, so the same file matches however its path is written."""
+    return os.path.normpath(path).replace("\\", "/").casefold()
+
+
+def sort_key(value) -> tuple:
+    """Sort key that copes with a column holding a mix of numbers, strings and None."""
+    if value is None:
+        return (2, "")
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value).casefold())
+
 
 @dataclass
 class Release:
@@ -48,6 +80,60 @@ class RecordLabel:
     name: str
 
 
+def _get_col(row: sqlite3.Row, names: list[str], default=None):
+    """Returns the first of the named columns present in the row."""
+    for n in names:
+        try:
+            return row[n]
+        except (KeyError, IndexError):
+            continue
+    return default
+
+
+def track_from_row(row: sqlite3.Row) -> Optional[Track]:
+    """
+    Builds a Track from a row of the uber_tracks view, handling minor schema variations (column name differences).
+    Returns None for rows without a track identifier.
+    """
+    tid = _get_col(row, ["track_id", "id"])
+    if tid is None:
+        return None
+
+    return Track(
+        track_id=tid,
+        catalog_number=_get_col(row, ["catalog_number", "catalog_no", "catalog"], ""),
+        label=_get_col(row, ["label", "label_name"], ""),
+        album_title=_get_col(row, ["album_title", "title"], ""),
+        disc_number=_get_col(row, ["disc_number", "disc_no"], 0),
+        track_artist=_get_col(row, ["track_artist", "artist", "album_artist"], ""),
+        track_title=_get_col(row, ["track_title", "name"], ""),
+        format=_get_col(row, ["format", "media"], ""),
+        track_number=_get_col(row, ["track_number", "track_no"], 0),
+        discogs_id=_get_col(row, ["discogs_id"], None),
+        year=_get_col(row, ["year", "date"], 0),
+        country=_get_col(row, ["country"], ""),
+        discogs_url=_get_col(row, ["discogs_url", "url"], ""),
+        album_artist=_get_col(row, ["album_artist", "album_artist_name", "artist"], ""),
+        file_location=_get_col(row, ["file_location", "path", "file_path"], ""),
+        style=_get_col(row, ["style"], ""),
+        genre=_get_col(row, ["genre"], ""),
+        file_id=_get_col(row, ["track_file_id", "file_id", "file_file_id"], None),
+    )
+
+
+def release_of(track: Track) -> Release:
+    """Builds the release of a track from its release columns."""
+    return Release(
+        discogs_id=track.discogs_id,
+        date=track.year,
+        country=track.country,
+        title=track.album_title,
+        album_artist_name=track.album_artist,
+        catalog_number=track.catalog_number,
+        label_name=track.label,
+    )
+
+
 class MusicCatalogDB_2:
     def get_waveform_data(self, file_id: int) -> Optional[bytes]:
         """
@@ -81,6 +167,11 @@ class MusicCatalogDB_2:
         self._label_to_releases: Dict[str, set] = {}
         self._release_to_tracks: Dict[int, set] = {}
         self._track_list: list[Track] = []  # List to hold all tracks
+        self._sort_permutations: Dict[tuple, np.ndarray] = {}  # (attr, descending) -> row positions in sorted order
+        self._facet_index: Optional[FacetIndex] = None  # Built on first use
+        self._facet_index_loader = None  # Reads the facet index of a mapped snapshot on first use
+        self._path_index: Optional[Dict[str, int]] = None  # normalise_path(file_location) -> track_id, built on first use
+        self._change_seq: Optional[int] = None  # High-water mark of the change log applied to the caches
         # self._files_cache: Dict[int, list[str]] = {}  # Placeholder for file cache
         self.connection: Optional[sqlite3.Connection] = self.__connect()
 
@@ -95,11 +186,21 @@ class MusicCatalogDB_2:
         return None
 
     # Python
-    def load(self) -> bool:
+    def load(self, use_snapshot: bool = True) -> bool:
         """
         Loads the database and initializes the tracks cache.
+        If use_snapshot is set, a current on-disk snapshot is mapped instead, and a new one is written after a full load.
         Returns True if successful, False otherwise.
         """
+        from db.catalogue_snapshot import db_signature
+
+        snapshot_loaded = use_snapshot and self.load_snapshot()
+        # Without the change log, refresh() reloads a mapped snapshot in full
+        self.start_change_tracking()
+        if snapshot_loaded:
+            return True
+
+        signature = db_signature(self.db_path)
         connection = self.__connect()
         if connection is None:
             return False
@@ -110,6 +211,8 @@ class MusicCatalogDB_2:
                 return False
             logger.info(f"Loaded {len(self._tracks_cache)} tracks from the database.")
 
+            if use_snapshot:
+                self.save_snapshot(signature)
             return True
         except Exception as e:
             logger.error(f"Failed to load tracks adn releases: {e}")
@@ -123,85 +226,387 @@ class MusicCatalogDB_2:
         Handles minor schema variations (column name differences) gracefully.
         Returns True if loaded, False otherwise.
         """
-
-        def get_col(r: sqlite3.Row, names: list[str], default=None):
-            for n in names:
-                try:
-                    return r[n]
-                except (KeyError, IndexError):
-                    continue
-            return default
-
-        query = "SELECT * FROM uber_tracks"
+        query = f"SELECT * FROM {source_table(conn, 'uber_tracks')}"
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute(query)
         rows = cursor.fetchall()
 
-        if not rows:
-            cursor.close()
-            return True
+        self.clear()
+        self.add_tracks([track for track in (track_from_row(row) for row in rows) if track is not None])
+        cursor.close()
+        return True
+
+    def clear(self) -> None:
+        """Empties the caches, e.g. before a reload."""
+        self._tracks_cache = {}
+        self._releases_cache = {}
+        self._labels_cache = {}
+        self._label_to_releases = {}
+        self._release_to_tracks = {}
+        self._track_list = []
+        self._sort_permutations = {}
+        self._facet_index = None
+        self._facet_index_loader = None
+        self._path_index = None
+
+    def load_snapshot(self) -> bool:
+        """
+        Maps the on-disk snapshot of the catalogue written by save_snapshot(), if it is current.
+        Tracks are built lazily from the mapped columns. Returns False if there is no current snapshot.
+        """
+        from db.catalogue_snapshot import CatalogueSnapshot
+
+        contents = CatalogueSnapshot(self.db_path).load()
+        if contents is None:
+            return False
+        self.clear()
+        self._track_list = contents.tracks
+        self._tracks_cache = contents.tracks_by_id
+        self._releases_cache = contents.releases
+        self._labels_cache = {name: RecordLabel(name=name) for name in contents.labels}
+        self._label_to_releases = contents.label_to_releases
+        self._release_to_tracks = contents.release_to_tracks
+        self._sort_permutations = dict(contents.permutations)
+        self._facet_index_loader = contents.load_facet_index
+        return True
+
+    def save_snapshot(self, signature: Optional[dict] = None) -> bool:
+        """
+        Writes the loaded catalogue, its sort permutations and facet index to disk for load_snapshot().
+        signature is the db_signature() taken before the tracks were read, it defaults to the current one.
+        """
+        from db.catalogue_snapshot import CatalogueSnapshot, db_signature
+
+        return CatalogueSnapshot(self.db_path).save(
+            signature if signature is not None else db_signature(self.db_path),
+            self._track_list,
+            self._releases_cache,
+            list(self._labels_cache),
+            self._label_to_releases,
+            self._sort_permutations,
+            self.get_facet_index(),
+        )
 
-        # Load tracks into cache, keyed by track_id (int)
-        cache = self._tracks_cache
-        for row in rows:
-            tid = get_col(row, ["track_id", "id"])
-            if tid is None:
-                # Skip rows without a track identifier
-                continue
-
-            track = Track(
-                track_id=tid,
-                catalog_number=get_col(row, ["catalog_number", "catalog_no", "catalog"], ""),
-                label=get_col(row, ["label", "label_name"], ""),
-                album_title=get_col(row, ["album_title", "title"], ""),
-                disc_number=get_col(row, ["disc_number", "disc_no"], 0),
-                track_artist=get_col(row, ["track_artist", "artist", "album_artist"], ""),
-                track_title=get_col(row, ["track_title", "name"], ""),
-                format=get_col(row, ["format", "media"], ""),
-                track_number=get_col(row, ["track_number", "track_no"], 0),
-                discogs_id=get_col(row, ["discogs_id"], 0),
-                year=get_col(row, ["year", "date"], 0),
-                country=get_col(row, ["country"], ""),
-                discogs_url=get_col(row, ["discogs_url", "url"], ""),
-                album_artist=get_col(row, ["album_artist", "album_artist_name", "artist"], ""),
-                file_location=get_col(row, ["file_location", "path", "file_path"], ""),
-                style=get_col(row, ["style"], ""),
-                genre=get_col(row, ["genre"], ""),
-                file_id=get_col(row, ["track_file_id", "file_id", "file_file_id"], None),
-            )
-
-            cache[tid] = track
+    def save_snapshot_permutations(self) -> bool:
+        """Adds the sort permutations computed since the snapshot was written to it."""
+        from db.catalogue_snapshot import CatalogueSnapshot
+
+        return CatalogueSnapshot(self.db_path).save_permutations(self._sort_permutations)
+
+    def add_tracks(self, tracks: list[Track]) -> None:
+        """
+        Appends tracks to the caches and derives their releases and labels.
+        Used by load() and to apply the batches streamed by a CatalogueLoader.
+        """
+        self.__materialise()
+        self.__invalidate_indexes()
+        for track in tracks:
+            self._tracks_cache[track.track_id] = track
             self._track_list.append(track)
+            self.__link_track(track)
 
-            discogs_id = get_col(row, ["discogs_id"], None)
-            if discogs_id is not None and discogs_id not in self._releases_cache:
-                release = Release(
-                    discogs_id=discogs_id,
-                    date=track.year,
-                    country=track.country,
-                    title=track.album_title,
-                    album_artist_name=track.album_artist,
-                    catalog_number=track.catalog_number,
-                    label_name=track.label,
-                )
-                self._releases_cache[discogs_id] = release
-
-            label_name = track.label or ""
-            if label_name and label_name not in self._labels_cache:
-                self._labels_cache[label_name] = RecordLabel(name=label_name)
-
-            if discogs_id is not None:
-                self._label_to_releases.setdefault(label_name, set()).add(discogs_id)
-                self._release_to_tracks.setdefault(discogs_id, set()).add(tid)
+    def apply_changes(self, upserts: list[Track], deleted_track_ids: set) -> None:
+        """
+        Applies changed tracks in place: upserted tracks replace the track with the same id (keeping its position)
+        or are appended, deleted tracks are removed. Releases and labels of the affected tracks are updated.
+        """
+        self.__materialise()
+        self.__invalidate_indexes()
+        affected_releases = set()
+        affected_labels = set()
+
+        for track_id in deleted_track_ids | {track.track_id for track in upserts}:
+            old = self._tracks_cache.get(track_id)
+            if old is not None:
+                affected_releases.add(old.discogs_id)
+                affected_labels.add(old.label or "")
+                tracks_of_release = self._release_to_tracks.get(old.discogs_id)
+                if tracks_of_release is not None:
+                    tracks_of_release.discard(track_id)
+
+        positions = {track.track_id: position for position, track in enumerate(self._track_list)}
+        for track in upserts:
+            position = positions.get(track.track_id)
+            if position is None:
+                self._track_list.append(track)
+            else:
+                self._track_list[position] = track
+            self._tracks_cache[track.track_id] = track
+            affected_releases.add(track.discogs_id)
+            affected_labels.add(track.label or "")
+
+        deleted = {track_id for track_id in deleted_track_ids if track_id in self._tracks_cache} - {track.track_id for track in upserts}
+        if deleted:
+            self._track_list = [track for track in self._track_list if track.track_id not in deleted]
+            for track_id in deleted:
+                del self._tracks_cache[track_id]
+
+        # Rebuild the release/label entries of the affected releases from their remaining tracks
+        affected_releases.discard(None)
+        for release_id in affected_releases:
+            for label_name in affected_labels:
+                self._label_to_releases.get(label_name, set()).discard(release_id)
+            if not self._release_to_tracks.get(release_id):
+                self._release_to_tracks.pop(release_id, None)
+                self._releases_cache.pop(release_id, None)
+        for track in upserts:
+            self.__link_track(track, replace_release=True)
+        for release_id in affected_releases:
+            for track_id in self._release_to_tracks.get(release_id, ()):
+                track = self._tracks_cache[track_id]
+                self._label_to_releases.setdefault(track.label or "", set()).add(release_id)
+        for label_name in affected_labels:
+            if not self._label_to_releases.get(label_name):
+                self._label_to_releases.pop(label_name, None)
+                self._labels_cache.pop(label_name, None)
+
+        logger.info(f"Applied {len(upserts)} changed and {len(deleted)} deleted tracks to the catalogue")
+
+    def __link_track(self, track: Track, replace_release: bool = False) -> None:
+        """Adds a track to the release and label maps, creating its release and label if needed."""
+        tid = track.track_id
+        discogs_id = track.discogs_id
+        if discogs_id is not None and (replace_release or discogs_id not in self._releases_cache):
+            self._releases_cache[discogs_id] = release_of(track)
+
+        label_name = track.label or ""
+        if label_name and label_name not in self._labels_cache:
+            self._labels_cache[label_name] = RecordLabel(name=label_name)
+
+        if discogs_id is not None:
+            self._label_to_releases.setdefault(label_name, set()).add(discogs_id)
+            self._release_to_tracks.setdefault(discogs_id, set()).add(tid)
+
+    def __materialise(self) -> None:
+        """Turns caches backed by a snapshot into plain lists/dicts before they are modified."""
+        if not isinstance(self._track_list, list):
+            self._track_list = list(self._track_list)
+            self._tracks_cache = dict(self._tracks_cache)
+            self._release_to_tracks = dict(self._release_to_tracks)
+
+    def __invalidate_indexes(self) -> None:
+        self._sort_permutations.clear()
+        self._facet_index = None
+        self._facet_index_loader = None
+        self._path_index = None
+
+    def start_change_tracking(self) -> bool:
+        """
+        Installs the change log triggers (see db.change_log) and records its high-water mark, so that refresh() can
+        apply the changes made from now on, then prunes the changes before the mark. Call before reading the tracks
+        and before taking the db_signature() of a snapshot. Returns False if the log is unavailable or not enabled
+        with config.ini [db] change_log, in which case refresh() reloads the catalogue.
+        """
+        from db import change_log
 
-        cursor.close()
-        return True
+        if not change_log.change_log_enabled():
+            self._change_seq = None
+            return False
+        connection = self.__connect()
+        if connection is None:
+            return False
+        try:
+            change_log.install_change_log(connection)
+            self._change_seq = change_log.high_water_mark(connection)
+            change_log.prune_changes(connection, self._change_seq)
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Change tracking unavailable for {self.db_path}: {e}")
+            self._change_seq = None
+            return False
+        finally:
+            connection.close()
+
+    def prune_change_log(self) -> None:
+        """
+        Deletes the logged changes already applied to the catalogue. This writes to the database, so call it before
+        taking the db_signature() of a snapshot, not after.
+        """
+        from db import change_log
+
+        if self._change_seq is None:
+            return
+        connection = self.__connect()
+        if connection is None:
+            return
+        try:
+            deleted = change_log.prune_changes(connection, self._change_seq)
+            if deleted:
+                logger.info(f"Pruned {deleted} applied changes from the change log")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to prune the change log of {self.db_path}: {e}")
+        finally:
+            connection.close()
+
+    def refresh(self) -> bool:
+        """
+        Applies the inserts, updates and deletes logged since the last load/refresh. Changes are mapped to tracks via
+        the view column holding the rowid of the changed table; changes that cannot be mapped fall back to a full reload.
+        Returns True if the catalogue changed.
+        """
+        from db import change_log
+
+        if self._change_seq is None:
+            logger.info("No change log high-water mark: reloading the catalogue")
+            return self.load(use_snapshot=False)
+
+        connection = self.__connect()
+        if connection is None:
+            return False
+        try:
+            if change_log.changes_pruned(connection, self._change_seq):
+                # Another reader pruned changes not applied here, so the log cannot say what changed
+                logger.info("Changes not yet applied have been pruned from the change log: reloading the catalogue")
+                new_seq = change_log.high_water_mark(connection)
+                self.__load_tracks(connection)
+                self._change_seq = new_seq
+                return True
+
+            changes = change_log.changes_since(connection, self._change_seq)
+            if not changes:
+                return False
+            new_seq = changes[-1][0]
+
+            key_columns = change_log.view_key_columns(connection)
+            changed_rows: Dict[str, Dict[str, set]] = {}
+            for _, table, row_id, row_key, op in changes:
+                # Tables shown in the view by their row_key column are found by it, the others by their rowid
+                by_key = table in change_log.ROW_KEY_COLUMNS and key_columns.get(table) == change_log.ROW_KEY_COLUMNS[table]
+                changed_rows.setdefault(table, {}).setdefault(op, set()).add(row_key if by_key else row_id)
+
+            # Tracks only leave the view on a delete; we can only tell which ones if the Track carries the key.
+            # Changes logged before the table had a row_key have None in place of the key.
+            unmapped = [
+                table
+                for table, ops in changed_rows.items()
+                if table not in key_columns or ("D" in ops and key_columns[table] not in change_log.TRACK_ATTR_OF_COLUMN) or any(None in rows for rows in ops.values())
+            ]
+            if unmapped:
+                logger.info(f"Changes to {', '.join(unmapped)} cannot be mapped to tracks: reloading the catalogue")
+                self.__load_tracks(connection)
+                self._change_seq = new_seq
+                return True
+
+            connection.row_factory = sqlite3.Row
+            source = source_table(connection, "uber_tracks")
+            upserts: Dict[int, Track] = {}
+            deleted_track_ids = set()
+            for table, ops in changed_rows.items():
+                column = key_columns[table]
+                row_ids = list(set().union(*ops.values()))
+                attr = change_log.TRACK_ATTR_OF_COLUMN.get(column)
+                if attr is not None:
+                    # Re-read every track showing a changed row, tracks no longer in the view are deleted
+                    row_id_set = set(row_ids)
+                    deleted_track_ids.update(track.track_id for track in self._track_list if getattr(track, attr) in row_id_set)
+                for start in range(0, len(row_ids), 500):
+                    chunk = row_ids[start : start + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    for row in connection.execute(f"SELECT * FROM {source} WHERE {column} IN ({placeholders})", chunk):
+                        track = track_from_row(row)
+                        if track is not None:
+                            upserts[track.track_id] = track
+
+            self.apply_changes(list(upserts.values()), deleted_track_ids - upserts.keys())
+            self._change_seq = new_seq
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to refresh the catalogue from the change log: {e}")
+            return False
+        finally:
+            connection.close()
 
     # Retrieval methods:
     def get_all_tracks(self) -> list[Track]:
         return self._track_list
 
+    def get_sort_permutation(self, attr: str, descending: bool = False) -> np.ndarray:
+        """
+        Returns the positions of the tracks in get_all_tracks() ordered by the given attribute.
+        The sort is stable, and catalog/track numbers use natural ordering. Permutations are computed once and cached.
+        """
+        cache_key = (attr, descending)
+        permutation = self._sort_permutations.get(cache_key)
+        if permutation is None:
+            key_fn = natural_sort_key if attr in NATURAL_SORT_ATTRS else sort_key
+            # Only the distinct keys are sorted in Python, the tracks are ordered by the rank of their key with numpy
+            keys = [key_fn(getattr(track, attr, None)) for track in self._track_list]
+            rank_of = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+            ranks = np.fromiter((rank_of[key] for key in keys), dtype=np.int64, count=len(keys))
+            permutation = np.argsort(-ranks if descending else ranks, kind="stable").astype(np.int64, copy=False)
+            self._sort_permutations[cache_key] = permutation
+            logger.info(f"Built sort permutation for '{attr}' ({'desc' if descending else 'asc'}) over {len(keys)} tracks")
+        return permutation
+
+    def get_facet_index(self) -> FacetIndex:
+        """Returns the genre/style/year/country/format bitmap index over get_all_tracks(). Built once and cached."""
+        if self._facet_index is None and self._facet_index_loader is not None:
+            self._facet_index = self._facet_index_loader()
+            self._facet_index_loader = None
+        if self._facet_index is None or self._facet_index.size != len(self._track_list):
+            self._facet_index = FacetIndex(self._track_list)
+        return self._facet_index
+
+    def get_track_by_path(self, path: str) -> Optional[Track]:
+        """
+        Returns the track stored at the given file path, e.g. a file picked in the file explorer, or None if the file
+        is not in the catalogue. Paths are compared case-folded and separator-normalised through a hash index.
+        When no tracks are held in memory (e.g. with the paged track view, which does not load them) the database
+        is queried instead, matching the path as written.
+        """
+        if not path:
+            return None
+        if not self._track_list and self.connection is not None:
+            from db import catalog_query
+
+            try:
+                return catalog_query.track_by_path(self.connection, path)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to look up '{path}' in the database: {e}")
+                return None
+        if self._path_index is None:
+            self._path_index = self.__build_path_index()
+        track_id = self._path_index.get(normalise_path(path))
+        return self._tracks_cache.get(track_id) if track_id is not None else None
+
+    def get_track_files(self) -> list[tuple[int, str]]:
+        """Returns (file_id, file_location) of every loaded track, e.g. for an integrity check."""
+        tracks = self._track_list
+        if isinstance(tracks, list):
+            return [(track.file_id, track.file_location) for track in tracks]
+        return list(zip(tracks.column_values("file_id"), tracks.column_values("file_location")))
+
+    def __build_path_index(self) -> Dict[str, int]:
+        tracks = self._track_list
+        if isinstance(tracks, list):
+            pairs = ((track.file_location, track.track_id) for track in tracks)
+        else:
+            # Read a mapped snapshot's columns without building every Track
+            pairs = zip(tracks.column_values("file_location"), tracks.column_values("track_id"))
+        index = {normalise_path(location): track_id for location, track_id in pairs if location}
+        logger.info(f"Built path index over {len(index)} track files")
+        return index
+
+    # Queries pushed down to SQL, see db.catalog_query. These read the database, not the caches.
+    def query_tracks(self, query, limit: Optional[int] = None, offset: int = 0) -> list[Track]:
+        """Returns the tracks matching a TrackQuery, optionally one LIMIT/OFFSET page of them."""
+        from db import catalog_query
+
+        return catalog_query.query_tracks(self.connection, query, limit, offset)
+
+    def count_matching_tracks(self, query) -> int:
+        """Returns the number of tracks matching a TrackQuery."""
+        from db import catalog_query
+
+        return catalog_query.count_tracks(self.connection, query)
+
+    def query_page(self, query, after=None, limit: int = 500):
+        """Returns a keyset page of the tracks matching a TrackQuery, and the key of the next page (None after the last)."""
+        from db import catalog_query
+
+        return catalog_query.query_page(self.connection, query, after, limit)
+
     def get_tracks_for_label(self, label_name: str) -> list[Track]:
         track_ids = set()
         for release_id in self._label_to_releases.get(label_name, set()):
@@ -0,0 +1,177 @@
+import configparser
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+
+from db.change_log import ROW_KEY_COLUMNS, view_base_tables, view_key_columns
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Views that can be materialised, and the table holding their rows
+MATERIALISED_VIEWS = {"uber_tracks": "uber_tracks_mat", "full_releases": "full_releases_mat"}
+
+# Indexes created on the materialised table when the view has all their columns. The track_id suffix makes the
+# label/release/path indexes cover the filtered, keyset paginated queries of db.catalog_query.
+INDEXED_COLUMNS = {
+    "uber_tracks": [
+        ("track_id",),
+        ("file_id",),
+        ("track_file_id",),
+        ("label", "catalog_number", "track_id"),
+        ("catalog_number", "track_id"),
+        ("discogs_id", "track_id"),
+        ("file_location", "track_id"),
+    ],
+    "full_releases": [("release_id",), ("discogs_id",), ("label_id",), ("catalog_number",)],
+}
+
+STATE_TABLE = "materialised_views"
+
+
+def materialisation_enabled() -> bool:
+    """Materialised tables are only read when config.ini [db] materialise_views is set."""
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    return config.getboolean("db", "materialise_views", fallback=False)
+
+
+def __view_sql(conn: sqlite3.Connection, view: str) -> Optional[str]:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (view,)).fetchone()
+    return row[0] if row else None
+
+
+def __trigger_names(conn: sqlite3.Connection, view: str) -> List[str]:
+    prefix = f"{MATERIALISED_VIEWS[view]}_"
+    return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", (prefix + "%",))]
+
+
+def source_table(conn: sqlite3.Connection, view: str) -> str:
+    """
+    Returns the table to read the rows of a view from: its materialised table if materialisation is enabled and the
+    table is current, otherwise the view itself.
+    """
+    if view not in MATERIALISED_VIEWS or not materialisation_enabled():
+        return view
+    try:
+        row = conn.execute(f"SELECT view_sql, stale FROM {STATE_TABLE} WHERE view = ?", (view,)).fetchone()
+    except sqlite3.Error:
+        return view
+    if row is None:
+        logger.info(f"{view} is not materialised yet, run: python -m db.materialised_views rebuild")
+        return view
+    view_sql, stale = row
+    if stale or view_sql != __view_sql(conn, view):
+        logger.warning(f"Materialised {view} is out of date, reading the view. Run: python -m db.materialised_views rebuild")
+        return view
+    return MATERIALISED_VIEWS[view]
+
+
+def rebuild(conn: sqlite3.Connection, view: str) -> int:
+    """
+    (Re)creates the materialised table of a view with its indexes, and the triggers on the base tables that keep it
+    current. Changes to base tables the triggers cannot map to rows mark the table stale until it is rebuilt.
+    Returns the number of rows materialised.
+    """
+    table = MATERIALISED_VIEWS[view]
+    view_sql = __view_sql(conn, view)
+    if view_sql is None:
+        raise ValueError(f"View {view} does not exist")
+
+    with conn:
+        for name in __trigger_names(conn, view):
+            conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM {view}")
+
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for index_columns in INDEXED_COLUMNS.get(view, []):
+            if columns.issuperset(index_columns):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(index_columns)} ON {table}({', '.join(index_columns)})")
+
+        key_columns = view_key_columns(conn, view)
+        for base_table in view_base_tables(conn, view):
+            __create_triggers(conn, view, base_table, key_columns.get(base_table))
+
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE}
+            (
+                view TEXT PRIMARY KEY,
+                mat_table TEXT,
+                view_sql TEXT,
+                stale INTEGER DEFAULT 0,
+                built_at TEXT
+            )
+        """
+        )
+        conn.execute(f"INSERT OR REPLACE INTO {STATE_TABLE} (view, mat_table, view_sql, stale, built_at) VALUES (?, ?, ?, 0, datetime('now'))", (view, table, view_sql))
+
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    logger.info(f"Materialised {view} into {table}: {count} rows")
+    return count
+
+
+def __create_triggers(conn: sqlite3.Connection, view: str, base_table: str, key_column: Optional[str]) -> None:
+    """Creates the triggers on one base table that re-derive the affected rows of the materialised table."""
+    table = MATERIALISED_VIEWS[view]
+    prefix = f"{table}_{base_table}"
+    if key_column is None:
+        mark_stale = f"UPDATE {STATE_TABLE} SET stale = 1 WHERE view = '{view}';"
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'CREATE TRIGGER "{prefix}_{op.lower()}" AFTER {op} ON "{base_table}" BEGIN {mark_stale} END')
+        logger.warning(f"{view} has no column keyed on {base_table}: changes to it mark {table} stale")
+        return
+
+    # The view shows the rowid of the base table, or for the tables of ROW_KEY_COLUMNS the key column itself
+    key = key_column if ROW_KEY_COLUMNS.get(base_table) == key_column else "rowid"
+
+    def replace_rows(row: str) -> str:
+        return f"DELETE FROM {table} WHERE {key_column} = {row}.{key}; INSERT INTO {table} SELECT * FROM {view} WHERE {key_column} = {row}.{key};"
+
+    conn.execute(f'CREATE TRIGGER "{prefix}_insert" AFTER INSERT ON "{base_table}" BEGIN {replace_rows("NEW")} END')
+    conn.execute(f'CREATE TRIGGER "{prefix}_update" AFTER UPDATE ON "{base_table}" BEGIN {replace_rows("OLD")} {replace_rows("NEW")} END')
+    conn.execute(f'CREATE TRIGGER "{prefix}_delete" AFTER DELETE ON "{base_table}" BEGIN DELETE FROM {table} WHERE {key_column} = OLD.{key}; END')
+
+
+def drop(conn: sqlite3.Connection, view: str) -> None:
+    """Removes the materialised table of a view and its triggers, readers go back to the view."""
+    with conn:
+        for name in __trigger_names(conn, view):
+            conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+        conn.execute(f"DROP TABLE IF EXISTS {MATERIALISED_VIEWS[view]}")
+        try:
+            conn.execute(f"DELETE FROM {STATE_TABLE} WHERE view = ?", (view,))
+        except sqlite3.Error:
+            pass
+    logger.info(f"Dropped materialised {view}")
+
+
+def __default_db_path() -> Optional[str]:
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    if config.has_section("db") and config["db"].get("location") and config["db"].get("name"):
+        return os.path.join(config["db"]["location"], config["db"]["name"])
+    return None
+
+
+if __name__ == "__main__":
+    # python -m db.materialised_views rebuild|drop [db path]
+    command = sys.argv[1] if len(sys.argv) > 1 else "rebuild"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else __default_db_path()
+    if command not in ("rebuild", "drop") or not db_path:
+        print("Usage: python -m db.materialised_views rebuild|drop [db path]")
+        sys.exit(1)
+
+    connection = sqlite3.connect(db_path)
+    existing_views = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+    for name in MATERIALISED_VIEWS:
+        if name not in existing_views:
+            print(f"Skipping {name}: no such view in {db_path}")
+        elif command == "rebuild":
+            print(f"{name}: {rebuild(connection, name)} rows materialised")
+        else:
+            drop(connection, name)
+            print(f"{name}: materialised table dropped")
+    connection.close()
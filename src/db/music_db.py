@@ -1,6 +1,7 @@
 import sqlite3
 from dataclasses import dataclass
 
+from db.materialised_views import source_table
 from log_config import get_logger
 from typing import Dict, Optional, Any
 
@@ -118,7 +119,7 @@ class MusicCatalogDB:
         Loads tracks from the uber tracks view into the cache.
         Returns a dictionary where each key is the track_id.
         """
-        query = "SELECT * FROM uber_tracks"
+        query = f"SELECT * FROM {source_table(conn, 'uber_tracks')}"
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute(query)
@@ -160,7 +161,7 @@ class MusicCatalogDB:
         :param conn: Database connection object.
         :return: Dictionary with discogs_id as keys and release information as values.
         """
-        query = "SELECT * FROM full_releases"
+        query = f"SELECT * FROM {source_table(conn, 'full_releases')}"
         cache = self._releases_cache
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
@@ -0,0 +1,200 @@
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional, Tuple
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+APIC_HEADER_READ = 4096  # Bytes read from the start of an APIC frame to parse its header, the image data is not read
+ID3_ENCODING_TERMINATORS = {0: b"\0", 1: b"\0\0", 2: b"\0\0", 3: b"\0"}
+ID3_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+FLAC_PICTURE = 6
+
+
+class ArtworkParseError(Exception):
+    """The artwork headers cannot be read without parsing the whole tag, e.g. an unsynchronised or compressed ID3 tag."""
+
+
+@dataclass
+class ArtworkInfo:
+    """
+    An image embedded in an audio file, described from its headers: the image bytes are only read from the file
+    when data is first accessed. Has the attributes of a mutagen APIC (type, mime, desc, data) so it can be shown
+    by the same code.
+    """
+
+    path: str
+    type: int
+    mime: str
+    desc: str
+    size: int  # Bytes of image data
+    offset: int  # Position of the image data in the file, -1 if the data was read with the headers
+    fingerprint: Tuple[int, int] = (0, 0)  # (size, mtime_ns) of the file when it was parsed
+    _data: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = self.read()
+        return self._data
+
+    def read(self) -> bytes:
+        """Reads the image bytes. If the file has changed since it was parsed, the image at the same position is read."""
+        if self.offset < 0:
+            return self._data or b""
+        current = _fingerprint(self.path)
+        if current != self.fingerprint:
+            images = read_artwork_info(self.path)
+            same = [image for image in images if (image.type, image.mime, image.desc) == (self.type, self.mime, self.desc)]
+            return same[0].data if same else b""
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(self.size)
+        if len(data) != self.size:
+            logger.warning(f"Artwork in '{self.path}' is truncated: read {len(data)} of {self.size} bytes")
+        return data
+
+
+def _fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def read_artwork_info(path: str) -> List[ArtworkInfo]:
+    """
+    Lists the images embedded in an MP3 or WAV (ID3v2) or FLAC file from their headers, seeking past the image data.
+    Raises ArtworkParseError for tags that cannot be walked that way, and OSError if the file cannot be read.
+    """
+    fingerprint = _fingerprint(path)
+    with open(path, "rb") as file:
+        magic = file.read(12)
+        if magic[:4] == b"fLaC":
+            images = _flac_pictures(file, path)
+        elif magic[:3] == b"ID3":
+            images = _id3_pictures(file, path, 0)
+        elif magic[:4] == b"RIFF" and magic[8:12] == b"WAVE":
+            images = _wav_pictures(file, path)
+        else:
+            raise ArtworkParseError(f"Unsupported file format: '{path}'")
+    for image in images:
+        image.fingerprint = fingerprint
+    return images
+
+
+def _read_exact(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ArtworkParseError(f"Unexpected end of file in '{file.name}'")
+    return data
+
+
+def _synchsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _wav_pictures(file: BinaryIO, path: str) -> List[ArtworkInfo]:
+    """Finds the ID3 chunk of a RIFF/WAVE file."""
+    file.seek(12)
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return []
+        chunk_id, chunk_size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id in (b"id3 ", b"ID3 "):
+            return _id3_pictures(file, path, file.tell())
+        file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def _id3_pictures(file: BinaryIO, path: str, start: int) -> List[ArtworkInfo]:
+    """Walks the frames of an ID3v2 tag starting at start, reading only the headers of APIC/PIC frames."""
+    file.seek(start)
+    header = _read_exact(file, 10)
+    if header[:3] != b"ID3":
+        return []
+    major, flags = header[3], header[5]
+    if flags & 0x80:
+        raise ArtworkParseError(f"Unsynchronised ID3 tag in '{path}'")
+    end = start + 10 + _synchsafe(header[6:10])
+    if flags & 0x40:
+        # Extended header: its size includes itself in v2.4, not in v2.3
+        extended = _read_exact(file, 4)
+        file.seek(_synchsafe(extended) - 4 if major == 4 else struct.unpack(">I", extended)[0], os.SEEK_CUR)
+
+    frame_header_size, picture_id = (6, b"PIC") if major == 2 else (10, b"APIC")
+    images = []
+    while file.tell() + frame_header_size <= end:
+        frame_header = _read_exact(file, frame_header_size)
+        if frame_header[0] == 0:
+            break  # Padding
+        if major == 2:
+            frame_id, frame_size, frame_flags = frame_header[:3], int.from_bytes(frame_header[3:6], "big"), 0
+        else:
+            frame_id, frame_flags = frame_header[:4], int.from_bytes(frame_header[8:10], "big")
+            frame_size = _synchsafe(frame_header[4:8]) if major == 4 else struct.unpack(">I", frame_header[4:8])[0]
+        frame_start = file.tell()
+        if frame_id == picture_id:
+            images.append(_id3_picture(file, path, major, frame_flags, frame_start, frame_size))
+        file.seek(frame_start + frame_size)
+    return images
+
+
+def _id3_picture(file: BinaryIO, path: str, major: int, frame_flags: int, frame_start: int, frame_size: int) -> ArtworkInfo:
+    data_start = frame_start
+    if major == 3 and frame_flags & 0x00C0 or major == 4 and frame_flags & 0x000E:
+        raise ArtworkParseError(f"Compressed, encrypted or unsynchronised picture frame in '{path}'")
+    if major == 4 and frame_flags & 0x0001:
+        data_start += 4  # Data length indicator
+
+    head = file.read(min(APIC_HEADER_READ, frame_start + frame_size - data_start))
+    encoding = head[0]
+    if encoding not in ID3_ENCODINGS:
+        raise ArtworkParseError(f"Unknown text encoding {encoding} in picture frame of '{path}'")
+    if major == 2:
+        # PIC: a three character image format instead of a MIME type
+        image_format = head[1:4].decode("latin-1").upper()
+        mime, position = {"JPG": "image/jpeg", "PNG": "image/png"}.get(image_format, f"image/{image_format.lower()}"), 4
+    else:
+        mime_end = head.index(b"\0", 1)
+        mime, position = head[1:mime_end].decode("latin-1"), mime_end + 1
+    picture_type = head[position]
+    position += 1
+
+    terminator = ID3_ENCODING_TERMINATORS[encoding]
+    desc_end = position
+    while True:
+        desc_end = head.find(terminator, desc_end)
+        if desc_end < 0:
+            raise ArtworkParseError(f"Picture description longer than {APIC_HEADER_READ} bytes in '{path}'")
+        if len(terminator) == 1 or (desc_end - position) % 2 == 0:
+            break
+        desc_end += 1
+    desc = head[position:desc_end].decode(ID3_ENCODINGS[encoding], errors="replace")
+    image_offset = data_start + desc_end + len(terminator)
+    return ArtworkInfo(path, picture_type, mime, desc, frame_start + frame_size - image_offset, image_offset)
+
+
+def _flac_pictures(file: BinaryIO, path: str) -> List[ArtworkInfo]:
+    """Walks the metadata blocks of a FLAC file, reading only the headers of PICTURE blocks."""
+    file.seek(4)
+    images = []
+    while True:
+        block_header = file.read(4)
+        if len(block_header) < 4:
+            return images
+        last, block_type, block_size = block_header[0] & 0x80, block_header[0] & 0x7F, int.from_bytes(block_header[1:4], "big")
+        block_start = file.tell()
+        if block_type == FLAC_PICTURE:
+            picture_type, mime_length = struct.unpack(">II", _read_exact(file, 8))
+            mime = _read_exact(file, mime_length).decode("ascii", errors="replace")
+            desc = _read_exact(file, struct.unpack(">I", _read_exact(file, 4))[0]).decode("utf-8", errors="replace")
+            file.seek(16, os.SEEK_CUR)  # width, height, colour depth, colours used
+            data_length = struct.unpack(">I", _read_exact(file, 4))[0]
+            images.append(ArtworkInfo(path, picture_type, mime, desc, data_length, file.tell()))
+        if last:
+            return images
+        file.seek(block_start + block_size)
@@ -389,10 +389,8 @@ def __get_release_id(file_path) -> str:
         logger.info(f"{release_id} - Found release id in file name: {file_path}")
         return release_id
 
-    elif audio_tag_helper.get_tags(file_path) is not None:
-        release_id = audio_tag_helper.get_tags(file_path)[audio_tag_helper.DISCOGS_RELEASE_ID][0]
-        if release_id is not None:
-            return release_id
+    elif release_id := audio_tag_helper.get_release_id(audio_tag_helper.get_tags(file_path)):
+        return release_id
 
     logger.error(f"Could not find release id in file name: {file_path}")
     return None
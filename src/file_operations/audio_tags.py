@@ -1,21 +1,127 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
 from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple
 from log_config import get_logger
+from file_operations.artwork import ArtworkInfo, ArtworkParseError, read_artwork_info
 import taglib
 from mutagen.wave import WAVE
 from mutagen.id3 import ID3, APIC, ID3NoHeaderError
 from mutagen.flac import FLAC, Picture
+from mutagen.mp3 import MP3
 from mutagen import File
 
 AUDIO_EXTENSIONS = [".mp3", ".wav",".flac"]
+TAG_READ_WORKERS = 8
 logger = get_logger(__name__)
 
 
+@dataclass
+class TagCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0  # Lookups that found an entry for a file changed since it was read
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), {self.stale} stale, {self.evictions} evicted, {self.invalidations} invalidated"
+
+
+class TagCache:
+    """
+    Process-wide LRU cache of the tags and cover art read from audio files, so the same file is not parsed again for
+    every caller. Entries are keyed by path and validated against the file's size and mtime_ns, so a file changed by
+    another program is re-read; writes through AudioTagHelper invalidate its entries directly. Memory is bounded by
+    the number of entries and by the total size of the cached artwork.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_artwork_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_artwork_bytes = max_artwork_bytes
+        self.stats = TagCacheStats()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any, int]]" = OrderedDict()  # (path, kind) -> (fingerprint, value, bytes)
+        self._artwork_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path: str, kind: str, fingerprint: Optional[Tuple[int, int]]) -> Optional[Any]:
+        """Returns the cached value if it was read from the file as it is now (same fingerprint), otherwise None."""
+        key = (os.path.abspath(path), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            if fingerprint is None or entry[0] != fingerprint:
+                self.stats.stale += 1
+                self.stats.misses += 1
+                self.__remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def put(self, path: str, kind: str, fingerprint: Optional[Tuple[int, int]], value: Any, size: int = 0) -> None:
+        if fingerprint is None or size > self.max_artwork_bytes:
+            return
+        key = (os.path.abspath(path), kind)
+        with self._lock:
+            self.__remove(key)
+            self._entries[key] = (fingerprint, value, size)
+            self._artwork_bytes += size
+            while len(self._entries) > self.max_entries or self._artwork_bytes > self.max_artwork_bytes:
+                self.__remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        """Drops everything cached for a file, e.g. after writing to it."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                self.__remove(key)
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._artwork_bytes = 0
+
+    def __remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._artwork_bytes -= entry[2]
+
+
+TAG_CACHE = TagCache()
+
+
 # The AudioTags class is used to manage and manipulate audio tags.
 class AudioTagHelper:
     
     def __init__(self):
         pass
         
+    def transaction(self, absolute_path_filename: str) -> "TagTransaction":
+        """Returns a TagTransaction on the file, to use in a with block."""
+        return TagTransaction(absolute_path_filename)
+
     def get_tags_and_cover_art(self, absolute_path_filename: str) -> tuple[dict,list[APIC]]:
         
         tags = self.get_tags(absolute_path_filename)
@@ -26,8 +132,15 @@ class AudioTagHelper:
         if not self.isSupportedAudioFile(absolute_path_filename):
             return {}
 
+        fingerprint = TAG_CACHE.fingerprint(absolute_path_filename)
+        tags = TAG_CACHE.get(absolute_path_filename, "tags", fingerprint)
+        if tags is not None:
+            # Callers may edit the returned tags before writing them back
+            return {key: list(values) for key, values in tags.items()}
+
         try:
-            tags = taglib.File(Path(absolute_path_filename)).tags
+            with taglib.File(absolute_path_filename) as file:
+                tags = dict(file.tags)
 
         except FileNotFoundError:
             logger.exception(f"File not found: '{absolute_path_filename}'")
@@ -37,13 +150,64 @@ class AudioTagHelper:
             logger.exception(f"Could not read tags from: '{absolute_path_filename}'")
             return {}
 
+        TAG_CACHE.put(absolute_path_filename, "tags", fingerprint, {key: list(values) for key, values in tags.items()})
         if not tags:
             logger.warning(f"No tags found in file: '{absolute_path_filename}'")
             return {}
 
         logger.info(f"Found tags in file: '{absolute_path_filename}' tags:'{tags}'")
         return tags
-    
+
+    def get_tags_many(self, paths: Iterable[str], ordered: bool = True, workers: int = TAG_READ_WORKERS) -> Iterator[Tuple[str, Optional[dict]]]:
+        """
+        Reads the tags of many files on a thread pool, so the latency of one file (e.g. on a NAS) overlaps the others.
+        Yields (path, tags) in the order of paths, or as each read completes if not ordered; tags is None if the file
+        could not be read. Only a few reads per worker run ahead of the consumer, and those not started are cancelled
+        if the consumer stops early.
+        """
+        paths = iter(paths)
+        window = workers * 4
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tags")
+        try:
+            if ordered:
+                pending = deque((path, pool.submit(self.__get_tags_or_none, path)) for path in itertools.islice(paths, window))
+                while pending:
+                    path, future = pending.popleft()
+                    for next_path in itertools.islice(paths, 1):
+                        pending.append((next_path, pool.submit(self.__get_tags_or_none, next_path)))
+                    yield path, future.result()
+            else:
+                running = {pool.submit(self.__get_tags_or_none, path): path for path in itertools.islice(paths, window)}
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = running.pop(future)
+                        for next_path in itertools.islice(paths, 1):
+                            running[pool.submit(self.__get_tags_or_none, next_path)] = next_path
+                        yield path, future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def __get_tags_or_none(self, absolute_path_filename: str) -> Optional[dict]:
+        try:
+            return self.get_tags(absolute_path_filename)
+        except Exception:
+            logger.exception(f"Could not read tags from: '{absolute_path_filename}'")
+            return None
+
+    def get_duration(self, absolute_path_filename: str) -> float:
+        """Returns the duration in seconds read from the file header (0 if unknown), without decoding the audio."""
+        return float(self.get_tags_and_duration(absolute_path_filename)[1])
+
+    def get_tags_and_duration(self, absolute_path_filename: str) -> tuple[dict, int]:
+        """Returns the tags and the duration in seconds of the file (0 if unknown), reading the file once."""
+        try:
+            with taglib.File(absolute_path_filename) as file:
+                return dict(file.tags), int(file.length or 0)
+        except Exception:
+            logger.exception(f"Could not read tags from: '{absolute_path_filename}'")
+            return {}, 0
+
     # Given a collection of tags and a fully qualified filename, write the tags to the file
     def write_tags(self, absolute_path_filename: str, tags: dict) -> None:
         if not self.isSupportedAudioFile(absolute_path_filename):
@@ -55,6 +219,8 @@ class AudioTagHelper:
             file.save()
         except Exception:
             logger.exception(f"Could not write tags to file: '{absolute_path_filename}'")
+        finally:
+            TAG_CACHE.invalidate(absolute_path_filename)
             
 
     def isSupportedAudioFile(self, absolute_path_filename: str) -> bool:
@@ -73,6 +239,38 @@ class AudioTagHelper:
         if not self.isSupportedAudioFile(absolute_path_filename):
             return None
 
+        fingerprint = TAG_CACHE.fingerprint(absolute_path_filename)
+        cover_art = TAG_CACHE.get(absolute_path_filename, "cover_art", fingerprint)
+        if cover_art is None:
+            cover_art = self.__read_cover_art(absolute_path_filename)
+            TAG_CACHE.put(absolute_path_filename, "cover_art", fingerprint, cover_art, sum(len(art.data) for art in cover_art))
+        return list(cover_art)
+
+    def get_artwork_info(self, absolute_path_filename: str) -> list[ArtworkInfo]:
+        """
+        Returns the type, mime, description, size and offset of each image in the file without reading the image
+        data, which each ArtworkInfo reads when its data is first used. Tags the header parser cannot walk (e.g.
+        unsynchronised ID3) are read in full with mutagen.
+        """
+        if not self.isSupportedAudioFile(absolute_path_filename):
+            return []
+
+        fingerprint = TAG_CACHE.fingerprint(absolute_path_filename)
+        images = TAG_CACHE.get(absolute_path_filename, "artwork_info", fingerprint)
+        if images is None:
+            try:
+                images = read_artwork_info(absolute_path_filename)
+            except (ArtworkParseError, OSError, ValueError, IndexError) as e:
+                logger.debug(f"Reading all cover art of '{absolute_path_filename}': {e}")
+                images = [
+                    ArtworkInfo(absolute_path_filename, art.type, art.mime, art.desc, len(art.data), -1, fingerprint or (0, 0), art.data)
+                    for art in self.get_cover_art(absolute_path_filename) or []
+                ]
+            TAG_CACHE.put(absolute_path_filename, "artwork_info", fingerprint, images, sum(image.size for image in images if image.offset < 0))
+        # Copies, so image data read by a caller is not kept in the cache
+        return [replace(image) for image in images]
+
+    def __read_cover_art(self, absolute_path_filename: str) -> list[APIC]:
         path = Path(absolute_path_filename)
 
         if path.suffix == ".wav":
@@ -96,23 +294,14 @@ class AudioTagHelper:
         
     # Given a collection of cover art, a List[APIC] data and a fully qualified filename, write the cover art to the file, using mutagen
     def write_cover_art(self, absolute_path_filename: str, cover_art: list[APIC]) -> None:
-        
+
         if not self.isSupportedAudioFile(absolute_path_filename):
             return
-        
-        path = Path(absolute_path_filename)
 
-        if path.suffix == ".wav":
-            filedata = WAVE(absolute_path_filename)
-            for art in cover_art:
-                filedata.tags.add(art)
-            filedata.save()
-        
         try:
-            file = ID3(absolute_path_filename)
-            for art in cover_art:
-                file.add(art)
-            file.save()
+            with self.transaction(absolute_path_filename) as transaction:
+                for art in cover_art:
+                    transaction.add_cover_art(art)
         except Exception:
             logger.exception(f"Could not write cover art to file: '{absolute_path_filename}'")
 
@@ -145,12 +334,7 @@ class AudioTagHelper:
         else:
             audio = File(file_path)
 
-        for key, value in audio.items():
-            # if the key starts with APIC
-            if key.startswith("APIC") or key.startswith("PICTURE"):
-                logger.info(f"{key} - {value.pprint()} type={value.type} des={value.desc} mime={value.mime} enc={value.encoding}")
-            else:
-                logger.info(f"{key}  - {value} ")
+        _log_tag_items(audio.items())
 
     def log_tags(self, file_path: str) -> None:
 
@@ -194,6 +378,146 @@ class AudioTagHelper:
         return tags[self.DISCOGS_RELEASE_ID][0] if self.DISCOGS_RELEASE_ID in tags else ""  
 
 
+def _log_tag_items(items) -> None:
+    for key, value in items:
+        # if the key starts with APIC
+        if key.startswith("APIC") or key.startswith("PICTURE"):
+            logger.info(f"{key} - {value.pprint()} type={value.type} des={value.desc} mime={value.mime} enc={value.encoding}")
+        else:
+            logger.info(f"{key}  - {value} ")
+
+
+# ID3 frames and the tag names taglib reports them under
+ID3_TAG_NAMES = {
+    "TIT2": AudioTagHelper.TITLE,
+    "TALB": AudioTagHelper.ALBUM,
+    "TPE1": AudioTagHelper.ARTIST,
+    "TPE2": AudioTagHelper.ALBUM_ARTIST,
+    "TPOS": AudioTagHelper.DISC_NUMBER,
+    "TRCK": AudioTagHelper.TRACK_NUMBER,
+    "TYER": AudioTagHelper.YEAR,
+    "TDRC": AudioTagHelper.YEAR,
+    "TCON": AudioTagHelper.GENRE,
+    "TPUB": AudioTagHelper.LABEL,
+    "TMED": AudioTagHelper.MEDIA,
+    "COMM": "COMMENT",
+}
+
+
+class TagTransaction:
+    """
+    Parses an audio file once with mutagen and stages changes to its tags, cover art and file name. On leaving the
+    with block they are committed in one save and one rename; nothing is written if the block raises.
+
+        with AudioTagHelper().transaction(path) as transaction:
+            transaction.add(TIT2(encoding=3, text="Title"))
+            transaction.rename_to(name_from(transaction.text_tags()))
+        new_path = transaction.path
+    """
+
+    def __init__(self, absolute_path_filename: str):
+        self.path = Path(absolute_path_filename)
+        self._file = None
+        self._dirty = False
+        self._new_name: Optional[str] = None
+
+    def __enter__(self) -> "TagTransaction":
+        suffix = self.path.suffix.lower()
+        if suffix == ".wav":
+            self._file = WAVE(self.path)
+        elif suffix == ".flac":
+            self._file = FLAC(self.path)
+        elif suffix == ".mp3":
+            self._file = MP3(self.path)
+        else:
+            raise ValueError(f"Unsupported audio file: '{self.path}'")
+        if self._file.tags is None:
+            self._file.add_tags()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc_type is None:
+            self.commit()
+        return False
+
+    @property
+    def tags(self):
+        """
+        The parsed tags (ID3 frames, or Vorbis comments for FLAC). Reading them does not stage a save: change them
+        with the setter or the add/clear methods.
+        """
+        return self._file.tags
+
+    @tags.setter
+    def tags(self, tags) -> None:
+        """Replaces the tags: ID3 frames, or a mapping of Vorbis comments for FLAC."""
+        self.clear_tags()
+        if isinstance(self._file, FLAC):
+            self._file.tags.update(tags)
+        else:
+            for frame in tags:
+                self._file.tags.add(frame)
+
+    def add(self, frame) -> None:
+        """Stages an ID3 frame, replacing any frame with the same key."""
+        self._dirty = True
+        self._file.tags.add(frame)
+
+    def clear_tags(self) -> None:
+        self._dirty = True
+        self._file.tags.clear()
+
+    def add_cover_art(self, art: APIC) -> None:
+        self._dirty = True
+        if isinstance(self._file, FLAC):
+            picture = art if isinstance(art, Picture) else Picture()
+            if picture is not art:
+                picture.data, picture.mime, picture.type, picture.desc = art.data, art.mime, art.type, art.desc
+            self._file.add_picture(picture)
+        else:
+            self._file.tags.add(art)
+
+    def text_tags(self) -> dict:
+        """Returns the staged tags as taglib names them (TITLE, ARTIST, ...), e.g. to name the file after them."""
+        if isinstance(self._file, FLAC):
+            return {key.upper(): list(values) for key, values in self._file.tags.as_dict().items()}
+        tags = {}
+        for frame in self._file.tags.values():
+            if frame.FrameID == "TXXX":
+                tags[frame.desc.upper()] = [str(text) for text in frame.text]
+            elif frame.FrameID == "WXXX":
+                tags[AudioTagHelper.URL] = [frame.url]
+            elif frame.FrameID in ID3_TAG_NAMES:
+                tags[ID3_TAG_NAMES[frame.FrameID]] = [str(text) for text in frame.text]
+        return tags
+
+    def rename_to(self, new_name: str) -> None:
+        """Stages a new file name in the same folder."""
+        self._new_name = new_name
+
+    def commit(self) -> None:
+        old_path = self.path
+        try:
+            if self._dirty:
+                self._file.save()
+                self._dirty = False
+            if self._new_name and self._new_name != self.path.name:
+                new_path = self.path.with_name(self._new_name)
+                if new_path.exists():
+                    logger.info(f"File already exists: {new_path}")
+                else:
+                    logger.info(f"Renaming file: {self.path} to: {self._new_name}")
+                    os.rename(self.path, new_path)
+                    self.path = new_path
+            self._new_name = None
+        finally:
+            TAG_CACHE.invalidate(str(old_path))
+
+    def log_tag_key_values(self) -> None:
+        """Logs the tags as committed, without opening the file again."""
+        _log_tag_items(self._file.items())
+
+
 class PictureTypeDescription:
     descriptions = {
         0x00: "Other",
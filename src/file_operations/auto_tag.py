@@ -8,8 +8,8 @@ from discogs_client.models import Release, Track
 from pydantic import BaseModel
 from typing import List, Optional
 from mutagen.wave import WAVE
-from mutagen.id3 import ID3, ID3NoHeaderError, WXXX, ID3, TIT2, APIC, TALB, TPE1, TPE2, TXXX, TYER, TPOS, TCON, TPUB, TMED, TRCK, COMM
-from file_operations.audio_tags import AudioTagHelper, AUDIO_EXTENSIONS
+from mutagen.id3 import ID3, WXXX, ID3, TIT2, APIC, TALB, TPE1, TPE2, TXXX, TYER, TPOS, TCON, TPUB, TMED, TRCK, COMM
+from file_operations.audio_tags import AudioTagHelper, AUDIO_EXTENSIONS, TagTransaction
 from ui.progress_bar_helper import ProgressBarHelper
 from ui.custom_messagebox import show_message_box, ButtonType, convert_response_to_string
 from log_config import get_logger
@@ -212,12 +212,8 @@ def __tag_files_in_release(
             logger.error(f"Failed to get track number from file: {file}")
             continue
 
-        full_path = Path(os.path.join(root_dir, file))
-
         track_info = release.get_track_info(file_track_no)
-        full_path = __tag_and_rename(mask, file, audio_tags, root_dir, track_info, artwork_data)
-
-        audio_tags.log_tag_key_values(str(full_path))
+        __tag_and_rename(mask, file, audio_tags, root_dir, track_info, artwork_data)
 
         user_cancelled = progress_bar.user_has_cancelled()
         if user_cancelled:
@@ -237,36 +233,23 @@ def __find_track_position_from_file(file: str, release: ReleaseFacade) -> int:
 
 
 def __tag_and_rename(mask: str, file: str, audio_tags: AudioTagHelper, root_dir: str, track_info: TrackInfo, artwork_data: bytes) -> Path:
-    """Tag, add artwork and rename the file."""
+    """Tag, add artwork and rename the file, opening it once and saving it once."""
 
     logger.info(f"Updating tags for file: {file}")
     logger.info(f"tags: {track_info.get_desc_csv()}")
 
     full_path = Path(os.path.join(root_dir, file))
-    if full_path.suffix == ".wav":
-        __add_tags_and_cover_art_to_wav_file(full_path, track_info, artwork_data)
-    else:
-        __add_tags_and_cover_art_to_mp3_file(full_path, track_info, artwork_data)
-
-    return __rename_file_based_on_mask(mask, file, audio_tags, root_dir)
-
-
-def __add_tags_and_cover_art_to_wav_file(wav_file: str, track_info: TrackInfo, artwork_data: bytes) -> None:
-    """Add tags and cover art to the file"""
-
-    song = __open_file_wav(wav_file)
-    song.tags = __add_tags(song.tags, track_info)
-    song.tags = __add_cover_art(song.tags, artwork_data, wav_file)
-    song.save()
-
+    with audio_tags.transaction(full_path) as transaction:
+        if full_path.suffix == ".wav":
+            transaction.clear_tags()
+        __add_tags(transaction, track_info)
+        __add_cover_art(transaction, artwork_data, full_path)
+        new_name = __derive_file_name(mask, str(full_path), transaction.text_tags())
+        if new_name is not None:
+            transaction.rename_to(new_name)
 
-def __add_tags_and_cover_art_to_mp3_file(mp3_file: str, track_info: TrackInfo, artwork_data: bytes) -> None:
-    """Add tags and cover art to the file"""
-    song: ID3
-    song = __open_file_mp3(mp3_file)
-    song = __add_tags(song, track_info)
-    song = __add_cover_art(song, artwork_data, mp3_file)
-    song.save()
+    transaction.log_tag_key_values()
+    return transaction.path
 
 
 def tag_filename(files_to_rename: list[str], root_dir: str) -> None:
@@ -287,36 +270,31 @@ def tag_filename(files_to_rename: list[str], root_dir: str) -> None:
     mask = get_filename_mask_from_config()
     progress = ProgressBarHelper(len(files_to_rename), "Renaming files based on tags", 0)
 
-    for i, file in enumerate(files_to_rename):
+    audio_files = []
+    for file in files_to_rename:
         full_path = Path(os.path.join(root_dir, file))
-
-        progress.update_progress_bar_text(f"Renaming file: {file}")
-
         if os.path.isdir(full_path) or not tag_helper.isSupportedAudioFile(full_path):
             logger.info(f"Skipping file reason=UnsupportedFileExtension: {full_path}")
+            progress.increment()
         else:
-            __rename_file_based_on_mask(mask, file, tag_helper, root_dir)
+            audio_files.append(file)
 
+    # Tags are read ahead on a thread pool while files are renamed
+    for file, (_, tags) in zip(audio_files, tag_helper.get_tags_many(os.path.join(root_dir, file) for file in audio_files)):
+        progress.update_progress_bar_text(f"Renaming file: {file}")
+        __rename_file_based_on_mask(mask, file, tag_helper, root_dir, tags)
         progress.increment()
 
 
-def __rename_file_based_on_mask(mask, file, audio_tags: AudioTagHelper, root_dir: str) -> str:
-    """Rename the file based on the mask and tags"""
+def __rename_file_based_on_mask(mask, file, audio_tags: AudioTagHelper, root_dir: str, tags: Optional[dict] = None) -> str:
+    """Rename the file based on the mask and tags, reading the tags unless they are given"""
 
     file = os.path.join(root_dir, file)
-    tags = audio_tags.get_tags(file)
-    new_name = __derive_new_file_name(mask, tags)
+    new_name = __derive_file_name(mask, file, audio_tags.get_tags(file) if tags is None else tags)
     if new_name is None:
-        logger.error(f"Failed to derive new file name for file - missing tags: {file}")
         return None
 
-    _, ext = os.path.splitext(file)
-    new_name += ext
-
-    _, new_name = os.path.split(new_name)
-
     try:
-        new_name = re.sub(r'[<>:"/\\|?*]', "", str(new_name))
         logger.info(f"Renaming file: {file} to: {new_name}")
         full_path = Path(os.path.join(root_dir, new_name))
         # if target file skip
@@ -332,6 +310,18 @@ def __rename_file_based_on_mask(mask, file, audio_tags: AudioTagHelper, root_dir
     return full_path
 
 
+def __derive_file_name(mask: str, file: str, tags: dict) -> Optional[str]:
+    """Returns the file name (keeping the extension) the mask gives for the tags, or None if it cannot be derived."""
+    new_name = __derive_new_file_name(mask, tags)
+    if new_name is None:
+        logger.error(f"Failed to derive new file name for file - missing tags: {file}")
+        return None
+
+    _, ext = os.path.splitext(file)
+    _, new_name = os.path.split(new_name + ext)
+    return re.sub(r'[<>:"/\\|?*]', "", str(new_name))
+
+
 def __derive_new_file_name(mask: str, tags: dict) -> str:
     """Derive the new file name from the mask and tags"""
     new_name = mask
@@ -379,26 +369,8 @@ def get_filename_mask_from_config() -> str:
     return config.get("autotag", "filename_mask")
 
 
-def __open_file_wav(full_path: str) -> WAVE:
-    """Open wav file and return the WAVE frame. If no WAVE tag is found, create a new one."""
-
-    song = WAVE(full_path)
-    song.add_tags() if song.tags is None else song.tags.clear()
-    return song
-
-
-def __open_file_mp3(full_path: str) -> ID3:
-    """Open mp3 file and return the ID3 frame. If no ID3 tag is found, create a new one."""
-    try:
-        return ID3(full_path)
-    except ID3NoHeaderError:
-        print(f"No ID3 tag found in {full_path}. Creating a new one.")
-        ID3().save(full_path)
-        return ID3(full_path)
-
-
-def __add_tags(song: Union[WAVE.tags, ID3], track_info: TrackInfo) -> Union[WAVE.tags, ID3]:
-    """Add tags to the file, either a WAVE or ID3 object (yup I release i'm "ducking" here - but i'm embracing it)"""
+def __add_tags(song: TagTransaction, track_info: TrackInfo) -> TagTransaction:
+    """Add tags to the file through its tag transaction, which stages the ID3 frames of either a WAVE or an MP3 file"""
     song.add(WXXX(encoding=3, url=track_info.url))
     song.add(TIT2(encoding=3, text=track_info.title))
     song.add(TALB(encoding=3, text=track_info.album_name))
@@ -441,15 +413,15 @@ def __get_cover_art_from_discogs(release_raw: Release) -> bytes | None:
     return None
 
 
-def __add_cover_art(song: Union[WAVE.tags, ID3], art_work: bytes, full_path: Path) -> None:
-    """Add cover art to the file, either a WAVE or ID3 object"""
+def __add_cover_art(song: TagTransaction, art_work: bytes, full_path: Path) -> None:
+    """Add cover art to the file through its tag transaction"""
 
     try:
         if art_work is None:
             logger.info(f"Skipping __add_cover_art, artwork none for file: {full_path}")
         else:
             logger.info(f"Adding cover art to file: {full_path}")
-            song.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Front Cover", data=art_work))
+            song.add_cover_art(APIC(encoding=3, mime="image/jpeg", type=3, desc="Front Cover", data=art_work))
 
     except Exception as e:
         logger.exception(f"Failed to add cover art to file: {full_path} : {e}")
@@ -471,10 +443,14 @@ def __group_files_by_release_id(files: List[str], root_dir: str) -> dict:
     """Group files by release id and return a dictionary with the release id as the key and the files as the value."""
     logger.info(f"Grouping {len(files)} files by release id")
 
+    # Files without a release id in their name are looked up by their tags, read on a thread pool
+    files_without_id = [os.path.join(root_dir, file) for file in files if not re.search(r"r(\d{6,10})", file)]
+    tags_by_path = dict(tag_helper.get_tags_many(files_without_id, ordered=False))
+
     release_id_to_files = {}
     for file in files:
         
-        release_id = __valid_File_check(file)      
+        release_id = __valid_File_check(file, tags_by_path.get(os.path.join(root_dir, file)))
         if release_id is None:
             continue
         
@@ -489,8 +465,8 @@ def __group_files_by_release_id(files: List[str], root_dir: str) -> dict:
     return release_id_to_files
 
 
-def __valid_File_check(file: str) -> str:
-    """Check if the file is valid"""
+def __valid_File_check(file: str, tags: Optional[dict] = None) -> str:
+    """Check if the file is valid, using its tags if they have already been read"""
 
     if match := re.search(r"r(\d{6,10})", file):
         release_id = match[1]
@@ -505,7 +481,8 @@ def __valid_File_check(file: str) -> str:
             logger.warn(f"{release_id} - Could not find track number in file name, skipping: {file}")
 
     else:
-        tags = tag_helper.get_tags(file)
+        if tags is None:
+            tags = tag_helper.get_tags(file)
         if release_id := tag_helper.get_release_id(tags):
             logger.info(f"{release_id[0]} - Found release id {release_id} in file tags: {file}")
             return release_id
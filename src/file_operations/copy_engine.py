@@ -0,0 +1,290 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+COPY_WORKERS = 4
+MAX_IN_FLIGHT_BYTES = 512 * 1024 * 1024  # Files started but not finished, so a crate of large WAVs is not all opened at once
+CHUNK_BYTES = 8 * 1024 * 1024  # Bytes per zero-copy call, progress is reported and cancellation checked between them
+BUFFER_BYTES = 1024 * 1024  # Read/write buffer when the kernel cannot copy between the files itself
+PROGRESS_INTERVAL = 0.1  # Seconds between progress reports
+PARTIAL_SUFFIX = ".part"
+
+# copy_file_range / sendfile errors meaning "not between these files", after which the next method is tried
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM}
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+@dataclass
+class CopyJob:
+    source: str
+    target: str
+    size: int
+
+
+@dataclass
+class CopyProgress:
+    done_bytes: int
+    total_bytes: int
+    done_files: int
+    total_files: int
+    bytes_per_second: float
+    current: str  # File being copied
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate, None until there is a rate."""
+        if self.bytes_per_second <= 0:
+            return None
+        return (self.total_bytes - self.done_bytes) / self.bytes_per_second
+
+
+@dataclass
+class CopyResult:
+    copied: int = 0
+    bytes: int = 0
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (file, error)
+    cancelled: bool = False
+    elapsed: float = 0.0
+
+
+def plan_copy(sources: Iterable[str], target_dir: str) -> Tuple[List[CopyJob], List[str]]:
+    """
+    Lists the files to copy for sources (files or folders) copied into target_dir, folders recursively as copytree
+    would. Returns the jobs and the folders to create, including empty ones.
+    """
+    jobs: List[CopyJob] = []
+    directories: List[str] = []
+    for source in sources:
+        source = os.path.normpath(source)
+        target = os.path.join(target_dir, os.path.basename(source))
+        if os.path.isfile(source):
+            jobs.append(CopyJob(source, target, os.path.getsize(source)))
+        elif os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                target_root = os.path.join(target, os.path.relpath(root, source))
+                directories.append(os.path.normpath(target_root))
+                for file in files:
+                    path = os.path.join(root, file)
+                    try:
+                        jobs.append(CopyJob(path, os.path.normpath(os.path.join(target_root, file)), os.path.getsize(path)))
+                    except OSError as e:
+                        logger.warning(f"Cannot read '{path}': {e}")
+        else:
+            logger.error(f"Source path does not exist: {source}")
+    return jobs, directories
+
+
+def copy_file(source: str, target: str, on_bytes: Optional[Callable[[int], None]] = None, should_stop: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Copies a file with its metadata like shutil.copy2, letting the kernel move the data (copy_file_range, else sendfile)
+    where it can and falling back to large buffered reads. The copy is written next to target and only renamed to it
+    when complete. on_bytes is called with the bytes copied by each chunk; should_stop is checked between chunks and
+    raises CopyCancelled. Returns the bytes copied.
+    """
+    partial = target + PARTIAL_SUFFIX
+    try:
+        with open(source, "rb") as src, open(partial, "wb") as dst:
+            copied = _copy_data(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size, on_bytes, should_stop)
+        shutil.copystat(source, partial)
+        os.replace(partial, target)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    return copied
+
+
+def _copy_data(src: int, dst: int, size: int, on_bytes, should_stop) -> int:
+    copied = 0
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(lambda count: os.copy_file_range(src, dst, count))
+    if sys.platform.startswith("linux"):
+        methods.append(lambda count: os.sendfile(dst, src, None, count))
+
+    while methods:
+        try:
+            while True:
+                if should_stop is not None and should_stop():
+                    raise CopyCancelled()
+                count = methods[0](CHUNK_BYTES)
+                if count == 0:
+                    # copy_file_range can report 0 at once on file systems that do not support it (e.g. procfs)
+                    if copied == 0 and size > 0:
+                        raise OSError(errno.EOPNOTSUPP, "no data copied")
+                    return copied
+                copied += count
+                if on_bytes is not None:
+                    on_bytes(count)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            methods.pop(0)
+            os.lseek(src, copied, os.SEEK_SET)
+            os.lseek(dst, copied, os.SEEK_SET)
+
+    buffer = bytearray(BUFFER_BYTES)
+    view = memoryview(buffer)
+    while True:
+        if should_stop is not None and should_stop():
+            raise CopyCancelled()
+        count = os.readv(src, [buffer]) if hasattr(os, "readv") else _read_into(src, buffer)
+        if count == 0:
+            return copied
+        written = 0
+        while written < count:
+            written += os.write(dst, view[written:count])
+        copied += count
+        if on_bytes is not None:
+            on_bytes(count)
+
+
+def _read_into(fd: int, buffer: bytearray) -> int:
+    data = os.read(fd, len(buffer))
+    buffer[: len(data)] = data
+    return len(data)
+
+
+class _ByteBudget:
+    """Limits the bytes of the files being copied at once. A file larger than the budget is copied on its own."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int, stop: threading.Event) -> None:
+        with self._condition:
+            while self.in_flight and self.in_flight + size > self.limit and not stop.is_set():
+                self._condition.wait(PROGRESS_INTERVAL)
+            self.in_flight += size
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+class CopyEngine:
+    """
+    Copies many files at once on a thread pool, with at most max_in_flight_bytes of files started and not finished,
+    reporting progress in bytes. cancel() stops it mid-file: copies in progress are removed, finished ones kept.
+    """
+
+    def __init__(self, workers: int = COPY_WORKERS, max_in_flight_bytes: int = MAX_IN_FLIGHT_BYTES):
+        self.workers = workers
+        self.budget = _ByteBudget(max_in_flight_bytes)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        self._stop.set()
+
+    def run(self, jobs: List[CopyJob], directories: Iterable[str] = (), progress: Optional[Callable[[CopyProgress], None]] = None) -> CopyResult:
+        started = time.perf_counter()
+        result = CopyResult()
+        total_bytes = sum(job.size for job in jobs)
+        state = {"bytes": 0, "files": 0, "reported": 0.0, "current": ""}
+
+        def report(force: bool = False) -> None:
+            now = time.perf_counter()
+            if progress is None or (not force and now - state["reported"] < PROGRESS_INTERVAL):
+                return
+            state["reported"] = now
+            elapsed = now - started
+            progress(CopyProgress(state["bytes"], total_bytes, state["files"], len(jobs), state["bytes"] / elapsed if elapsed > 0 else 0.0, state["current"]))
+
+        def on_bytes(count: int) -> None:
+            with self._lock:
+                state["bytes"] += count
+                report()
+
+        def copy(job: CopyJob) -> int:
+            self.budget.acquire(job.size, self._stop)
+            try:
+                if self._stop.is_set():
+                    raise CopyCancelled()
+                with self._lock:
+                    state["current"] = job.source
+                os.makedirs(os.path.dirname(job.target), exist_ok=True)
+                return copy_file(job.source, job.target, on_bytes, self._stop.is_set)
+            finally:
+                self.budget.release(job.size)
+
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="copy") as pool:
+            futures = {pool.submit(copy, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result.bytes += future.result()
+                    result.copied += 1
+                except CopyCancelled:
+                    result.cancelled = True
+                except OSError as e:
+                    logger.error(f"Cannot copy '{job.source}' to '{job.target}': {e}")
+                    result.failed.append((job.source, str(e)))
+                with self._lock:
+                    state["files"] += 1
+                    report(force=True)
+
+        result.elapsed = time.perf_counter() - started
+        rate = result.bytes / result.elapsed / 1024 / 1024 if result.elapsed > 0 else 0.0
+        logger.info(
+            f"Copied {result.copied} of {len(jobs)} files ({result.bytes / 1024 / 1024:.1f} MB) in {result.elapsed:.1f}s at {rate:.1f} MB/s, "
+            f"{len(result.failed)} failed{' (cancelled)' if result.cancelled else ''}"
+        )
+        return result
+
+
+class CopyWorker(QThread):
+    """Runs a CopyEngine on a worker thread. cancel() stops the copy mid-file."""
+
+    progressChanged = pyqtSignal(object)  # CopyProgress
+    copyFinished = pyqtSignal(object)  # CopyResult
+
+    def __init__(self, jobs: List[CopyJob], directories: Iterable[str] = (), engine: Optional[CopyEngine] = None, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs
+        self.directories = list(directories)
+        self.engine = engine or CopyEngine()
+
+    def cancel(self) -> None:
+        self.engine.cancel()
+
+    def run(self):
+        self.copyFinished.emit(self.engine.run(self.jobs, self.directories, self.progressChanged.emit))
+
+
+def format_progress(progress: CopyProgress) -> str:
+    """e.g. '1.2 GB of 4.0 GB - 85.3 MB/s - 0:32 left'"""
+    eta = progress.eta
+    left = f" - {int(eta) // 60}:{int(eta) % 60:02d} left" if eta is not None else ""
+    return f"{_size(progress.done_bytes)} of {_size(progress.total_bytes)} - {_size(progress.bytes_per_second)}/s{left}"
+
+
+def _size(count: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if count < 1024:
+            return f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TB"
@@ -6,12 +6,17 @@ from typing import List, Union
 from ui.custom_messagebox import ButtonType, show_message_box, convert_response_to_string
 from ui.progress_bar_helper import ProgressBarHelper
 from PyQt5.QtWidgets import QMessageBox, QProgressDialog
+from PyQt5.QtCore import QEventLoop
+from file_operations.copy_engine import CopyProgress, CopyWorker, format_progress, plan_copy
 import qt.resources_rcc
 
 import log_config
 
 logger = log_config.get_logger(__name__)
 
+COPY_PROGRESS_STEPS = 1000  # Copy progress is in bytes, shown in steps as a file can be larger than a progress bar's int range
+COPY_PROGRESS_MIN_BYTES = 100 * 1024 * 1024  # Show the progress bar when copying fewer than 5 files if they are this large
+
 
 def __move_files(file_list: List[str], source_dir: str, target_dir: str, progress_bar: ProgressBarHelper = None) -> None:
     """Move files between dirs"""
@@ -173,13 +178,8 @@ def __normalise_paths(file_list: List[str], source_dir: str, target_dir: str) ->
 def __copy_files(file_list: dict[str], target_dir: str, userResponse: int = None) -> None:
     """Copy files/dirs form source to target"""
 
-    total_files = len(file_list)
-    copied_files = 0
-    progress = ProgressBarHelper(total_files, "Copying", 5)
-
-    for copied_files, source_file in enumerate(file_list):
-
-        progress.update_progress_bar_text(f"Copying {source_file}...")
+    sources = []
+    for source_file in file_list:
 
         if __target_file_exists(source_file, target_dir):
 
@@ -200,14 +200,37 @@ def __copy_files(file_list: dict[str], target_dir: str, userResponse: int = None
             elif userResponse == QMessageBox.Yes:
                 userResponse = None
 
-        __do_copy_file(source_file, target_dir, userResponse)
+        logger.info(f'Copying "{source_file}" to "{target_dir}"')
+        sources.append(source_file)
+
+    jobs, directories = plan_copy(sources, target_dir)
+    total_bytes = sum(job.size for job in jobs)
+    show_progress = len(jobs) >= 5 or total_bytes >= COPY_PROGRESS_MIN_BYTES
+    progress = ProgressBarHelper(COPY_PROGRESS_STEPS if show_progress else 0, "Copying", 1)
+
+    # Copy on a worker thread, several files at once, while the progress bar shows bytes copied
+    worker = CopyWorker(jobs, directories)
+    results = []
+    loop = QEventLoop()
+    worker.progressChanged.connect(lambda copy_progress: __show_copy_progress(progress, copy_progress))
+    worker.copyFinished.connect(results.append)
+    worker.finished.connect(loop.quit)
+    progress.on_cancel(worker.cancel)
+    worker.start()
+    loop.exec_()
+    worker.wait()
 
-        progress.increment()
+    progress.complete_progress_bar()
+    result = results[0] if results else None
+    if result is not None and result.failed:
+        failed = "\n".join(f"'{file}': {error}" for file, error in result.failed[:5])
+        show_message_box(f"{len(result.failed)} files could not be copied, check log files for details:\n\n{failed}", ButtonType.Ok, "Error Copying Files")
 
-        if progress.user_has_cancelled():
-            break
 
-    progress.complete_progress_bar()
+def __show_copy_progress(progress: ProgressBarHelper, copy_progress: CopyProgress) -> None:
+    value = copy_progress.done_bytes * COPY_PROGRESS_STEPS // copy_progress.total_bytes if copy_progress.total_bytes else COPY_PROGRESS_STEPS
+    message = f"Copying {os.path.basename(copy_progress.current)}... ({copy_progress.done_files} of {copy_progress.total_files} files)\n{format_progress(copy_progress)}"
+    progress.set_value(value, message)
 
 
 def __target_file_exists(source_file, target_dir) -> bool:
@@ -220,20 +243,6 @@ def __target_file_exists(source_file, target_dir) -> bool:
     return os.path.exists(fq_target_file)
 
 
-def __do_copy_file(source_file, target_dir, userResponse):
-
-    if os.path.isfile(source_file):
-        logger.info(f'Copying file "{source_file}" to "{target_dir}"')
-        shutil.copy2(source_file, target_dir)
-
-    elif os.path.isdir(source_file):
-        logger.info(f'Copying directory "{source_file}" to "{target_dir}"')
-        shutil.copytree(source_file, os.path.join(target_dir, os.path.basename(source_file)))
-
-    else:
-        logger.error(f"Source path does not exist: {source_file}")
-
-
 def ask_and_copy_files(file_list: List[str], target_dir: str) -> None:
     """prompt user adn ask before copying files between dirs"""
 
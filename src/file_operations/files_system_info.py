@@ -1,46 +1,184 @@
 import math
 import os
-from pathlib import Path
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QMessageBox
-from ui.custom_messagebox import ButtonType, show_message_box
-from typing import List, Tuple
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".aac"}
+STATS_WORKERS = 8  # Directories listed at once, listing is mostly waiting on the disk (or network share)
+MAX_CACHED_DIRS = 100_000
+PROGRESS_INTERVAL = 0.1  # Seconds between partial totals
+
+
+@dataclass
+class DirStats:
+    files: int = 0
+    dirs: int = 0
+    audio_files: int = 0
+    audio_bytes: int = 0
+    all_bytes: int = 0
+
+    def add(self, other: "DirStats") -> None:
+        self.files += other.files
+        self.dirs += other.dirs
+        self.audio_files += other.audio_files
+        self.audio_bytes += other.audio_bytes
+        self.all_bytes += other.all_bytes
+
+
+class _CachedDir:
+    __slots__ = ("mtime_ns", "stats", "subdirectories")
+
+    def __init__(self, mtime_ns: int, stats: DirStats, subdirectories: List[str]):
+        self.mtime_ns = mtime_ns
+        self.stats = stats
+        self.subdirectories = subdirectories
+
+
+class DirStatsCache:
+    """
+    The counts of the files directly in each directory listed, kept while the directory's mtime is unchanged (adding,
+    removing or renaming an entry changes it), so counting a folder again only lists the directories that changed.
+    """
+
+    def __init__(self, max_dirs: int = MAX_CACHED_DIRS):
+        self.max_dirs = max_dirs
+        self._dirs: "OrderedDict[str, _CachedDir]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, directory: str, mtime_ns: int) -> Optional[_CachedDir]:
+        with self._lock:
+            cached = self._dirs.get(directory)
+            if cached is None or cached.mtime_ns != mtime_ns:
+                return None
+            self._dirs.move_to_end(directory)
+            return cached
+
+    def put(self, directory: str, cached: _CachedDir) -> None:
+        with self._lock:
+            self._dirs[directory] = cached
+            self._dirs.move_to_end(directory)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+
 
+DIR_STATS_CACHE = DirStatsCache()
 
-def __count_files(paths: List[str]) -> Tuple[int, int, int, int, int]:
-    """Counts the number of files, directories, audio files and the total size of all files and audio files"""
-    total_files = 0
-    total_dirs = 0
-    total_audio_files = 0
-    total_size_audio_files = 0
-    total_size_all_files = 0
-    audio_extensions = {".mp3", ".wav", ".flac", ".aac"}
-    processed_files = set()
 
+def _list_directory(directory: str, cache: DirStatsCache) -> Tuple[DirStats, List[str]]:
+    """Counts the files and subdirectories directly in directory with one scandir, stating each file once."""
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError as e:
+        logger.warning(f"Cannot stat directory '{directory}': {e}")
+        return DirStats(), []
+    cached = cache.get(directory, mtime_ns)
+    if cached is not None:
+        return cached.stats, cached.subdirectories
+
+    stats = DirStats()
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        # Like os.walk, a link to a directory is counted but not followed
+                        stats.dirs += 1
+                        if not entry.is_symlink():
+                            subdirectories.append(entry.path)
+                        continue
+                    stats.files += 1
+                    size = entry.stat().st_size
+                except OSError as e:
+                    logger.warning(f"Cannot stat '{entry.path}': {e}")
+                    continue
+                stats.all_bytes += size
+                if os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                    stats.audio_files += 1
+                    stats.audio_bytes += size
+    except OSError as e:
+        logger.warning(f"Cannot list directory '{directory}': {e}")
+        return DirStats(), []
+
+    cache.put(directory, _CachedDir(mtime_ns, stats, subdirectories))
+    return stats, subdirectories
+
+
+def count_files(
+    paths: List[str],
+    progress: Optional[Callable[[DirStats], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    workers: int = STATS_WORKERS,
+    cache: DirStatsCache = DIR_STATS_CACHE,
+) -> DirStats:
+    """
+    Counts the files, directories and audio files under paths (files or directories, each counted once even if one
+    is inside another) and their sizes. Subdirectories are listed in parallel; progress is called with the totals so
+    far, and should_stop ends the count early with partial totals.
+    """
+    started = time.perf_counter()
+    total = DirStats()
+    paths = sorted({os.path.normpath(os.path.abspath(path)) for path in paths})
+    roots: List[str] = []
     for path in paths:
-        if os.path.isfile(path):
-            if path not in processed_files:
-                processed_files.add(path)
-                total_files += 1
-                total_size_all_files += os.path.getsize(path)
-                if Path(path).suffix in audio_extensions:
-                    total_audio_files += 1
-                    total_size_audio_files += os.path.getsize(path)
-        elif os.path.isdir(path):
-            total_dirs += 1
-            for dirpath, dirnames, filenames in os.walk(path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if fp not in processed_files:
-                        processed_files.add(fp)
-                        total_files += 1
-                        total_size_all_files += os.path.getsize(fp)
-                        if Path(fp).suffix in audio_extensions:
-                            total_audio_files += 1
-                            total_size_audio_files += os.path.getsize(fp)
-                for _ in dirnames:
-                    total_dirs += 1
-
-    return total_files, total_dirs, total_audio_files, total_size_audio_files, total_size_all_files
+        if any(path.startswith(root + os.sep) for root in roots):
+            continue
+        if os.path.isdir(path):
+            roots.append(path)
+            total.dirs += 1
+        elif os.path.isfile(path):
+            size = os.path.getsize(path)
+            total.files += 1
+            total.all_bytes += size
+            if os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS:
+                total.audio_files += 1
+                total.audio_bytes += size
+
+    reported = 0.0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dir-stats") as pool:
+        pending = {pool.submit(_list_directory, root, cache) for root in roots}
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            if should_stop is not None and should_stop():
+                for future in pending:
+                    future.cancel()
+                logger.info("Counting files stopped")
+                break
+            for future in done:
+                stats, subdirectories = future.result()
+                total.add(stats)
+                pending.update(pool.submit(_list_directory, subdirectory, cache) for subdirectory in subdirectories)
+            if progress is not None and time.perf_counter() - reported >= PROGRESS_INTERVAL:
+                reported = time.perf_counter()
+                progress(DirStats(**vars(total)))
+
+    logger.info(f"Counted {total.files} files in {total.dirs} directories under {len(paths)} paths in {time.perf_counter() - started:.2f}s")
+    return total
+
+
+class DirStatsWorker(QThread):
+    """Runs count_files on a worker thread, emitting the totals so far as it goes. requestInterruption() stops it."""
+
+    statsChanged = pyqtSignal(object)  # DirStats so far
+    statsFinished = pyqtSignal(object)  # DirStats
+
+    def __init__(self, paths: List[str], parent=None):
+        super().__init__(parent)
+        self.paths = paths
+
+    def run(self):
+        self.statsFinished.emit(count_files(self.paths, self.statsChanged.emit, self.isInterruptionRequested))
 
 
 def __convert_size(size_bytes: int) -> str:
@@ -54,12 +192,30 @@ def __convert_size(size_bytes: int) -> str:
     return f"{s} {size_name[i]}"
 
 
+def __format_results(stats: DirStats, include_root_dir: bool, counting: bool) -> str:
+    total_dirs = stats.dirs - 1 if include_root_dir else stats.dirs
+    result = (
+        f"Total files: {stats.files}\nTotal directories: {max(0, total_dirs)}\nTotal audio files: {stats.audio_files}\n"
+        f"Total size of audio files: {__convert_size(stats.audio_bytes)}\nTotal size of all files: {__convert_size(stats.all_bytes)}"
+    )
+    return f"{result}\n\nCounting..." if counting else result
+
+
 def display_results(paths: List[str], include_root_dir: bool = False) -> None:
-    total_files, total_dirs, total_audio_files, total_size_audio_files, total_size_all_files = __count_files(paths)
-    if include_root_dir:
-        total_dirs -= 1
-    total_size_audio_files = __convert_size(total_size_audio_files)
-    total_size_all_files = __convert_size(total_size_all_files)
-    result = f"Total files: {total_files}\nTotal directories: {total_dirs}\nTotal audio files: {total_audio_files}\nTotal size of audio files: {total_size_audio_files}\nTotal size of all files: {total_size_all_files}"
-
-    show_message_box(result, ButtonType.Ok, "File Count Results", "information")
+    """Shows the file counts of paths, updating the totals while the files are counted on a worker thread"""
+    msg_box = QMessageBox()
+    msg_box.setWindowTitle("File Count Results")
+    msg_box.setWindowIcon(QIcon(":/icons/icons/headphones.svg"))
+    msg_box.setIcon(QMessageBox.Information)
+    msg_box.setStandardButtons(QMessageBox.Ok)
+    msg_box.setText(__format_results(DirStats(), include_root_dir, True))
+
+    worker = DirStatsWorker(paths)
+    worker.statsChanged.connect(lambda stats: msg_box.setText(__format_results(stats, include_root_dir, True)))
+    worker.statsFinished.connect(lambda stats: msg_box.setText(__format_results(stats, include_root_dir, False)))
+    worker.start()
+    msg_box.exec_()
+
+    # Closed before the count finished
+    worker.requestInterruption()
+    worker.wait()
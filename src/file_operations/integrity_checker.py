@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_TABLE = "file_status"
+
+OK = "ok"
+MISSING = "missing"
+MOVED = "moved"
+SIZE_CHANGED = "size changed"
+
+
+class FileStatus(NamedTuple):
+    """Result of the last check of a track file. size is the size recorded when the file was first found."""
+
+    status: str
+    size: Optional[int] = None
+    moved_to: Optional[str] = None
+
+
+def ensure_status_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATUS_TABLE}
+        (
+            file_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            size INTEGER,
+            moved_to TEXT,
+            checked_at TEXT
+        )
+    """
+    )
+    conn.commit()
+
+
+def load_file_status(conn: sqlite3.Connection) -> Dict[int, FileStatus]:
+    """Returns the status recorded for each file_id by the last check, empty if no check has run."""
+    try:
+        return {row[0]: FileStatus(*row[1:]) for row in conn.execute(f"SELECT file_id, status, size, moved_to FROM {STATUS_TABLE}")}
+    except sqlite3.Error:
+        return {}
+
+
+def _list_directory(directory: str) -> Optional[Dict[str, Tuple[str, int]]]:
+    """
+    Lists a directory once with os.scandir. Returns {normalised file name: (file name, size)} for its files and
+    {normalised name + os.sep: (name, -1)} for its subdirectories, or None if the directory does not exist.
+    """
+    listing = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        listing[os.path.normcase(entry.name) + os.sep] = (entry.name, -1)
+                    elif entry.is_file():
+                        listing[os.path.normcase(entry.name)] = (entry.name, entry.stat().st_size)
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    except OSError as e:
+        logger.warning(f"Cannot list directory '{directory}': {e}")
+        return None
+    return listing
+
+
+class IntegrityChecker:
+    """
+    Checks that the files of the catalogue are still where the database says.
+
+    Paths are grouped by directory and each directory is listed once with os.scandir, on a thread pool, instead of
+    stat'ing every track. A missing file found by name (and recorded size) in a sibling folder, or the parent
+    folder, of its old one is reported as moved, e.g. after a release folder was renamed. Files that are themselves
+    in the catalogue are not candidates, so a common name like "01.flac" is not matched in another release.
+    Results are written to the file_status table in one transaction.
+    """
+
+    def __init__(self, db_path: str, workers: Optional[int] = None):
+        self.db_path = db_path
+        self.workers = workers or min(32, (os.cpu_count() or 4) * 4)
+        self._listings: Dict[str, Optional[Dict[str, Tuple[str, int]]]] = {}
+        self._known: set = set()  # normalised paths of the checked files
+        self._candidates: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}  # parent folder -> files a missing file may have moved to
+
+    def check(
+        self,
+        files: Iterable[Tuple[int, str]],
+        progress: Optional[Callable[[int, int], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> Dict[int, FileStatus]:
+        """
+        Checks (file_id, file_location) pairs. progress is called with (directories listed, total directories).
+        Returns the new status of each checked file; nothing is written if should_stop ends the check early.
+        """
+        started = time.perf_counter()
+        by_directory: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        for file_id, location in files:
+            if file_id is not None and location:
+                directory, name = os.path.split(os.path.normpath(location))
+                by_directory[directory].append((file_id, name))
+                self._known.add(os.path.normcase(os.path.join(directory, name)))
+        directories = list(by_directory)
+
+        connection = sqlite3.connect(self.db_path)
+        try:
+            ensure_status_table(connection)
+            previous = load_file_status(connection)
+
+            statuses: Dict[int, FileStatus] = {}
+            missing: List[Tuple[int, str, str]] = []
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for done, (directory, listing) in enumerate(zip(directories, pool.map(_list_directory, directories)), start=1):
+                    if should_stop is not None and should_stop():
+                        logger.info("Integrity check stopped")
+                        return {}
+                    self._listings[directory] = listing
+                    for file_id, name in by_directory[directory]:
+                        baseline = previous.get(file_id)
+                        baseline_size = baseline.size if baseline is not None else None
+                        found = listing.get(os.path.normcase(name)) if listing is not None else None
+                        if found is None:
+                            missing.append((file_id, directory, name))
+                        elif baseline_size is not None and found[1] != baseline_size:
+                            statuses[file_id] = FileStatus(SIZE_CHANGED, baseline_size)
+                        else:
+                            statuses[file_id] = FileStatus(OK, found[1] if baseline_size is None else baseline_size)
+                    if progress is not None and (done % 100 == 0 or done == len(directories)):
+                        progress(done, len(directories))
+
+            for file_id, directory, name in missing:
+                baseline = previous.get(file_id)
+                baseline_size = baseline.size if baseline is not None else None
+                moved_to = self.__find_moved(directory, name, baseline_size)
+                statuses[file_id] = FileStatus(MOVED if moved_to else MISSING, baseline_size, moved_to)
+
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {STATUS_TABLE} (file_id, status, size, moved_to, checked_at) VALUES (?, ?, ?, ?, datetime('now'))",
+                    [(file_id, *status) for file_id, status in statuses.items()],
+                )
+        finally:
+            connection.close()
+            self._listings = {}
+            self._known = set()
+            self._candidates = {}
+
+        counts = defaultdict(int)
+        for status in statuses.values():
+            counts[status.status] += 1
+        logger.info(
+            f"Integrity check of {len(statuses)} files in {len(directories)} directories took {time.perf_counter() - started:.1f}s: "
+            + ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        )
+        return statuses
+
+    def __listing(self, directory: str) -> Optional[Dict[str, Tuple[str, int]]]:
+        if directory not in self._listings:
+            self._listings[directory] = _list_directory(directory)
+        return self._listings[directory]
+
+    def __uncatalogued_files(self, parent: str) -> Dict[str, List[Tuple[str, int]]]:
+        """Returns {normalised name: [(path, size)]} of the files in parent and its subfolders not in the catalogue."""
+        files = self._candidates.get(parent)
+        if files is not None:
+            return files
+        files = defaultdict(list)
+        parent_listing = self.__listing(parent) or {}
+        folders = [parent] + [os.path.join(parent, entry_name) for entry_name, entry_size in parent_listing.values() if entry_size < 0]
+        for folder in folders:
+            for key, (entry_name, entry_size) in (self.__listing(folder) or {}).items():
+                path = os.path.join(folder, entry_name)
+                if entry_size >= 0 and os.path.normcase(path) not in self._known:
+                    files[key].append((path, entry_size))
+        self._candidates[parent] = files
+        return files
+
+    def __find_moved(self, directory: str, name: str, size: Optional[int]) -> Optional[str]:
+        """Looks for a missing file in the parent of its folder and in the sibling folders."""
+        parent = os.path.dirname(directory)
+        if not parent or parent == directory:
+            return None
+        for path, found_size in self.__uncatalogued_files(parent).get(os.path.normcase(name), ()):
+            if size is None or found_size == size:
+                return path
+        return None
+
+
+class IntegrityCheckWorker(QThread):
+    """Runs an IntegrityChecker over (file_id, file_location) pairs on a worker thread."""
+
+    progressChanged = pyqtSignal(int, int)  # directories listed, total directories
+    checkFinished = pyqtSignal(object)  # Dict[int, FileStatus]
+
+    def __init__(self, db_path: str, files: List[Tuple[int, str]], parent=None):
+        super().__init__(parent)
+        self.checker = IntegrityChecker(db_path)
+        self.files = files
+
+    def run(self):
+        self.checkFinished.emit(self.checker.check(self.files, self.progressChanged.emit, self.isInterruptionRequested))
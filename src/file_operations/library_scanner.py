@@ -0,0 +1,497 @@
+import configparser
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from db.db_manager import create_tables
+from file_operations.audio_tags import AUDIO_EXTENSIONS, AudioTagHelper
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINT_TABLE = "library_scan_checkpoint"
+
+# Deletes a track once no file of any copy of its release is left
+DELETE_UNUSED_TRACK = (
+    "DELETE FROM tracks WHERE release_id = ? AND track_number = ? "
+    "AND NOT EXISTS (SELECT 1 FROM digital_media WHERE digital_media.release_id = tracks.release_id AND digital_media.track_number = tracks.track_number)"
+)
+
+# Tags read into the release row, first tag found wins
+RELEASE_TAGS = {
+    "name": [AudioTagHelper.ALBUM],
+    "artist": [AudioTagHelper.ALBUM_ARTIST, AudioTagHelper.ARTIST],
+    "label": [AudioTagHelper.LABEL, AudioTagHelper.ORGANIZATION],
+    "catalogue_number": [AudioTagHelper.CATALOGNUMBER, AudioTagHelper.CATALOG_NUMBER, AudioTagHelper.CATALOGID],
+    "media": [AudioTagHelper.MEDIA, AudioTagHelper.MEDIATYPE],
+    "style": [AudioTagHelper.STYLE],
+    "genre": [AudioTagHelper.GENRE],
+    "date": [AudioTagHelper.YEAR],
+    "country": [AudioTagHelper.COUNTRY],
+    "url": [AudioTagHelper.URL],
+}
+
+
+class Fingerprint(NamedTuple):
+    """Identifies an unchanged file without reading it. A file moved within a file system keeps its fingerprint."""
+
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+class FileEntry(NamedTuple):
+    """An audio file found by the directory walk."""
+
+    name: str
+    path: str
+    fingerprint: Fingerprint
+
+
+@dataclass
+class ScannedFile:
+    """An audio file found by the scanner, with what its header and tags say."""
+
+    path: str
+    name: str
+    fingerprint: Fingerprint
+    media_type: Optional[str] = None  # WAV / MP3 / FLAC from the file header, None if it is not audio
+    tags: Dict[str, List[str]] = field(default_factory=dict)
+    duration: int = 0
+
+
+@dataclass
+class ScanResult:
+    """Counts of a library scan. completed is False if it was stopped before every folder was scanned."""
+
+    files: int = 0
+    releases: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    moved: int = 0
+    deleted: int = 0
+    completed: bool = False
+    elapsed: float = 0.0
+
+
+def probe_header(path: str) -> Optional[str]:
+    """Returns the audio format of a file from its first bytes (WAV, MP3 or FLAC), or None if it is not one of them."""
+    try:
+        with open(path, "rb") as file:
+            head = file.read(12)
+    except OSError as e:
+        logger.warning(f"Cannot read header of '{path}': {e}")
+        return None
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "WAV"
+    if head[:4] == b"fLaC":
+        return "FLAC"
+    if head[:3] == b"ID3":
+        # An ID3v2 tag can precede FLAC as well as MPEG audio
+        return "FLAC" if path.lower().endswith(".flac") else "MP3"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "MP3"
+    return None
+
+
+def walk_audio_directories(root: str) -> Iterator[Tuple[str, List[FileEntry]]]:
+    """
+    Yields (directory, files) for every directory under root holding audio files, depth first in name order.
+    Uses os.scandir so file types, and on Windows sizes and times, come from the directory listing.
+    """
+    extensions = {extension.lower() for extension in AUDIO_EXTENSIONS}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Cannot list directory '{directory}': {e}")
+            continue
+
+        files = []
+        subdirectories = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                    stat = entry.stat()
+                    files.append(FileEntry(entry.name, entry.path, Fingerprint(stat.st_size, stat.st_mtime_ns, entry.inode())))
+            except OSError as e:
+                logger.warning(f"Cannot stat '{entry.path}': {e}")
+        if files:
+            yield directory, files
+        stack.extend(reversed(subdirectories))
+
+
+def _first_tag(tags: Dict[str, List[str]], names: List[str]) -> Optional[str]:
+    for name in names:
+        values = [str(value).strip() for value in tags.get(name, []) if str(value).strip()]
+        if values:
+            return ", ".join(values)
+    return None
+
+
+def _track_number(tags: Dict[str, List[str]], position: int) -> Tuple[int, Optional[str]]:
+    """
+    Returns the track number and vinyl side of a file. Vinyl style numbers (A1, B2) give the side and number the
+    tracks in folder order; later discs of a release are numbered from disc * 100.
+    """
+    number = position
+    side = None
+    match = re.match(r"^\s*([A-Za-z]*)\s*(\d*)", _first_tag(tags, [AudioTagHelper.TRACK_NUMBER]) or "")
+    if match and match.group(1):
+        side = match.group(1).upper()
+    elif match and match.group(2):
+        number = int(match.group(2))
+
+    disc = re.match(r"^\s*(\d+)", _first_tag(tags, [AudioTagHelper.DISC_NUMBER]) or "")
+    if disc and int(disc.group(1)) > 1:
+        number += int(disc.group(1)) * 100
+    return number, side
+
+
+class LibraryScanner:
+    """
+    Fills the release, tracks and digital_media tables from a music library folder, one release per folder.
+
+    Folders are listed with os.scandir, tags and durations are read on a thread pool while the previous batch is
+    written, and each batch is inserted in one transaction together with a checkpoint of the folders it completes,
+    so an interrupted scan resumes where it stopped.
+
+    Rescans compare the (size, mtime, inode) fingerprint of every file with the one stored in digital_media: only
+    folders with new or changed files are read again, files found under another path with their old fingerprint
+    are moved without reading them, and files no longer found are deleted together.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 500, workers: Optional[int] = None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.workers = workers or min(16, (os.cpu_count() or 4) * 2)
+        self.tag_helper = AudioTagHelper()
+
+    def scan(
+        self,
+        root: str,
+        resume: bool = True,
+        full: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> ScanResult:
+        """
+        Scans the library under root. progress is called with (files done, total files to read) after each batch;
+        the scan stops after the current batch once should_stop returns True and can be resumed later.
+        With full set, every file is read again whatever its fingerprint.
+        """
+        root = os.path.abspath(root)
+        return self.__scan([root], root, full, progress, should_stop, clear_checkpoint=not resume)
+
+    def scan_directories(self, directories: List[str], should_stop: Optional[Callable[[], bool]] = None) -> ScanResult:
+        """
+        Incrementally rescans some folders of the library (and their subfolders), e.g. those a watcher saw change.
+        Files moved between the folders are recognised as moves. No checkpoints are kept.
+        """
+        return self.__scan([os.path.abspath(directory) for directory in directories], None, False, None, should_stop)
+
+    def __scan(
+        self,
+        roots: List[str],
+        checkpoint_root: Optional[str],
+        full: bool,
+        progress: Optional[Callable[[int, int], None]],
+        should_stop: Optional[Callable[[], bool]],
+        clear_checkpoint: bool = False,
+    ) -> ScanResult:
+        started = time.perf_counter()
+        where = ", ".join(f"'{root}'" for root in roots)
+        result = ScanResult()
+        connection = sqlite3.connect(self.db_path)
+        try:
+            connection.execute("PRAGMA synchronous = NORMAL")
+            create_tables(connection)
+            self.__create_checkpoint_table(connection)
+            if clear_checkpoint:
+                with connection:
+                    connection.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE root = ?", (checkpoint_root,))
+            done = set()
+            if checkpoint_root is not None:
+                done = {row[0] for row in connection.execute(f"SELECT directory FROM {CHECKPOINT_TABLE} WHERE root = ?", (checkpoint_root,))}
+            media_types = {row[1]: row[0] for row in connection.execute("SELECT id, format FROM media_types")}
+
+            walked = [walked_directory for root in roots for walked_directory in walk_audio_directories(root)]
+            known = {}
+            if not full:
+                for root in roots:
+                    known.update(self.__known_files(connection, root))
+            directories, moves, deleted = self.__changes(walked, known, done)
+            self.__apply_moves_and_deletes(connection, moves, deleted)
+            result.moved, result.deleted = len(moves), len(deleted)
+            result.unchanged = sum(len(files) for _, files in walked) - sum(len(files) for _, files in directories) - len(moves)
+
+            total = sum(len(files) for _, files in directories)
+            logger.info(
+                f"Library scan of {where}: {total} files in {len(directories)} folders to read, {result.unchanged} unchanged, {len(moves)} moved, "
+                f"{len(deleted)} deleted" + (f", {len(done)} folders already done" if done else "")
+            )
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                pending = None
+                for batch in self.__batches(directories):
+                    if should_stop is not None and should_stop():
+                        break
+                    # Read the tags of this batch while the previous one is written
+                    reading = [(directory, pool.map(self.read_file, files)) for directory, files in batch]
+                    if pending is not None:
+                        self.__write_batch(connection, checkpoint_root, pending, media_types, result)
+                        if progress is not None:
+                            progress(result.files + result.skipped, total)
+                    pending = [(directory, list(scanned)) for directory, scanned in reading]
+                if pending is not None:
+                    self.__write_batch(connection, checkpoint_root, pending, media_types, result)
+                    if progress is not None:
+                        progress(result.files + result.skipped, total)
+
+            result.completed = result.files + result.skipped == total
+            if result.completed and checkpoint_root is not None:
+                with connection:
+                    connection.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE root = ?", (checkpoint_root,))
+        finally:
+            connection.close()
+
+        result.elapsed = time.perf_counter() - started
+        logger.info(
+            f"Library scan of {where} {'completed' if result.completed else 'stopped'}: {result.files} files read in {result.releases} releases, "
+            f"{result.skipped} skipped, {result.unchanged} unchanged, {result.moved} moved, {result.deleted} deleted, {result.elapsed:.1f}s"
+        )
+        return result
+
+    def read_file(self, file: FileEntry) -> ScannedFile:
+        """Probes the header of a file and reads its tags. Runs on the thread pool."""
+        scanned = ScannedFile(file.path, file.name, file.fingerprint, probe_header(file.path))
+        if scanned.media_type is not None:
+            scanned.tags, scanned.duration = self.tag_helper.get_tags_and_duration(file.path)
+        return scanned
+
+    @staticmethod
+    def __known_files(connection: sqlite3.Connection, root: str) -> Dict[str, Fingerprint]:
+        """Returns the fingerprints stored for the files under root."""
+        prefix = os.path.join(root, "")
+        # A range rather than LIKE, so the file_location index is used
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = connection.execute(
+            "SELECT file_location, file_size, file_mtime_ns, file_inode FROM digital_media WHERE file_location >= ? AND file_location < ?",
+            (prefix, upper),
+        )
+        return {row[0]: Fingerprint(*row[1:]) for row in rows}
+
+    @staticmethod
+    def __changes(
+        walked: List[Tuple[str, List[FileEntry]]], known: Dict[str, Fingerprint], done: set
+    ) -> Tuple[List[Tuple[str, List[FileEntry]]], Dict[str, FileEntry], List[str]]:
+        """
+        Compares the walk with the stored fingerprints. Returns the folders to read (those with a new or changed file),
+        the moves (old path -> file found with its fingerprint under a new path) and the paths no longer found.
+        """
+        seen = {file.path for _, files in walked for file in files}
+        # Paths no longer found by fingerprint. Hard links share a fingerprint, so there can be several
+        gone: Dict[Fingerprint, List[str]] = {}
+        for path, fingerprint in known.items():
+            if path not in seen:
+                gone.setdefault(fingerprint, []).append(path)
+        directories = []
+        moves = {}
+        for directory, files in walked:
+            if directory in done:
+                continue
+            folder_moves = {}
+            claimed: Dict[Fingerprint, int] = {}  # Gone paths matched by this folder, by fingerprint
+            changed = False
+            for file in files:
+                fingerprint = known.get(file.path)
+                if fingerprint == file.fingerprint:
+                    continue
+                candidates = gone.get(file.fingerprint, [])
+                count = claimed.get(file.fingerprint, 0)
+                if fingerprint is None and count < len(candidates):
+                    folder_moves[candidates[count]] = file
+                    claimed[file.fingerprint] = count + 1
+                    continue
+                changed = True
+                break
+            if changed:
+                # The folder is read as a whole, files moved into it get new rows
+                directories.append((directory, files))
+                continue
+            for fingerprint, count in claimed.items():
+                del gone[fingerprint][:count]
+            moves.update(folder_moves)
+        deleted = [path for path in known if path not in seen and path not in moves]
+        return directories, moves, deleted
+
+    @staticmethod
+    def __apply_moves_and_deletes(connection: sqlite3.Connection, moves: Dict[str, FileEntry], deleted: List[str]) -> None:
+        """Updates the paths of moved files and removes deleted files, their tracks and emptied local releases."""
+        if not moves and not deleted:
+            return
+        with connection:
+            connection.executemany(
+                "UPDATE digital_media SET file_location = ?, file_path = ?, file_name = ? WHERE file_location = ?",
+                [(file.path, os.path.dirname(file.path), file.name, old_path) for old_path, file in moves.items()],
+            )
+            # Local releases are identified by their folder
+            folders = {(Path(os.path.dirname(file.path)).resolve().as_uri(), Path(os.path.dirname(old_path)).resolve().as_uri()) for old_path, file in moves.items()}
+            connection.executemany("UPDATE release SET url = ? WHERE url = ? AND release_id < 0", folders)
+
+            if deleted:
+                connection.execute("CREATE TEMP TABLE IF NOT EXISTS deleted_files (file_location TEXT PRIMARY KEY)")
+                connection.execute("DELETE FROM deleted_files")
+                connection.executemany("INSERT OR IGNORE INTO deleted_files (file_location) VALUES (?)", [(path,) for path in deleted])
+                keys = connection.execute(
+                    "SELECT DISTINCT release_id, track_number FROM digital_media WHERE file_location IN (SELECT file_location FROM deleted_files)"
+                ).fetchall()
+                connection.execute("DELETE FROM digital_media WHERE file_location IN (SELECT file_location FROM deleted_files)")
+                connection.executemany(DELETE_UNUSED_TRACK, keys)
+                connection.execute("DELETE FROM release WHERE release_id < 0 AND release_id NOT IN (SELECT release_id FROM digital_media)")
+                connection.execute("DELETE FROM deleted_files")
+
+    def __batches(self, directories: List[Tuple[str, List[FileEntry]]]) -> Iterator[List[Tuple[str, List[FileEntry]]]]:
+        """Groups whole folders into batches of about batch_size files."""
+        batch = []
+        count = 0
+        for directory, files in directories:
+            batch.append((directory, files))
+            count += len(files)
+            if count >= self.batch_size:
+                yield batch
+                batch = []
+                count = 0
+        if batch:
+            yield batch
+
+    @staticmethod
+    def __create_checkpoint_table(connection: sqlite3.Connection) -> None:
+        connection.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE}
+            (
+                root TEXT,
+                directory TEXT,
+                PRIMARY KEY(root, directory)
+            )
+        """
+        )
+        connection.commit()
+
+    def __write_batch(self, connection: sqlite3.Connection, checkpoint_root: Optional[str], batch: List[Tuple[str, List[ScannedFile]]], media_types: Dict[str, int], result: ScanResult) -> None:
+        """Inserts the releases and files of a batch of folders, and their checkpoints if kept, in one transaction."""
+        with connection:
+            for directory, scanned in batch:
+                audio = [file for file in scanned if file.media_type is not None]
+                result.skipped += len(scanned) - len(audio)
+                if audio:
+                    self.__write_release(connection, directory, audio, media_types)
+                    result.files += len(audio)
+                    result.releases += 1
+                if checkpoint_root is not None:
+                    connection.execute(f"INSERT OR IGNORE INTO {CHECKPOINT_TABLE} (root, directory) VALUES (?, ?)", (checkpoint_root, directory))
+
+    def __write_release(self, connection: sqlite3.Connection, directory: str, files: List[ScannedFile], media_types: Dict[str, int]) -> None:
+        tags = next((file.tags for file in files if file.tags), {})
+        release = {column: _first_tag(tags, names) for column, names in RELEASE_TAGS.items()}
+        release["name"] = release["name"] or os.path.basename(directory)
+        release_id = self.__release_id(connection, directory, files, release)
+
+        connection.execute(
+            f"INSERT OR REPLACE INTO release (release_id, {', '.join(release)}) VALUES (?{', ?' * len(release)})",
+            [release_id, *release.values()],
+        )
+
+        # The folder is read as a whole: replace its rows, whichever release they were filed under
+        old_keys = connection.execute("SELECT release_id, track_number FROM digital_media WHERE file_path = ?", (directory,)).fetchall()
+        connection.execute("DELETE FROM digital_media WHERE file_path = ?", (directory,))
+        connection.executemany(DELETE_UNUSED_TRACK, old_keys)
+
+        track_rows = []
+        media_rows = []
+        for position, file in enumerate(files, start=1):
+            number, side = _track_number(file.tags, position)
+            title = _first_tag(file.tags, [AudioTagHelper.TITLE]) or os.path.splitext(file.name)[0]
+            artist = _first_tag(file.tags, [AudioTagHelper.ARTIST])
+            track_rows.append((release_id, number, title, artist, side, file.duration))
+            size, mtime_ns, inode = file.fingerprint
+            media_rows.append((release_id, title, artist, number, directory, file.name, file.path, size, media_types.get(file.media_type), mtime_ns, inode))
+        connection.executemany("INSERT OR REPLACE INTO tracks (release_id, track_number, name, artist, side, duration) VALUES (?, ?, ?, ?, ?, ?)", track_rows)
+        connection.executemany(
+            "INSERT OR REPLACE INTO digital_media (release_id, track_name, track_artist, track_number, file_path, file_name, file_location, file_size, media_type, file_mtime_ns, file_inode) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            media_rows,
+        )
+
+    @staticmethod
+    def __release_id(connection: sqlite3.Connection, directory: str, files: List[ScannedFile], release: Dict[str, Optional[str]]) -> int:
+        """
+        Returns the Discogs release id the folder is tagged with. Untagged folders are local releases, identified by
+        their file:// url and given negative ids so they never collide with Discogs ids.
+        """
+        for file in files:
+            discogs_id = _first_tag(file.tags, [AudioTagHelper.DISCOGS_RELEASE_ID])
+            if discogs_id and discogs_id.split(",")[0].strip().isdigit():
+                return int(discogs_id.split(",")[0])
+
+        release["url"] = Path(directory).resolve().as_uri()
+        row = connection.execute("SELECT release_id FROM release WHERE url = ?", (release["url"],)).fetchone()
+        if row:
+            return row[0]
+        return min(connection.execute("SELECT COALESCE(MIN(release_id), 0) FROM release").fetchone()[0], 0) - 1
+
+
+class LibraryScanWorker(QThread):
+    """Runs a LibraryScanner on a worker thread. requestInterruption() stops it after the current batch."""
+
+    progressChanged = pyqtSignal(int, int)  # files done, total files
+    scanFinished = pyqtSignal(object)  # ScanResult
+
+    def __init__(self, db_path: str, root: str, resume: bool = True, full: bool = False, parent=None):
+        super().__init__(parent)
+        self.scanner = LibraryScanner(db_path)
+        self.root = root
+        self.resume = resume
+        self.full = full
+
+    def run(self):
+        result = self.scanner.scan(self.root, self.resume, self.full, self.progressChanged.emit, self.isInterruptionRequested)
+        self.scanFinished.emit(result)
+
+
+def __default_db_path() -> Optional[str]:
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    if config.has_section("db") and config["db"].get("location") and config["db"].get("name"):
+        return os.path.join(config["db"]["location"], config["db"]["name"])
+    return None
+
+
+if __name__ == "__main__":
+    # python -m file_operations.library_scanner <library root> [db path] [--restart] [--full]
+    args = [arg for arg in sys.argv[1:] if arg not in ("--restart", "--full")]
+    db_path = args[1] if len(args) > 1 else __default_db_path()
+    if not args or not db_path:
+        print("Usage: python -m file_operations.library_scanner <library root> [db path] [--restart] [--full]")
+        sys.exit(1)
+
+    scan_result = LibraryScanner(db_path).scan(args[0], resume="--restart" not in sys.argv, full="--full" in sys.argv, progress=lambda done, total: print(f"{done} / {total} files"))
+    print(
+        f"{scan_result.files} files read in {scan_result.releases} releases, {scan_result.skipped} skipped, {scan_result.unchanged} unchanged, "
+        f"{scan_result.moved} moved, {scan_result.deleted} deleted in {scan_result.elapsed:.1f}s"
+    )
@@ -0,0 +1,270 @@
+import configparser
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QSocketNotifier, QThread, QTimer, pyqtSignal
+
+from file_operations.library_scanner import LibraryScanner, ScanResult
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# inotify(7) event flags
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# A file has landed or gone: written and closed, created, deleted, renamed, or touched
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def library_roots() -> List[str]:
+    """Returns the library folders to watch, from config.ini [library] roots (one per line or separated by ';')."""
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    roots = config.get("library", "roots", fallback="")
+    return [root.strip() for line in roots.splitlines() for root in line.split(";") if root.strip()]
+
+
+def _subdirectories(root: str) -> List[str]:
+    """Returns root and every folder under it, using os.scandir."""
+    directories = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        directories.append(directory)
+        try:
+            with os.scandir(directory) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError as e:
+            logger.warning(f"Cannot list directory '{directory}': {e}")
+    return directories
+
+
+class InotifyWatcher(QObject):
+    """
+    Watches folder trees with Linux inotify, read from the Qt event loop through a QSocketNotifier. Unlike
+    QFileSystemWatcher it reports files rewritten in place (IN_CLOSE_WRITE), e.g. when their tags are saved.
+    """
+
+    directoryChanged = pyqtSignal(str)
+    overflowed = pyqtSignal()  # Events were lost: everything watched must be rescanned
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self._paths: Dict[int, str] = {}  # watch descriptor -> folder
+        self._notifier = QSocketNotifier(self._fd, QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self.on_readable)
+
+    def add_tree(self, root: str) -> bool:
+        """Watches root and every folder under it. Returns False if some folder could not be watched."""
+        watched_all = True
+        for directory in _subdirectories(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                # ENOSPC: fs.inotify.max_user_watches is exhausted
+                logger.warning(f"Cannot watch '{directory}': {os.strerror(ctypes.get_errno())}")
+                watched_all = False
+                continue
+            self._paths[wd] = directory
+        return watched_all
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            self._notifier.setEnabled(False)
+            os.close(self._fd)
+            self._fd = -1
+            self._paths.clear()
+
+    def on_readable(self) -> None:
+        changed: Set[str] = set()
+        new_directories = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                logger.error(f"Failed to read inotify events: {e}")
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed.emit()
+                    continue
+                if mask & IN_IGNORED:
+                    # The folder was deleted or moved away, its parent reports the change
+                    self._paths.pop(wd, None)
+                    continue
+                directory = self._paths.get(wd)
+                if directory is None:
+                    continue
+                changed.add(directory)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    new_directories.append(os.path.join(directory, os.fsdecode(name)))
+
+        for directory in new_directories:
+            self.add_tree(directory)
+        for directory in changed:
+            self.directoryChanged.emit(directory)
+
+
+class QtTreeWatcher(QObject):
+    """Watches folder trees with QFileSystemWatcher, for platforms without inotify."""
+
+    directoryChanged = pyqtSignal(str)
+    overflowed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.on_directory_changed)
+
+    def add_tree(self, root: str) -> bool:
+        watched = set(self._watcher.directories())
+        directories = [directory for directory in _subdirectories(root) if directory not in watched]
+        failed = self._watcher.addPaths(directories) if directories else []
+        for directory in failed:
+            logger.warning(f"Cannot watch '{directory}'")
+        return not failed
+
+    def close(self) -> None:
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+
+    def on_directory_changed(self, directory: str) -> None:
+        if os.path.isdir(directory):
+            # Watch folders created or moved in
+            self.add_tree(directory)
+        self.directoryChanged.emit(directory)
+
+
+class DirectoryScanWorker(QThread):
+    """Runs LibraryScanner.scan_directories on a worker thread."""
+
+    scanFinished = pyqtSignal(object)  # ScanResult
+
+    def __init__(self, db_path: str, directories: List[str], parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.directories = directories
+
+    def run(self):
+        self.scanFinished.emit(LibraryScanner(self.db_path).scan_directories(self.directories, self.isInterruptionRequested))
+
+
+class LibraryWatcher(QObject):
+    """
+    Keeps the library tables in sync with the library folders while the application runs.
+
+    Folder changes are collected while events keep coming in (a split, tag and rename of a release is one burst)
+    and the changed folders are then rescanned incrementally on a worker thread in one batch, at most max_delay_ms
+    after the first event. Uses inotify on Linux and QFileSystemWatcher elsewhere; if folders cannot be watched
+    (e.g. the inotify watch limit is reached) the roots are rescanned every poll_interval_s seconds instead.
+    libraryChanged is emitted after each rescan that changed the database.
+    """
+
+    libraryChanged = pyqtSignal(object)  # ScanResult
+
+    def __init__(self, db_path: str, roots: List[str], debounce_ms: int = 300, max_delay_ms: int = 800, poll_interval_s: int = 60, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.debounce_ms = debounce_ms
+        self.max_delay_ms = max_delay_ms
+        self._pending: Set[str] = set()
+        self._first_event: Optional[float] = None
+        self._worker: Optional[DirectoryScanWorker] = None
+        self._watcher = None
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.timeout.connect(self.on_debounced)
+        self._poll = QTimer(self)
+        self._poll.setInterval(poll_interval_s * 1000)
+        self._poll.timeout.connect(self.on_overflowed)
+
+    def start(self) -> None:
+        try:
+            self._watcher = InotifyWatcher(self) if sys.platform.startswith("linux") else QtTreeWatcher(self)
+        except OSError as e:
+            logger.warning(f"Library watcher: inotify is not available ({e}), using QFileSystemWatcher")
+            self._watcher = QtTreeWatcher(self)
+        self._watcher.directoryChanged.connect(self.on_directory_changed)
+        self._watcher.overflowed.connect(self.on_overflowed)
+
+        watched_all = True
+        for root in self.roots:
+            if not os.path.isdir(root):
+                logger.warning(f"Library watcher: library folder '{root}' does not exist")
+                continue
+            watched_all = self._watcher.add_tree(root) and watched_all
+        if not watched_all:
+            logger.warning(f"Library watcher: not every folder can be watched, polling the library every {self._poll.interval() // 1000}s")
+            self._poll.start()
+        logger.info(f"Library watcher: watching {', '.join(self.roots)} with {type(self._watcher).__name__}")
+
+    def stop(self) -> None:
+        self._debounce.stop()
+        self._poll.stop()
+        if self._watcher is not None:
+            self._watcher.close()
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.requestInterruption()
+            self._worker.wait()
+
+    def on_directory_changed(self, directory: str) -> None:
+        self._pending.add(directory)
+        if self._first_event is None:
+            self._first_event = time.monotonic()
+        # Wait for the burst to settle, but not past max_delay_ms after its first event
+        waited_ms = (time.monotonic() - self._first_event) * 1000
+        self._debounce.start(max(0, min(self.debounce_ms, int(self.max_delay_ms - waited_ms))))
+
+    def on_overflowed(self) -> None:
+        for root in self.roots:
+            self.on_directory_changed(root)
+
+    def on_debounced(self) -> None:
+        if self._worker is not None and self._worker.isRunning():
+            # Picked up when the running scan finishes
+            return
+        directories = sorted(self._pending)
+        self._pending.clear()
+        self._first_event = None
+        # Subfolders of a pending folder are scanned with it
+        directories = [directory for directory in directories if not any(directory.startswith(os.path.join(other, "")) for other in directories)]
+        if not directories:
+            return
+        self._worker = DirectoryScanWorker(self.db_path, directories, self)
+        self._worker.scanFinished.connect(self.on_scan_finished)
+        self._worker.finished.connect(self._worker.deleteLater)
+        self._worker.start()
+
+    def on_scan_finished(self, result: ScanResult) -> None:
+        self._worker = None
+        if result.files or result.moved or result.deleted:
+            self.libraryChanged.emit(result)
+        if self._pending:
+            self.on_debounced()
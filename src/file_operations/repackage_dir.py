@@ -1,20 +1,15 @@
 import os
-import shutil
+import threading
+from typing import Iterable, List, Optional
 
+from PyQt5.QtCore import QEventLoop, QThread, pyqtSignal
 from PyQt5.QtWidgets import QMessageBox
 from ui.custom_messagebox import ButtonType, show_message_box, convert_response_to_string
-from file_operations.audio_tags import AudioTagHelper
+from ui.progress_bar_helper import ProgressBarHelper
+from file_operations.repackage_plan import PlannedMove, RepackagePlan, RepackageResult, execute_plan, plan_repackage
 from log_config import get_logger
-from typing import Tuple
 
 logger = get_logger(__name__)
-audio_tags = AudioTagHelper()
-
-
-def ___ask_user_to_overwrite(file, label):
-    """Ask user to overwrite file"""
-    message = f"The file:\n'{file}'\nalready exists in the target directory\n'{label}'. \n\nDo you want to overwrite it?"
-    return show_message_box(message, ButtonType.YesNoToAllCancel, "Overwrite File?")
 
 
 def repackage_dir_by_label(source_dir: str, target_dir: str) -> None:
@@ -23,92 +18,72 @@ def repackage_dir_by_label(source_dir: str, target_dir: str) -> None:
     repackage_files_by_label(os.listdir(source_dir), source_dir, target_dir)
 
 
-def repackage_files_by_label(files: dict[str], source_dir: str, target_dir: str) -> None:
-
-    user_choice = None
-    for file in files:
-        ##if file is a dir then skip
-        if os.path.isdir(os.path.join(source_dir, file)):
-            logger.info(f"Skipping - file is a directory: '{file}'")
-            continue
-        user_choice = repackage_file_by_label(file, source_dir, target_dir, user_choice)
-        if user_choice == QMessageBox.Cancel:
-            break
-
-    logger.info("Repacking Done")
-
-
-def repackage_file_by_label(file: str, source_dir: str, target_dir: str, user_choice: int = 0) -> int:
-    """repackages a file by label
-    Returns:
-           int: The result of the dialog if the file exists. Can be one of the following QMessageBox constants:
-                QMessageBox.Yes, QMessageBox.No, QMessageBox.YesToAll, QMessageBox.NoToAll, QMessageBox.Cancel
-                else returns whatever user_choice was passed in
+def repackage_files_by_label(files: Iterable[str], source_dir: str, target_dir: str) -> Optional[RepackageResult]:
     """
-
-    source_file = os.path.join(source_dir, file)
-    source_file = os.path.normpath(source_file)
-
-    # if file is a dir then skip
-
-    if os.path.isdir(source_file):
-        logger.info(f"Skipping - file is a directory: '{source_file}'")
-        return user_choice
-
-    # check is file is supported else skip
-    if not audio_tags.isSupportedAudioFile(source_file):
-        logger.warn(f"Skipping - file not supported: '{source_file}'")
-        return user_choice
-
-    # get tags if no tags skip
-    tags = audio_tags.get_tags(source_file)
-    if not tags:
-        logger.warn(f"Skipping - no tags '{source_file}'")
-        return user_choice
-
-    # get label if no label return "unknown Publisher"
-    label = tags.get("LABEL", ["Unknown Publisher"])[0]
-    target_subdir = os.path.join(target_dir, label)
-
-    # make dir if it doesn't exist.
-    os.makedirs(target_subdir, exist_ok=True)
-
-    # check if file exists in target dir and ask user to overwrite if needed
-    target_file = os.path.join(target_subdir, file)
-
-    if not os.path.exists(target_file):
-        __repack(source_file, target_file)
-
-    elif user_choice == QMessageBox.NoToAll:
-        __log_skip(target_file, user_choice)
-
-    elif user_choice == QMessageBox.YesToAll:
-        __log_overwrite(target_file, user_choice)
-        __repack(source_file, target_file)
-
-    else:
-        user_choice = ___ask_user_to_overwrite(file, label)
-
-        if user_choice in [QMessageBox.Yes, QMessageBox.YesToAll]:
-            __log_overwrite(target_file, user_choice)
-            __repack(source_file, target_file)
-
-        else:
-            __log_skip(target_file, user_choice)
-
-    return user_choice
-
-
-def __log_skip(target_file: str, user_choice: int) -> None:
-    logger.info(f"Skipping - target file already exists '{target_file}' - User choice: {convert_response_to_string(user_choice)}")
-
-
-def __log_overwrite(target_file: str, user_choice: int) -> None:
-    logger.info(f"Overwriting - target file already exists '{target_file}' - User choice: {convert_response_to_string(user_choice)}")
-
-
-def __repack(source_file: str, target_file: str):
-    """Moves the source file to the target file"""
-    logger.info(f"Repackaging {source_file} to {target_file}")
-    shutil.move(source_file, target_file)
-    logger.info("Repackaging Done")
+    Moves files (relative to source_dir, or absolute) into a folder per label under target_dir. The whole move is
+    planned first; if some targets already exist the user is asked once whether to overwrite them all, skip them,
+    or cancel the repackage. The moves run on a worker thread behind a progress bar, and the files that could not
+    be moved are listed at the end. Returns None if cancelled.
+    """
+    plan = plan_repackage(files, source_dir, target_dir)
+    overwrite = False
+    if plan.conflicts:
+        response = __ask_user_to_overwrite(plan.conflicts)
+        logger.info(f"Repackage: {len(plan.conflicts)} targets exist - User choice: {convert_response_to_string(response)}")
+        if response not in (QMessageBox.Yes, QMessageBox.No):
+            logger.info("Repackage cancelled")
+            return None
+        overwrite = response == QMessageBox.Yes
+
+    result = __execute_plan_in_background(plan, overwrite)
+    logger.info("Repacking Done")
+    if result is not None and result.failed:
+        failed = "\n".join(f"'{file}': {error}" for file, error in result.failed[:5])
+        more = f"\n... and {len(result.failed) - 5} more" if len(result.failed) > 5 else ""
+        show_message_box(f"{len(result.failed)} files could not be moved, check log files for details:\n\n{failed}{more}", ButtonType.Ok, "Error Repackaging Files")
+    return result
+
+
+class RepackageWorker(QThread):
+    """Runs execute_plan on a worker thread. cancel() skips the moves not yet started."""
+
+    progressChanged = pyqtSignal(int, int)  # files done, total files
+    repackageFinished = pyqtSignal(object)  # RepackageResult
+
+    def __init__(self, plan: RepackagePlan, overwrite: bool = False, parent=None):
+        super().__init__(parent)
+        self.plan = plan
+        self.overwrite = overwrite
+        self._stop = threading.Event()
+
+    def cancel(self) -> None:
+        self._stop.set()
+
+    def run(self):
+        self.repackageFinished.emit(execute_plan(self.plan, self.overwrite, progress=self.progressChanged.emit, should_stop=self._stop.is_set))
+
+
+def __execute_plan_in_background(plan: RepackagePlan, overwrite: bool) -> Optional[RepackageResult]:
+    """Runs the plan on a RepackageWorker, keeping the GUI responsive while the progress bar counts the files moved."""
+    progress = ProgressBarHelper(sum(overwrite or not move.conflict for move in plan.moves), "Repackaging")
+    worker = RepackageWorker(plan, overwrite)
+    results = []
+    loop = QEventLoop()
+    worker.progressChanged.connect(lambda done, total: progress.set_value(done, f"Repackaging... ({done} of {total} files)"))
+    worker.repackageFinished.connect(results.append)
+    worker.finished.connect(loop.quit)
+    progress.on_cancel(worker.cancel)
+    worker.start()
+    loop.exec_()
+    worker.wait()
+
+    progress.complete_progress_bar()
+    return results[0] if results else None
+
+
+def __ask_user_to_overwrite(conflicts: List[PlannedMove]) -> int:
+    """Asks once what to do with all the targets that already exist: Yes overwrites them, No skips them, Cancel stops."""
+    examples = "\n".join(f"'{move.target}'" for move in conflicts[:5])
+    more = f"\n... and {len(conflicts) - 5} more" if len(conflicts) > 5 else ""
+    message = f"{len(conflicts)} files already exist in the target label folders:\n\n{examples}{more}\n\nDo you want to overwrite them?"
+    return show_message_box(message, ButtonType.YesNoCancel, "Overwrite Files?")
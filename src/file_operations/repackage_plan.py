@@ -0,0 +1,186 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from file_operations.audio_tags import AudioTagHelper
+from file_operations.copy_engine import copy_file
+from log_config import get_logger
+
+logger = get_logger(__name__)
+audio_tags = AudioTagHelper()
+
+UNKNOWN_LABEL = "Unknown Publisher"
+COPY_WORKERS = 4  # Cross-device copies run in parallel, enough to keep a disk or network link busy
+
+
+@dataclass
+class PlannedMove:
+    source: str
+    target: str
+    label: str
+    same_device: bool  # os.rename can move it, otherwise it is copied then deleted
+    conflict: bool = False  # The target exists
+
+
+@dataclass
+class RepackagePlan:
+    """Every move of a repackage, worked out from the tags before any file is touched."""
+
+    moves: List[PlannedMove] = field(default_factory=list)
+    skipped: List[Tuple[str, str]] = field(default_factory=list)  # (file, reason)
+
+    @property
+    def conflicts(self) -> List[PlannedMove]:
+        return [move for move in self.moves if move.conflict]
+
+    @property
+    def cross_device(self) -> List[PlannedMove]:
+        return [move for move in self.moves if not move.same_device]
+
+
+@dataclass
+class RepackageResult:
+    moved: int = 0
+    copied: int = 0  # Moved across devices
+    overwritten: int = 0
+    skipped: int = 0
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (file, error)
+    elapsed: float = 0.0
+
+
+def plan_repackage(files: Iterable[str], source_dir: str, target_dir: str) -> RepackagePlan:
+    """
+    Phase one: reads the tags of all the audio files in parallel and works out where each one goes, whether its
+    target already exists and whether it can be renamed in place (same device) or has to be copied.
+    """
+    plan = RepackagePlan()
+    sources = []
+    for file in files:
+        source = os.path.normpath(os.path.join(source_dir, file))
+        if os.path.isdir(source):
+            logger.info(f"Skipping - file is a directory: '{file}'")
+        elif not audio_tags.isSupportedAudioFile(source):
+            plan.skipped.append((source, "not a supported audio file"))
+        else:
+            sources.append(source)
+
+    devices: Dict[str, Optional[int]] = {}
+    planned_targets = set()
+    for source, tags in audio_tags.get_tags_many(sources):
+        if not tags:
+            plan.skipped.append((source, "no tags"))
+            continue
+        label = tags.get(AudioTagHelper.LABEL, [UNKNOWN_LABEL])[0] or UNKNOWN_LABEL
+        target_subdir = os.path.normpath(os.path.join(target_dir, label))
+        target = os.path.join(target_subdir, os.path.basename(source))
+        if os.path.normcase(target) == os.path.normcase(source):
+            plan.skipped.append((source, "already in its label folder"))
+            continue
+        if os.path.normcase(target) in planned_targets:
+            plan.skipped.append((source, f"another file is moving to '{target}'"))
+            continue
+        planned_targets.add(os.path.normcase(target))
+
+        if target_subdir not in devices:
+            devices[target_subdir] = _device(target_subdir)
+        same_device = devices[target_subdir] is not None and devices[target_subdir] == _device(source)
+        plan.moves.append(PlannedMove(source, target, label, same_device, os.path.exists(target)))
+
+    for source, reason in plan.skipped:
+        logger.warning(f"Skipping - {reason}: '{source}'")
+    logger.info(
+        f"Repackage plan: {len(plan.moves)} moves ({len(plan.cross_device)} across devices), {len(plan.conflicts)} targets exist, {len(plan.skipped)} skipped"
+    )
+    return plan
+
+
+def execute_plan(
+    plan: RepackagePlan,
+    overwrite: bool = False,
+    workers: int = COPY_WORKERS,
+    progress: Optional[Callable[[int, int], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> RepackageResult:
+    """
+    Phase two: creates each label folder once, renames the same-device moves in one pass and copies the
+    cross-device moves on a thread pool (to a temporary name, then renamed, then the source is deleted).
+    Targets that exist are overwritten or skipped as a whole, following overwrite. progress is called with
+    (files done, total files); once should_stop returns True the moves not yet started are skipped.
+    """
+    started = time.perf_counter()
+    result = RepackageResult()
+    moves = [move for move in plan.moves if overwrite or not move.conflict]
+    result.skipped = len(plan.moves) - len(moves) + len(plan.skipped)
+    done = 0
+
+    for directory in {os.path.dirname(move.target) for move in moves}:
+        os.makedirs(directory, exist_ok=True)
+
+    for move in (move for move in moves if move.same_device):
+        if should_stop is not None and should_stop():
+            result.skipped += 1
+            continue
+        try:
+            os.replace(move.source, move.target)
+            result.moved += 1
+            result.overwritten += move.conflict
+        except OSError as e:
+            logger.error(f"Cannot move '{move.source}' to '{move.target}': {e}")
+            result.failed.append((move.source, str(e)))
+        done += 1
+        if progress is not None:
+            progress(done, len(moves))
+
+    copies = [move for move in moves if not move.same_device]
+    if copies:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="repackage") as pool:
+            futures = {pool.submit(_copy_and_delete, move, should_stop): move for move in copies}
+            for future in as_completed(futures):
+                move = futures[future]
+                try:
+                    if future.result():
+                        result.copied += 1
+                        result.overwritten += move.conflict
+                    else:
+                        result.skipped += 1
+                except OSError as e:
+                    logger.error(f"Cannot copy '{move.source}' to '{move.target}': {e}")
+                    result.failed.append((move.source, str(e)))
+                done += 1
+                if progress is not None:
+                    progress(done, len(moves))
+
+    result.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Repackaged {result.moved} files by rename and {result.copied} by copy ({result.overwritten} overwritten), "
+        f"{result.skipped} skipped, {len(result.failed)} failed in {result.elapsed:.1f}s"
+    )
+    return result
+
+
+def _device(path: str) -> Optional[int]:
+    """Returns the device of path, or of its nearest existing parent for a folder still to be created."""
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        except OSError:
+            return None
+
+
+def _copy_and_delete(move: PlannedMove, should_stop: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    Moves a file across devices: the target only appears once it is complete, and the source is deleted after that.
+    Returns False if the repackage was stopped before the file was started.
+    """
+    if should_stop is not None and should_stop():
+        return False
+    copy_file(move.source, move.target)
+    os.remove(move.source)
+    return True
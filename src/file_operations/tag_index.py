@@ -0,0 +1,293 @@
+import os
+import shlex
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from file_operations.audio_tags import AudioTagHelper
+from file_operations.library_scanner import walk_audio_directories
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_TABLE = "tag_index"
+FTS_TABLE = "tag_index_fts"
+BATCH_SIZE = 500
+
+# Indexed columns and the tags they are read from, all values of the first tag found are kept
+INDEX_TAGS = {
+    "artist": [AudioTagHelper.ARTIST, AudioTagHelper.ALBUM_ARTIST],
+    "title": [AudioTagHelper.TITLE],
+    "album": [AudioTagHelper.ALBUM],
+    "label": [AudioTagHelper.LABEL, AudioTagHelper.ORGANIZATION],
+    "catalog": [AudioTagHelper.CATALOGNUMBER, AudioTagHelper.CATALOG_NUMBER, AudioTagHelper.CATALOGID],
+    "genre": [AudioTagHelper.GENRE],
+    "style": [AudioTagHelper.STYLE],
+    "year": [AudioTagHelper.YEAR],
+}
+SEARCH_COLUMNS = ["name", *INDEX_TAGS]
+
+
+class IndexedFile(NamedTuple):
+    path: str
+    artist: str
+    title: str
+    album: str
+    label: str
+    catalog: str
+
+
+@dataclass
+class IndexResult:
+    """Counts of a crawl. completed is False if it was stopped before every root was crawled."""
+
+    files: int = 0
+    indexed: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    completed: bool = False
+    elapsed: float = 0.0
+
+
+def _tag_text(tags: Dict[str, List[str]], names: List[str]) -> str:
+    for name in names:
+        values = [str(value).strip() for value in tags.get(name, []) if str(value).strip()]
+        if values:
+            return " / ".join(values)
+    return ""
+
+
+def _under(root: str) -> Tuple[str, str]:
+    """Returns the (exclusive) range of paths under a folder: every path that starts with root + os.sep."""
+    root = root.rstrip(os.sep)
+    return root + os.sep, root + chr(ord(os.sep) + 1)
+
+
+def match_expression(text: str) -> str:
+    """
+    Turns a search box entry into an FTS5 query: every word must match the start of a word in some column, and
+    column:word only in that column, e.g. 'label:warp aphex' -> label : "warp"* AND "aphex"*.
+    """
+    try:
+        words = shlex.split(text)
+    except ValueError:
+        words = text.split()
+    terms = []
+    for word in words:
+        column, _, value = word.partition(":")
+        if not value or column.lower() not in SEARCH_COLUMNS:
+            column, value = "", word
+        value = value.replace('"', '""')
+        if value:
+            terms.append(f'{column.lower()} : "{value}"*' if column else f'"{value}"*')
+    return " AND ".join(terms)
+
+
+def ensure_index_tables(conn: sqlite3.Connection) -> bool:
+    """Creates the index tables. Returns False if SQLite has no FTS5, in which case search falls back to LIKE."""
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {INDEX_TABLE}
+        (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            size INTEGER,
+            mtime_ns INTEGER,
+            {", ".join(f"{column} TEXT" for column in INDEX_TAGS)}
+        )
+    """
+    )
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+    try:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, content='{INDEX_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Tag index: FTS5 is not available ({e}), searching with LIKE")
+        conn.commit()
+        return False
+    # Keep the external content FTS table in step with the index table
+    conn.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_ai AFTER INSERT ON {INDEX_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_ad AFTER DELETE ON {INDEX_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {INDEX_TABLE}_au AFTER UPDATE ON {INDEX_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (new.id, {new_values});
+        END;
+    """
+    )
+    conn.commit()
+    return True
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")  # Searches read while the crawler writes
+    return conn
+
+
+class TagIndex:
+    """
+    Searches the tag index: a SQLite database, separate from the catalogue, of the tags of every audio file under
+    the library roots, with an FTS5 table over file name and tags. Kept up to date by TagIndexer.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts = False
+
+    def search(self, text: str, limit: int = 1000) -> List[IndexedFile]:
+        """Returns the files whose name or tags match every word of text (prefix match), in path order."""
+        if not text.strip():
+            return []
+        conn = self.__connection()
+        columns = "t.path, t.artist, t.title, t.album, t.label, t.catalog"
+        if self._fts:
+            expression = match_expression(text)
+            if not expression:
+                return []
+            sql = f"SELECT {columns} FROM {FTS_TABLE} f JOIN {INDEX_TABLE} t ON t.id = f.rowid WHERE {FTS_TABLE} MATCH ? ORDER BY t.path LIMIT ?"
+            parameters: tuple = (expression, limit)
+        else:
+            words = text.split()
+            condition = " AND ".join(f"({' OR '.join(f'{column} LIKE ?' for column in SEARCH_COLUMNS)})" for _ in words)
+            sql = f"SELECT {columns} FROM {INDEX_TABLE} t WHERE {condition} ORDER BY t.path LIMIT ?"
+            parameters = tuple(f"%{word}%" for word in words for _ in SEARCH_COLUMNS) + (limit,)
+        try:
+            return [IndexedFile(*(value or "" for value in row)) for row in conn.execute(sql, parameters)]
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Tag index search '{text}' failed: {e}")
+            return []
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.db_path)
+            self._fts = ensure_index_tables(self._conn)
+        return self._conn
+
+
+class TagIndexer:
+    """
+    Crawls the library roots into the tag index. Only files whose size or mtime changed since they were indexed
+    have their tags read, on AudioTagHelper's thread pool, and files gone from a root are removed when its crawl
+    completes.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.audio_tags = AudioTagHelper()
+
+    def crawl(self, roots: List[str], progress: Optional[Callable[[int, int], None]] = None, should_stop: Optional[Callable[[], bool]] = None) -> IndexResult:
+        """Indexes the audio files under roots. progress is called with (files read, files to read)."""
+        started = time.perf_counter()
+        result = IndexResult()
+        conn = _connect(self.db_path)
+        try:
+            ensure_index_tables(conn)
+            for root in roots:
+                if not self.__crawl_root(conn, os.path.normpath(os.path.abspath(root)), result, progress, should_stop):
+                    break
+            else:
+                result.completed = True
+        finally:
+            conn.close()
+        result.elapsed = time.perf_counter() - started
+        logger.info(
+            f"Tag index: {result.files} files under {len(roots)} roots, {result.indexed} indexed, {result.unchanged} unchanged, "
+            f"{result.deleted} removed in {result.elapsed:.1f}s{'' if result.completed else ' (stopped)'}"
+        )
+        return result
+
+    def __crawl_root(self, conn: sqlite3.Connection, root: str, result: IndexResult, progress, should_stop) -> bool:
+        low, high = _under(root)
+        known = {row[0]: (row[1], row[2]) for row in conn.execute(f"SELECT path, size, mtime_ns FROM {INDEX_TABLE} WHERE path > ? AND path < ?", (low, high))}
+        seen = set()
+        changed = []
+        for _, files in walk_audio_directories(root):
+            if should_stop is not None and should_stop():
+                return False
+            for file in files:
+                seen.add(file.path)
+                if known.get(file.path) == (file.fingerprint.size, file.fingerprint.mtime_ns):
+                    result.unchanged += 1
+                else:
+                    changed.append(file)
+        result.files += len(seen)
+
+        columns = ["path", "name", "size", "mtime_ns", *INDEX_TAGS]
+        upsert = (
+            f"INSERT INTO {INDEX_TABLE} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(path) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in columns[1:])}"
+        )
+        batch = []
+        by_path = {file.path: file for file in changed}
+        for done, (path, tags) in enumerate(self.audio_tags.get_tags_many(by_path), start=1):
+            file = by_path[path]
+            batch.append((path, file.name, file.fingerprint.size, file.fingerprint.mtime_ns, *(_tag_text(tags or {}, names) for names in INDEX_TAGS.values())))
+            if len(batch) >= self.batch_size or done == len(changed):
+                with conn:
+                    conn.executemany(upsert, batch)
+                result.indexed += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(done, len(changed))
+                if should_stop is not None and should_stop():
+                    return False
+
+        gone = [(path,) for path in known if path not in seen]
+        if gone:
+            with conn:
+                conn.executemany(f"DELETE FROM {INDEX_TABLE} WHERE path = ?", gone)
+            result.deleted += len(gone)
+        return True
+
+
+class TagIndexWorker(QThread):
+    """Runs a TagIndexer crawl on a worker thread. requestInterruption() stops it after the current batch."""
+
+    progressChanged = pyqtSignal(int, int)  # files read, files to read
+    indexFinished = pyqtSignal(object)  # IndexResult
+
+    def __init__(self, db_path: str, roots: List[str], parent=None):
+        super().__init__(parent)
+        self.indexer = TagIndexer(db_path)
+        self.roots = roots
+
+    def run(self):
+        self.indexFinished.emit(self.indexer.crawl(self.roots, self.progressChanged.emit, self.isInterruptionRequested))
+
+
+if __name__ == "__main__":
+    # python -m file_operations.tag_index <index db> <library root>...   or   python -m file_operations.tag_index <index db> --search <text>
+    if len(sys.argv) < 3:
+        print("Usage: python -m file_operations.tag_index <index db> <library root>... | <index db> --search <text>")
+        sys.exit(1)
+    if sys.argv[2] == "--search":
+        search_started = time.perf_counter()
+        matches = TagIndex(sys.argv[1]).search(" ".join(sys.argv[3:]))
+        for match in matches:
+            print(f"{match.path}\t{match.artist}\t{match.title}\t{match.label}")
+        print(f"{len(matches)} files in {(time.perf_counter() - search_started) * 1000:.1f} ms")
+    else:
+        crawl_result = TagIndexer(sys.argv[1]).crawl(sys.argv[2:], progress=lambda done, total: print(f"{done} / {total} files"))
+        print(f"{crawl_result.files} files, {crawl_result.indexed} indexed, {crawl_result.unchanged} unchanged, {crawl_result.deleted} removed in {crawl_result.elapsed:.1f}s")
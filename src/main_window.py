@@ -1,12 +1,12 @@
 import configparser
 import os
 import traceback
-from typing import Dict, Union, cast
+from typing import Dict, List, Union, cast
 
 import winshell
 from PyQt5 import uic, QtGui
-from PyQt5.QtCore import QSize, QPropertyAnimation, QEasingCurve, QDir, QModelIndex, QPoint
-from PyQt5.QtGui import QFont, QPixmap, QIcon
+from PyQt5.QtCore import QSize, QPropertyAnimation, QEasingCurve, QDir, QModelIndex, QPoint, QTimer
+from PyQt5.QtGui import QFont, QIcon
 from PyQt5.QtMultimedia import QMediaPlayer
 from PyQt5.QtWidgets import (
     QStackedWidget,
@@ -21,14 +21,17 @@ from PyQt5.QtWidgets import (
     QCompleter,
     QWidget,
     QFileSystemModel, QMenu,
+    QBoxLayout,
 )
 from mutagen.id3 import PictureType
 
-from file_operations.audio_tags import AudioTagHelper, PictureTypeDescription
+from file_operations.audio_tags import TAG_CACHE, AudioTagHelper, PictureTypeDescription
 from file_operations.file_utils import ask_and_move_files, ask_and_copy_files
-from file_operations.repackage_dir import repackage_dir_by_label
+from file_operations.library_watcher import library_roots
+from file_operations.repackage_dir import repackage_dir_by_label, repackage_files_by_label
+from file_operations.tag_index import TagIndex, TagIndexWorker
 from log_config import get_logger
-from path_helper import get_absolute_path_config
+from path_helper import get_absolute_path_config, get_absolute_path_tag_index
 from ui.custom_image_label import ImageLabel
 from ui.custom_line_edit import MyLineEdit
 from ui.custom_tree_view import MyTreeView
@@ -38,6 +41,8 @@ from ui.db_media_window import DatabaseMediaWindow
 from ui.media_player import MediaPlayerController
 from ui.recycle import RestoreDialog
 from ui.settings_dialogue import SettingsDialog
+from ui.tag_panel_loader import TagPanelLoader
+from ui.tag_search_box import TagSearchBox
 
 logger = get_logger("mc.main_window")
 
@@ -52,6 +57,7 @@ CONFIG_WINDOW_HEIGHT = "height"
 CONFIG_WINDOW_WIDTH = "Width"
 CONFIG_LAST_RIGHT_DIRECTORY = "last_right_directory"
 CONFIG_LAST_LEFT_DIRECTORY = "last_left_directory"
+TAG_INDEX_REFRESH_MS = 10 * 60 * 1000  # The tag index is brought up to date (changed files only) this often
 
 # Create a dictionary that maps picture type numbers to descriptions
 PICTURE_TYPES = {value: key for key, value in vars(PictureType).items() if not key.startswith("_")}
@@ -92,6 +98,9 @@ class MainWindow(QMainWindow):
         self.__setup_ui()
         self.db_window.setup_ui("C:/")
         self.db_media_window.setup_ui()
+        # Files played from the explorer reuse the catalogue's cached waveforms and tags
+        self.player_a.set_catalogue(self.db_media_window.music_db2)
+        self.player_b.set_catalogue(self.db_media_window.music_db2)
 
     def __setup_ui(self):
         """Set up the user interface. Returns: None"""
@@ -108,6 +117,9 @@ class MainWindow(QMainWindow):
         self.__setup_id3_tags()
         self.__setup_label_cache()
         self.__setup_label_style_sheet()
+        self.__setup_artwork_navigation()
+        self.__setup_tag_panel_loader()
+        self.__setup_tag_search()
         self.__clear_labels()
         self.__setup_action_buttons()
         self.__setup_menu_buttons()
@@ -379,7 +391,7 @@ class MainWindow(QMainWindow):
 
     def __set_tree_actions(self, tree_view: MyTreeView, last_dir: str, path_bar: MyLineEdit) -> None:
         tree_view.setup_tree_view(last_dir)
-        tree_view.set_single_click_handler(self.on_tree_clicked)
+        tree_view.set_current_changed_handler(self.on_tree_current_changed)
         tree_view.set_double_click_handler(lambda index, clicked_tree, _: self.on_tree_double_clicked(index, clicked_tree, path_bar))
         tree_view.set_custom_context_menu(self.on_context_menu_requested)
 
@@ -444,8 +456,8 @@ class MainWindow(QMainWindow):
 
         RestoreDialog().exec_()
 
-    def on_tree_clicked(self, item: QModelIndex, tree_view: MyTreeView) -> None:
-        """Handles the tree view click event. Returns: None"""
+    def on_tree_current_changed(self, item: QModelIndex, tree_view: MyTreeView) -> None:
+        """Handles the current item of a tree view changing, by mouse or keyboard. Returns: None"""
         self.display_id3_tags_when_an_item_is_selected(item, tree_view)
 
     @staticmethod
@@ -563,22 +575,27 @@ class MainWindow(QMainWindow):
             label.setText("")
 
     def display_id3_tags_when_an_item_is_selected(self, item: QModelIndex, tree_view: QTreeView) -> None:
-        """Displays the ID3 tags for the selected audio file in the left tree. Returns: None"""
+        """
+        Requests the ID3 tags and artwork of the selected audio file. They are read on the tag panel loader's worker
+        and displayed by on_tag_panel_loaded; requests superseded by a newer selection are dropped. Returns: None
+        """
 
         model = cast(QFileSystemModel, tree_view.model())
         absolute_filename = model.filePath(item)
 
         if not self.audio_tags.isSupportedAudioFile(absolute_filename):
+            self.tag_panel_loader.cancel(tree_view)
             return
 
-        self._display_id3_tags(absolute_filename, tree_view)
-        self._display_cover_artwork(absolute_filename, tree_view)
+        self.tag_panel_loader.load(tree_view, absolute_filename)
 
-    def _display_cover_artwork(self, absolute_file_path: str, tree_view: QTreeView) -> None:
-        """Displays the cover artwork for the selected audio file in the left tree. Returns: None"""
-        # Get artwork from the audio tags
-        cover_art_images = self.audio_tags.get_cover_art(absolute_file_path)
+    def on_tag_panel_loaded(self, tree_view: QTreeView, absolute_file_path: str, tags: dict, cover_art_images: list) -> None:
+        """Displays the tags and artwork read for the file selected in a tree view. Returns: None"""
+        self._display_id3_tags(tags, tree_view)
+        self._display_cover_artwork(cover_art_images, tree_view)
 
+    def _display_cover_artwork(self, cover_art_images: list, tree_view: QTreeView) -> None:
+        """Displays the cover artwork headers read for the selected audio file, each image is decoded when its page is shown. Returns: None"""
         stacked_widget = self.stacked_widget_right if tree_view == self.tree_right else self.stacked_widget_left
 
         # Clear the QStackedWidget
@@ -589,24 +606,84 @@ class MainWindow(QMainWindow):
 
             # Add the cover art images to the QStackedWidget
         for image in cover_art_images:
-            pixmap = QPixmap()
-            pixmap.loadFromData(image.data)  # type: ignore[attr-defined]
-            label = ImageLabel(pixmap, image)
-            stacked_widget.addWidget(label)
+            stacked_widget.addWidget(ImageLabel(None, image))
 
         # Store the sizes of the images in bytes in a list
-        self.image_sizes = [len(image.data) for image in cover_art_images]  # type: ignore[attr-defined]
+        self.image_sizes = [image.size for image in cover_art_images]
 
         label_map = self.get_labels(tree_view, "artwork")
-        page_number_label = label_map.get("page")
-
-        page_number_label.setText(f"{stacked_widget.currentIndex() + 1} / {stacked_widget.count()}")
+        label_map.get("page").setText(f"{stacked_widget.currentIndex() + 1} / {stacked_widget.count()}")
         stacked_widget.setCurrentIndex(0)
-        label_map.get("next").clicked.connect(lambda: stacked_widget.setCurrentIndex((stacked_widget.currentIndex() + 1) % stacked_widget.count()))
-        label_map.get("prev").clicked.connect(lambda: stacked_widget.setCurrentIndex((stacked_widget.currentIndex() - 1) % stacked_widget.count()))
 
-        stacked_widget.currentChanged.connect(lambda: page_number_label.setText(f"{stacked_widget.currentIndex() + 1} / {stacked_widget.count()}"))
-        stacked_widget.currentChanged.connect(lambda: self.update_image_labels(stacked_widget, label_map))
+    def __setup_artwork_navigation(self) -> None:
+        """Connects the artwork page buttons of both trees once, they act on whatever artwork is displayed. Returns: None"""
+        for tree_view, stacked_widget in ((self.tree_left, self.stacked_widget_left), (self.tree_right, self.stacked_widget_right)):
+            label_map = self.get_labels(tree_view, "artwork")
+            label_map.get("next").clicked.connect(lambda _=False, widget=stacked_widget: self.__turn_artwork_page(widget, 1))
+            label_map.get("prev").clicked.connect(lambda _=False, widget=stacked_widget: self.__turn_artwork_page(widget, -1))
+            stacked_widget.currentChanged.connect(lambda _, widget=stacked_widget, labels=label_map: self.update_image_labels(widget, labels))
+
+    def __setup_tag_panel_loader(self) -> None:
+        """Tags and artwork of the selected files are read off the GUI thread. Returns: None"""
+        self.tag_panel_loader = TagPanelLoader(parent=self)
+        self.tag_panel_loader.panelLoaded.connect(self.on_tag_panel_loaded)
+        self.application.aboutToQuit.connect(self.tag_panel_loader.close)
+
+    def __setup_tag_search(self) -> None:
+        """Adds a tag search box above each tree, backed by the tag index, which is refreshed in the background. Returns: None"""
+        self.tag_index = TagIndex(get_absolute_path_tag_index())
+        self.tag_index_worker = None
+        has_roots = bool(self.__tag_index_roots())
+        for tree_view in (self.tree_left, self.tree_right):
+            search_box = TagSearchBox(self.tag_index, tree_view, self)
+            if not has_roots:
+                # Indexing whatever folder a tree is browsing could crawl a whole drive: only configured roots are indexed
+                search_box.setEnabled(False)
+                search_box.setPlaceholderText("Tag search: set [library] roots in config.ini")
+                search_box.setToolTip("Add the library folders to index to config.ini, under [library] roots (one per line or separated by ';')")
+            layout = tree_view.parentWidget().layout()
+            if isinstance(layout, QBoxLayout):
+                layout.insertWidget(layout.indexOf(tree_view), search_box)
+            else:
+                logger.warning(f"No layout to add the tag search box of {tree_view.objectName()} to")
+
+        self.tag_index_timer = QTimer(self)
+        self.tag_index_timer.setInterval(TAG_INDEX_REFRESH_MS)
+        self.tag_index_timer.timeout.connect(self.refresh_tag_index)
+        self.application.aboutToQuit.connect(self.__stop_tag_index)
+        if not has_roots:
+            logger.info("No library roots are configured, the tag index is not crawled")
+            return
+        self.tag_index_timer.start()
+        QTimer.singleShot(0, self.refresh_tag_index)
+
+    @staticmethod
+    def __tag_index_roots() -> List[str]:
+        """Returns the configured library roots that exist."""
+        return [root for root in dict.fromkeys(library_roots()) if os.path.isdir(root)]
+
+    def refresh_tag_index(self) -> None:
+        """Crawls the configured library roots into the tag index. Only changed files are read. Returns: None"""
+        if self.tag_index_worker is not None and self.tag_index_worker.isRunning():
+            return
+        roots = self.__tag_index_roots()
+        if not roots:
+            return
+        self.tag_index_worker = TagIndexWorker(get_absolute_path_tag_index(), roots, self)
+        self.tag_index_worker.indexFinished.connect(lambda result: logger.info(f"Tag index refreshed: {result.indexed} files indexed, {result.deleted} removed"))
+        self.tag_index_worker.start()
+
+    def __stop_tag_index(self) -> None:
+        self.tag_index_timer.stop()
+        if self.tag_index_worker is not None and self.tag_index_worker.isRunning():
+            self.tag_index_worker.requestInterruption()
+            self.tag_index_worker.wait()
+        self.tag_index.close()
+
+    @staticmethod
+    def __turn_artwork_page(stacked_widget: QStackedWidget, step: int) -> None:
+        if stacked_widget.count():
+            stacked_widget.setCurrentIndex((stacked_widget.currentIndex() + step) % stacked_widget.count())
 
     def update_image_labels(self, stacked_widget: QStackedWidget, label_map: Dict[str, int]) -> None:
         """Update the image labels when the current index of the stacked widget changes."""
@@ -616,10 +693,11 @@ class MainWindow(QMainWindow):
         if widget is None:
             return
 
-        pixmap = widget.pixmap
+        label_map.get("page").setText(f"{stacked_widget.currentIndex() + 1} / {stacked_widget.count()}")  # type: ignore[attr-defined]
 
-        # Update the resolution label
-        resolution = f"{pixmap.width()}x{pixmap.height()}"
+        # Update the resolution label, the full image is not decoded for it
+        source_size = widget.source_size
+        resolution = f"{source_size.width()}x{source_size.height()}"
         label_map.get("res").setText(resolution)  # type: ignore[attr-defined]
 
         # Update the size label
@@ -632,13 +710,10 @@ class MainWindow(QMainWindow):
         label_map.get("mime").setText(widget.image.mime)  # type: ignore[attr-defined]
         label_map.get("desc").setText(widget.image.desc)  # type: ignore[attr-defined]
 
-    def _display_id3_tags(self, absolute_file_path: str, tree_view: QTreeView) -> None:
-        """Displays the ID3 tags for the selected audio file in the left tree. Returns: None"""
+    def _display_id3_tags(self, audio_tags: dict, tree_view: QTreeView) -> None:
+        """Displays the ID3 tags read for the selected audio file in the tree's labels. Returns: None"""
 
         labels = self.get_labels(tree_view, "id3")
-
-        # Get the ID3 tags for the selected file from AudioTags
-        audio_tags = self.audio_tags.get_tags(absolute_file_path)
         url = audio_tags.get(AudioTagHelper.URL, [""])[0]  # Get the URL if present
 
         for label, tag in zip(labels, self.id3_tags):
@@ -685,7 +760,11 @@ class MainWindow(QMainWindow):
 
         self.update_status("Repackaging started...")
         logger.info("Repackaging started...")
-        repackage_dir_by_label(left_dir, right_dir)
+        if tree_left.is_showing_search_results:
+            # Repackage the files found by the tag search rather than the folder
+            repackage_files_by_label(tree_left.get_selected_files(True), left_dir, right_dir)
+        else:
+            repackage_dir_by_label(left_dir, right_dir)
         logger.info("Repackaging finished...")
 
     def toggle_menu(self) -> None:
@@ -725,6 +804,7 @@ if __name__ == "__main__":
         exit_code = 1
 
     finally:
+        logger.info(f"Tag cache: {TAG_CACHE.stats}")
         logger.info("Application exited")
         app.quit()
     sys.exit(exit_code)
@@ -21,3 +21,13 @@ def get_absolute_path_config() -> str:
 def get_absolute_path_log_dir() -> str:
     # Define the path to the log directory
     return os.path.join(get_base_dir(), 'logs')
+
+
+def get_absolute_path_artwork_cache_dir() -> str:
+    # Define the path to the cover art thumbnail cache
+    return os.path.join(get_base_dir(), 'cache', 'artwork')
+
+
+def get_absolute_path_tag_index() -> str:
+    # Define the path to the tag index of the file explorer
+    return os.path.join(get_base_dir(), 'cache', 'tag_index.db')
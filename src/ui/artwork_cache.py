@@ -0,0 +1,232 @@
+import hashlib
+import os
+import queue
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from PyQt5.QtCore import QBuffer, QByteArray, QCoreApplication, QIODevice, QObject, QSize, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+from file_operations.artwork import ArtworkInfo
+from log_config import get_logger
+from path_helper import get_absolute_path_artwork_cache_dir
+
+logger = get_logger(__name__)
+
+SIZE_STEP = 64  # Thumbnails are made for target sizes rounded up to a multiple of this, so resizing a label seldom decodes again
+MAX_MEMORY_BYTES = 64 * 1024 * 1024
+MAX_DISK_BYTES = 256 * 1024 * 1024
+SOURCE_SIZE_KEY = "source_size"  # PNG text entry of a thumbnail on disk holding the size of the original image
+
+ArtworkCallback = Callable[[QPixmap, QSize], None]  # (thumbnail, size of the original image)
+
+
+@dataclass
+class ArtworkCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    decodes: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.decodes} decodes"
+
+
+def _bucket(size: QSize) -> Tuple[int, int]:
+    return tuple(max(SIZE_STEP, -(-max(1, length) // SIZE_STEP) * SIZE_STEP) for length in (size.width(), size.height()))
+
+
+def _source_key(image: Union[ArtworkInfo, bytes]) -> Optional[tuple]:
+    """Identifies an image embedded in a file without reading it, so its content hash is only computed once."""
+    if isinstance(image, ArtworkInfo) and image.offset >= 0:
+        return image.path, image.offset, image.size, image.fingerprint
+    return None
+
+
+def _image_data(image: Union[ArtworkInfo, bytes]) -> bytes:
+    return image.data if isinstance(image, ArtworkInfo) else image
+
+
+def image_dimensions(data: bytes) -> QSize:
+    """Returns the width and height of an encoded image from its header, without decoding it."""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.ReadOnly)
+    return QImageReader(buffer).size()
+
+
+class ArtworkDecodeWorker(QThread):
+    """
+    Decodes and scales cover art on a worker thread, taking jobs from a queue. A thumbnail is read from the disk
+    cache if it was made before, otherwise the image is decoded at the reduced size (QImageReader.setScaledSize lets
+    JPEG skip most of the work for large scans) and written to the disk cache.
+    """
+
+    thumbnailReady = pyqtSignal(object, str, object, QImage, QSize)  # request key, content hash, bucket, thumbnail, original size
+
+    def __init__(self, cache_dir: str, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.jobs: "queue.Queue[Optional[Tuple[tuple, Union[ArtworkInfo, bytes], Optional[str], Tuple[int, int]]]]" = queue.Queue()
+        self.stats = ArtworkCacheStats()
+
+    def run(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.__prune()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            request_key, image, digest, bucket = job
+            try:
+                data = None
+                if digest is None:
+                    data = _image_data(image)
+                    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+                thumbnail, source_size = self.__thumbnail(image, data, digest, bucket)
+            except Exception:
+                logger.exception(f"Cannot decode cover art: {request_key}")
+                thumbnail, source_size = QImage(), QSize()
+            self.thumbnailReady.emit(request_key, digest or "", bucket, thumbnail, source_size)
+
+    def __thumbnail(self, image: Union[ArtworkInfo, bytes], data: Optional[bytes], digest: str, bucket: Tuple[int, int]) -> Tuple[QImage, QSize]:
+        """Returns the thumbnail and original size. The image data is only read if the thumbnail is not on disk."""
+        path = os.path.join(self.cache_dir, f"{digest}_{bucket[0]}x{bucket[1]}.png")
+        thumbnail = QImage(path) if os.path.exists(path) else QImage()
+        if not thumbnail.isNull():
+            width, _, height = thumbnail.text(SOURCE_SIZE_KEY).partition("x")
+            if width.isdigit() and height.isdigit():
+                self.stats.disk_hits += 1
+                return thumbnail, QSize(int(width), int(height))
+
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data if data is not None else _image_data(image)))
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer)
+        source_size = reader.size()
+        if source_size.isValid() and (source_size.width() > bucket[0] or source_size.height() > bucket[1]):
+            reader.setScaledSize(source_size.scaled(QSize(*bucket), Qt.KeepAspectRatio))
+        thumbnail = reader.read()
+        self.stats.decodes += 1
+        if thumbnail.isNull():
+            logger.warning(f"Cannot decode cover art {digest}: {reader.errorString()}")
+            return thumbnail, source_size
+
+        thumbnail.setText(SOURCE_SIZE_KEY, f"{source_size.width()}x{source_size.height()}")
+        temporary = f"{path}.{os.getpid()}.tmp"
+        if thumbnail.save(temporary, "PNG"):
+            os.replace(temporary, path)
+        return thumbnail, source_size
+
+    def __prune(self) -> None:
+        """Deletes the least recently written thumbnails while the disk cache is over MAX_DISK_BYTES."""
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries if entry.is_file()]
+        except OSError as e:
+            logger.warning(f"Cannot list the artwork cache '{self.cache_dir}': {e}")
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= MAX_DISK_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
+
+class ArtworkCache(QObject):
+    """
+    Scaled cover art thumbnails keyed by the hash of the image data and the target size.
+
+    Thumbnails are kept in an LRU of QPixmaps in memory and as PNG files in a disk cache, so the same scan is decoded
+    once however often its track is loaded, and not again in the next session. Decoding runs on an
+    ArtworkDecodeWorker; request() calls back on the GUI thread with a thumbnail at least as large as the target size
+    (or the original image if smaller), which the caller scales to fit.
+    """
+
+    def __init__(self, cache_dir: str, parent=None):
+        super().__init__(parent)
+        self.worker = ArtworkDecodeWorker(cache_dir)
+        self.worker.thumbnailReady.connect(self.__on_thumbnail_ready)
+        self._pixmaps: "OrderedDict[Tuple[str, Tuple[int, int]], Tuple[QPixmap, QSize]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._digests: Dict[tuple, str] = {}  # source key -> content hash
+        self._pending: Dict[tuple, List[ArtworkCallback]] = {}  # request key -> callbacks waiting for the thumbnail
+
+    @property
+    def stats(self) -> ArtworkCacheStats:
+        return self.worker.stats
+
+    def request(self, image: Union[ArtworkInfo, bytes], size: QSize, callback: ArtworkCallback) -> None:
+        """
+        Calls callback(thumbnail, original size) with the image scaled to fit size: at once if the thumbnail is in
+        memory, otherwise when the worker has made it.
+        """
+        bucket = _bucket(size)
+        source_key = _source_key(image)
+        digest = self._digests.get(source_key) if source_key is not None else None
+        if digest is None and source_key is None:
+            digest = hashlib.blake2b(_image_data(image), digest_size=16).hexdigest()
+
+        entry = self._pixmaps.get((digest, bucket)) if digest is not None else None
+        if entry is not None:
+            self._pixmaps.move_to_end((digest, bucket))
+            self.worker.stats.memory_hits += 1
+            callback(*entry)
+            return
+
+        request_key = (source_key or digest, bucket)
+        if request_key in self._pending:
+            self._pending[request_key].append(callback)
+            return
+        self._pending[request_key] = [callback]
+        if not self.worker.isRunning():
+            self.worker.start()
+        self.worker.jobs.put((request_key, image, digest, bucket))
+
+    def close(self) -> None:
+        """Stops the worker, e.g. when the application quits."""
+        if self.worker.isRunning():
+            self.worker.jobs.put(None)
+            self.worker.wait()
+        logger.info(f"Artwork cache: {self.stats}")
+
+    def __on_thumbnail_ready(self, request_key: tuple, digest: str, bucket: Tuple[int, int], thumbnail: QImage, source_size: QSize) -> None:
+        pixmap = QPixmap.fromImage(thumbnail)
+        if not pixmap.isNull():
+            if isinstance(request_key[0], tuple):
+                self._digests[request_key[0]] = digest
+            self.__put((digest, bucket), pixmap, source_size)
+        for callback in self._pending.pop(request_key, []):
+            try:
+                callback(pixmap, source_size)
+            except RuntimeError:
+                # The widget waiting for the thumbnail has been deleted, e.g. the explorer moved to another file
+                logger.debug(f"Cover art requester gone: {request_key}")
+
+    def __put(self, key: Tuple[str, Tuple[int, int]], pixmap: QPixmap, source_size: QSize) -> None:
+        previous = self._pixmaps.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[0].width() * previous[0].height() * 4
+        self._pixmaps[key] = (pixmap, source_size)
+        self._memory_bytes += pixmap.width() * pixmap.height() * 4
+        while self._memory_bytes > MAX_MEMORY_BYTES and len(self._pixmaps) > 1:
+            evicted, _ = self._pixmaps.popitem(last=False)[1]
+            self._memory_bytes -= evicted.width() * evicted.height() * 4
+
+
+_ARTWORK_CACHE: Optional[ArtworkCache] = None
+
+
+def artwork_cache() -> ArtworkCache:
+    """Returns the application's ArtworkCache, created on first use in the GUI thread and stopped when the application quits."""
+    global _ARTWORK_CACHE
+    if _ARTWORK_CACHE is None:
+        _ARTWORK_CACHE = ArtworkCache(get_absolute_path_artwork_cache_dir())
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_ARTWORK_CACHE.close)
+    return _ARTWORK_CACHE
@@ -1,21 +1,47 @@
 from PyQt5.QtWidgets import QLabel, QVBoxLayout, QDialog
-from PyQt5.QtCore import  Qt
+from PyQt5.QtCore import  Qt, QSize
+from typing import Optional
 from PyQt5.QtGui import QPixmap, QIcon
-from mutagen.id3 import APIC
+from file_operations.artwork import ArtworkInfo
 from file_operations.audio_tags import PictureTypeDescription
+from ui.artwork_cache import artwork_cache, image_dimensions
 
 
 class ImageLabel(QLabel):
-    """ A label that displays an image. """
+    """
+    A label that displays an image. A thumbnail for the label size is requested from the artwork cache when the label
+    is shown or resized, e.g. as the current page of a QStackedWidget; the full image is only decoded for the pop up.
+    """
 
-    def __init__(self, pixmap: QPixmap, image: APIC):
+    def __init__(self, pixmap: Optional[QPixmap], image: ArtworkInfo):
         super().__init__()
-        self.pixmap = pixmap
+        self._pixmap = pixmap
+        self._source_size: Optional[QSize] = pixmap.size() if pixmap is not None else None
         self.image = image
 
+    @property
+    def pixmap(self) -> QPixmap:
+        if self._pixmap is None:
+            self._pixmap = QPixmap()
+            self._pixmap.loadFromData(self.image.data)
+        return self._pixmap
+
+    @property
+    def source_size(self) -> QSize:
+        """Width and height of the full image, read from its header if no thumbnail has been shown yet."""
+        if self._source_size is None or not self._source_size.isValid():
+            self._source_size = image_dimensions(self.image.data)
+        return self._source_size
+
     def resizeEvent(self, event):
-        scaled_pixmap = self.pixmap.scaled(self.size(), Qt.KeepAspectRatio)
-        self.setPixmap(scaled_pixmap)
+        if self._pixmap is not None:
+            self.__show_thumbnail(self._pixmap, self._pixmap.size())
+        else:
+            artwork_cache().request(self.image, self.size(), self.__show_thumbnail)
+
+    def __show_thumbnail(self, thumbnail: QPixmap, source_size: QSize) -> None:
+        self._source_size = source_size
+        self.setPixmap(thumbnail.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
 
     def mouseDoubleClickEvent(self, event):
         # Create a QDialog to show the image
@@ -2,7 +2,7 @@ import contextlib
 import os
 from typing import List, cast, Callable
 
-from PyQt5.QtCore import QItemSelectionModel, Qt, QDir, QFileInfo, QFile, QModelIndex
+from PyQt5.QtCore import QItemSelectionModel, Qt, QDir, QFileInfo, QFile, QModelIndex, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QApplication, QTreeView, QFileSystemModel, QAbstractItemView, QLabel
 
@@ -103,12 +103,15 @@ class FileSystemModel(QFileSystemModel):
 class MyTreeView(QTreeView):
     """A TreeView that allows to select multiple items at once."""
 
+    currentIndexChanged = pyqtSignal(QModelIndex)  # By mouse or keyboard
+
     def __init__(self, *args, **kwargs):
         super(MyTreeView, self).__init__(*args, **kwargs)
         self.media_player = None
         self.setFocusPolicy(Qt.FocusPolicy(Qt.StrongFocus))
         self.setSelectionMode(QAbstractItemView.SelectionMode(QTreeView.ExtendedSelection))
         self.audio_helper = AudioTagHelper()
+        self._folder_model = None  # The QFileSystemModel while search results are shown
 
     def set_media_player(self, mediaPlayer: MediaPlayerController ):
         self.media_player = mediaPlayer
@@ -143,6 +146,7 @@ class MyTreeView(QTreeView):
         self.setDefaultDropAction(Qt.DropAction(Qt.MoveAction))
 
     def set_dir_as(self, last_dir) -> None:
+        self._folder_model = None
         model = FileSystemModel()
         model.directoryLoaded.connect(self.resize_columns)
         self.__set_root_path_for_tree_view(model, last_dir)
@@ -151,6 +155,14 @@ class MyTreeView(QTreeView):
     def set_single_click_handler(self, single_click_fn) -> None:
         self.clicked.connect(lambda index: single_click_fn(index, self))
 
+    def set_current_changed_handler(self, current_changed_fn) -> None:
+        self.currentIndexChanged.connect(lambda index: current_changed_fn(index, self))
+
+    def currentChanged(self, current: QModelIndex, previous: QModelIndex) -> None:
+        super().currentChanged(current, previous)
+        if current.isValid():
+            self.currentIndexChanged.emit(current)
+
     def set_double_click_handler(self, double_click_fn, item=None) -> None:
         self.doubleClicked.connect(lambda index: double_click_fn(index, self, item))
 
@@ -159,6 +171,31 @@ class MyTreeView(QTreeView):
         self.setContextMenuPolicy(Qt.ContextMenuPolicy(Qt.CustomContextMenu))
         self.customContextMenuRequested.connect(lambda position: context_menu_fn(self, position))
 
+    @property
+    def is_showing_search_results(self) -> bool:
+        return self._folder_model is not None
+
+    def show_search_results(self, results_model) -> None:
+        """Shows the files found by a tag search in place of the folder; results_model answers filePath() like QFileSystemModel."""
+        if self._folder_model is None:
+            self._folder_model = self.model()
+        previous = self.model()
+        self.setModel(results_model)
+        self.setRootIndex(QModelIndex())
+        if previous is not self._folder_model:
+            previous.deleteLater()
+        self.resize_columns()
+
+    def clear_search(self) -> None:
+        """Shows the folder again after a tag search."""
+        if self._folder_model is None:
+            return
+        results_model, model = self.model(), self._folder_model
+        self._folder_model = None
+        self.setModel(model)
+        self.setRootIndex(model.index(model.rootPath()))
+        results_model.deleteLater()
+
     def resize_columns(self) -> None:
         """Resize the first column of the tree view to fit the longest filename. Returns: None"""
         logger.info("Resizing columns for tree view %s", self.objectName())
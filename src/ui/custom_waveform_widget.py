@@ -51,9 +51,10 @@ class WaveformWidget(QWidget):
         # Fallback: load from file as before
         self.load_waveform_from_file(file_path)
 
-    def load_waveform_from_db_or_file(self, file_id, file_path, db_path, num_samples=2500):
+    def load_waveform_from_db_or_file(self, file_id, file_path, db_path, num_samples=2500, duration=None):
         """
         Try to load waveform data from the DB. If not found, load from file and optionally cache to DB.
+        A known duration (seconds) saves analysing the file for it when the waveform is cached.
         """
         import json
         from db.db_reader import MusicCatalogDB_2
@@ -66,11 +67,12 @@ class WaveformWidget(QWidget):
                 waveform = json.loads(raw_waveform.decode("utf-8") if isinstance(raw_waveform, bytes) else raw_waveform)
                 logger.info(f"Loaded waveform from DB for file_id={file_id}")
                 self.set_waveform(waveform)
-                # Duration fallback: analyze file for duration only if needed
-                from file_operations.audio_waveform_analyzer import analyze_audio_file
+                if not duration:
+                    # Duration fallback: analyze file for duration only if needed
+                    from file_operations.audio_waveform_analyzer import analyze_audio_file
 
-                result = analyze_audio_file(file_path, num_samples=10)  # Fast, low-res for duration
-                duration = result.duration if result else 0.0
+                    result = analyze_audio_file(file_path, num_samples=10)  # Fast, low-res for duration
+                    duration = result.duration if result else 0.0
                 self.set_duration(duration)
                 self.set_progress(0.0)
                 self.track_path = file_path
@@ -1,18 +1,31 @@
 import os
+from dataclasses import replace
 from typing import Dict
 
+import numpy as np
 from PyQt5 import uic
 import configparser
 import os
 from PyQt5.QtCore import Qt, QDir, QModelIndex, QItemSelectionModel, QItemSelection
-from PyQt5.QtGui import QFont, QIcon, QStandardItem, QStandardItemModel
-from PyQt5.QtWidgets import QWidget, QSlider, QPushButton, QTreeView, QTableView, QLabel, QLineEdit, QCompleter, QMessageBox
+from PyQt5.QtGui import QFont, QIcon, QKeySequence, QStandardItem, QStandardItemModel
+from PyQt5.QtWidgets import QWidget, QSlider, QPushButton, QTreeView, QTableView, QLabel, QLineEdit, QCompleter, QMessageBox, QGridLayout, QApplication, QShortcut
 from qtpy import QtGui
 from PyQt5.QtWidgets import QMenu
 from db.db_reader import MusicCatalogDB_2, Track, Release, RecordLabel
+from db.catalogue_loader import CatalogueLoader
+from db.catalogue_snapshot import db_signature
+from db import catalog_query
+from db.catalog_query import SqlFacetIndex, TrackQuery
+from db.facet_index import combine_masks
+from file_operations.integrity_checker import MOVED, OK, IntegrityCheckWorker, load_file_status
+from file_operations.library_watcher import LibraryWatcher, library_roots
 from ui.custom_waveform_widget import WaveformWidget
 from ui.media_player import MediaPlayerController
 from ui.db_window_widget import CenterAlignDelegate, DatabaseWidget
+from ui.facet_panel import FacetPanel
+from ui.label_tree_model import LabelReleaseTreeModel
+from ui.paged_track_model import PagedTrackTableModel
+from ui.track_table_model import TrackTableModel
 from log_config import get_logger
 
 logger = get_logger(__name__)
@@ -36,6 +49,7 @@ class DatabaseMediaWindow(QWidget):
         "Year",
         "Country",
         "File Path",
+        "Status",
     ]
 
     TRACK_ATTRS = [
@@ -53,6 +67,7 @@ class DatabaseMediaWindow(QWidget):
         "year",
         "country",
         "file_location",
+        "file_status",
     ]
     COL_IDX = {name: i for i, name in enumerate(TRACK_TABLE_HEADERS)}
 
@@ -70,15 +85,18 @@ class DatabaseMediaWindow(QWidget):
 
         # Resolve DB path from config.ini if available, else fall back
         db_path = self.__resolve_db_path()
+        # Tracks are loaded in the background once the UI is set up, see __start_loading
         self.music_db2 = MusicCatalogDB_2(db_path)
-        if not self.music_db2.load():
-            logger.warning(f"DB Media Window: Failed to load database at: {db_path}. Viewer may be empty.")
-        # Log loaded track count clearly for this window
-        try:
-            self._tracks_loaded_count = len(self.music_db2.get_all_tracks())
-        except Exception:
-            self._tracks_loaded_count = 0
-        logger.info(f"DB Media Window: Tracks loaded: {self._tracks_loaded_count} (db: {db_path})")
+        # With config.ini [db] paged_track_view set, the views read the database a page/query at a time instead of
+        # loading the catalogue into memory
+        cfg = configparser.ConfigParser()
+        cfg.read("config.ini")
+        self._paged = cfg.getboolean("db", "paged_track_view", fallback=False)
+        self.loader = None
+        self.library_watcher = None
+        self.integrity_worker = None
+        self._load_signature = None  # Signature of the database when the background load started
+        self._tracks_loaded_count = 0
 
     def setup_ui(self):
         self.__setupLabelViewer()
@@ -86,10 +104,162 @@ class DatabaseMediaWindow(QWidget):
         self.__setup_media_player()
         self.__setup_search_bars()
         self.__setup_buttons()
+        self.__start_loading()
+        self.__start_library_watcher()
+        QShortcut(QKeySequence.Refresh, self, self.refresh_catalogue)
+
+    def __start_loading(self) -> None:
+        """
+        Streams the catalogue into the track viewer on a worker thread. The label tree and facets are built once loaded.
+        The paged track view loads nothing: it is set up straight away.
+        """
+        QApplication.instance().aboutToQuit.connect(self.on_about_to_quit)
+        if self._paged:
+            # Nothing to load: the label tree, facets and track viewer query the database
+            self.on_load_finished(True)
+            return
+
+        snapshot_loaded = self.music_db2.load_snapshot()
+        # Only writes to the database with config.ini [db] change_log set, otherwise refresh_catalogue reloads in full
+        self.music_db2.start_change_tracking()
+        if snapshot_loaded:
+            # Warm start: the catalogue is mapped from its snapshot, there is nothing to stream
+            self._load_signature = None
+            self.on_load_finished(True)
+            return
+
+        self._load_signature = db_signature(self.music_db2.db_path)
+        self.tree_view.setEnabled(False)
+        self.facet_panel.setEnabled(False)
+        self.track_viewer.setSortingEnabled(False)
+        self.lbl_info_db.setText("Loading tracks...")
+
+        self.loader = CatalogueLoader(self.music_db2.db_path, parent=self)
+        self.loader.batchLoaded.connect(self.on_tracks_batch_loaded)
+        self.loader.progressChanged.connect(self.on_load_progress)
+        self.loader.loadFinished.connect(self.on_load_finished)
+        self.loader.start()
+
+    def __start_library_watcher(self) -> None:
+        """Keeps the database in sync with the library folders of config.ini [library] roots, if any are set."""
+        roots = library_roots()
+        if not roots:
+            return
+        self.library_watcher = LibraryWatcher(self.music_db2.db_path, roots, parent=self)
+        self.library_watcher.libraryChanged.connect(self.on_library_changed)
+        self.library_watcher.start()
+
+    def on_library_changed(self, result) -> None:
+        """The library watcher has written changed files to the database: apply them to the catalogue."""
+        logger.info(f"DB Media Window: Library changed ({result.files} files read, {result.moved} moved, {result.deleted} deleted)")
+        self.refresh_catalogue()
+
+    def refresh_catalogue(self) -> None:
+        """Applies the database changes made since the catalogue was loaded, then rebuilds the label tree and facets."""
+        if self.loader is not None and self.loader.isRunning():
+            return
+        if self._paged:
+            # Nothing is cached: re-read the label tree, facets and track pages
+            self._label_release_query = {}
+            self.on_load_finished(True)
+            return
+        # Pruning writes to the database, so it is done before the signature of the rewritten snapshot is taken
+        self.music_db2.prune_change_log()
+        signature = db_signature(self.music_db2.db_path)
+        if not self.music_db2.refresh():
+            logger.info("DB Media Window: Catalogue is up to date")
+            return
+        self._load_signature = signature  # The snapshot is rewritten for the refreshed catalogue
+        # Track positions have changed, so the label/release mask is stale
+        self._label_release_mask = None
+        self._label_release_query = {}
+        self.track_model.refresh()
+        self.on_load_finished(True)
+
+    def on_about_to_quit(self) -> None:
+        """Stops a running load and keeps the sort permutations computed this session in the catalogue snapshot."""
+        self.stop_loading()
+        self.track_model.close()
+        if not self._paged:
+            self.music_db2.save_snapshot_permutations()
+
+    def stop_loading(self) -> None:
+        """Stops the background load, the library watcher and a running integrity check."""
+        if self.loader is not None and self.loader.isRunning():
+            self.loader.requestInterruption()
+            self.loader.wait()
+        if self.integrity_worker is not None and self.integrity_worker.isRunning():
+            self.integrity_worker.requestInterruption()
+            self.integrity_worker.wait()
+        if self.library_watcher is not None:
+            self.library_watcher.stop()
+
+    def on_tracks_batch_loaded(self, tracks) -> None:
+        """Adds a batch of loaded tracks to the catalogue and shows them in the track viewer."""
+        self.music_db2.add_tracks(tracks)
+        if self.search_bar_tracks.text().strip():
+            self.__apply_track_filters()
+        else:
+            self.track_model.tracks_appended()
+
+    def on_load_progress(self, loaded: int, total: int) -> None:
+        self.lbl_info_db.setText(f"Loading {loaded} / {total} tracks")
+
+    def on_load_finished(self, success: bool) -> None:
+        """Builds the label tree and facet filters over the loaded catalogue."""
+        self._tracks_loaded_count = self.music_db2.count_matching_tracks(TrackQuery()) if self._paged else len(self.music_db2.get_all_tracks())
+        logger.info(f"DB Media Window: Tracks loaded: {self._tracks_loaded_count} (db: {self.music_db2.db_path})")
+        if not success:
+            logger.warning(f"DB Media Window: Failed to load database at: {self.music_db2.db_path}. Viewer may be incomplete.")
+
+        self.populate_label_viewer()
+        self.filter_label_viewer(self.search_bar_labels.text())
+        self.__setup_facet_panel()
+        self.tree_view.setEnabled(True)
+        self.track_viewer.setSortingEnabled(True)
+        for col in ["Album Title", "Track Artist", "Track Title", "Format", "Disc No", "Track No", "Year", "Country", "File Path"]:
+            self.track_viewer.resizeColumnToContents(self.COL_IDX[col])
+        self.__apply_track_filters()
+        self.__load_file_status()
+        self.lbl_info_db.setText(f"{self._tracks_loaded_count} tracks")
+        if success and self._load_signature is not None and self._tracks_loaded_count:
+            self.music_db2.save_snapshot(self._load_signature)
+
         # Inform user if no tracks were found
-        if getattr(self, "_tracks_loaded_count", 0) == 0:
+        if self._tracks_loaded_count == 0:
             QMessageBox.information(self, "No Tracks", "DB Media Window: No tracks found in the database.\nPlease check your config.ini [db] path.")
 
+    def __load_file_status(self) -> None:
+        """Shows the file status recorded by the last integrity check."""
+        try:
+            self.track_model.set_file_status(load_file_status(self.music_db2.connection))
+        except Exception as e:
+            logger.warning(f"DB Media Window: Could not read file status: {e}")
+
+    def verify_files(self) -> None:
+        """Checks on a worker thread that the catalogue's files are still where the database says."""
+        if self.integrity_worker is not None and self.integrity_worker.isRunning():
+            return
+        files = catalog_query.track_files(self.music_db2.connection) if self._paged else self.music_db2.get_track_files()
+        self.lbl_info_db.setText(f"Verifying {len(files)} files...")
+        self.integrity_worker = IntegrityCheckWorker(self.music_db2.db_path, files, self)
+        self.integrity_worker.progressChanged.connect(self.on_verify_progress)
+        self.integrity_worker.checkFinished.connect(self.on_verify_finished)
+        self.integrity_worker.finished.connect(self.integrity_worker.deleteLater)
+        self.integrity_worker.start()
+
+    def on_verify_progress(self, listed: int, total: int) -> None:
+        self.lbl_info_db.setText(f"Verifying files: {listed} / {total} folders")
+
+    def on_verify_finished(self, statuses) -> None:
+        self.integrity_worker = None
+        if not statuses:
+            self.lbl_info_db.setText(f"{self._tracks_loaded_count} tracks")
+            return
+        self.track_model.set_file_status(statuses)
+        problems = sum(1 for status in statuses.values() if status.status != OK)
+        self.lbl_info_db.setText(f"{len(statuses)} files verified, {problems} missing, moved or changed")
+
     def __resolve_db_path(self) -> str:
         """Resolve the database path using config.ini [db] section, with sensible fallbacks."""
         candidates = []
@@ -119,18 +289,34 @@ class DatabaseMediaWindow(QWidget):
 
     def __setupLabelViewer(self):
         self.tree_view = self.findChild(QTreeView, "view_db_labels_releases")
-        self.populate_label_viewer()
-        self._current_label_release_tracks = None  # Tracks filtered by label/release
+        self._label_release_mask = None  # Tracks filtered by label/release
+        self._label_release_query = {}  # The same filter as TrackQuery fields, for the paged track model
+        if not self._paged:
+            # Empty until the catalogue is loaded. The paged view builds them from the database in on_load_finished
+            self.populate_label_viewer()
+            self.__setup_facet_panel()
         # Enable custom context menu
         self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree_view.customContextMenuRequested.connect(self.on_labels_tree_context_menu)
 
+    def __setup_facet_panel(self) -> None:
+        """Adds the genre/style/year/country/format facet filters under the label viewer."""
+        layout = self.findChild(QGridLayout, "gridLayout_20")
+        if getattr(self, "facet_panel", None) is not None:
+            # Rebuilt over the newly loaded tracks
+            layout.removeWidget(self.facet_panel)
+            self.facet_panel.deleteLater()
+        self.facet_panel = FacetPanel(SqlFacetIndex(self.music_db2.connection) if self._paged else self.music_db2.get_facet_index(), self)
+        self.facet_panel.setObjectName("facet_panel")
+        self.facet_panel.facets_changed.connect(self.__apply_track_filters)
+        layout.addWidget(self.facet_panel, 3, 0, 1, 9)
+
     def __setupTrackViewer(self):
         """Sets up the track viewer with a table view."""
         self.track_viewer = self.findChild(QTableView, "track_viewer")
         self.track_viewer.doubleClicked.connect(self.on_track_viewer_double_clicked)
         DatabaseWidget._setup_data_view(self.track_viewer, DatabaseWidget.on_row_clicked)
-        self.__populate_view_db_tracks(None)
+        self.__setup_track_model()
         self.track_viewer.setContextMenuPolicy(Qt.CustomContextMenu)
         self.track_viewer.customContextMenuRequested.connect(self.on_track_viewer_context_menu)
 
@@ -152,16 +338,18 @@ class DatabaseMediaWindow(QWidget):
         model = self.track_viewer.model()
         file_path_index = model.index(row, self.COL_IDX["File Path"])
         file_path = file_path_index.data()
-        file_id_index = model.index(row, self.COL_IDX["No"])
-        file_id = file_id_index.data()
+        track = model.track_at(row)
+        if track is None:
+            # The paged model has no track past the end of a database that shrank since it was counted
+            logger.debug(f"No track at row {row} for context menu.")
+            return
+        file_id = track.file_id
         logger.debug(f"Context menu for row: {row}, file_id: {file_id}, file_path: {file_path}")
-        try:
-            file_id = int(file_id)
-        except Exception:
-            file_id = None
         menu = QMenu(self.track_viewer)
         analyse_action = menu.addAction("Analyse")
         play_action = menu.addAction("Play")
+        menu.addSeparator()
+        verify_action = menu.addAction("Verify Files")
         action = menu.exec_(self.track_viewer.viewport().mapToGlobal(pos))
         logger.debug(f"Context menu action selected: {action.text() if action else None}")
         if action == analyse_action:
@@ -170,6 +358,8 @@ class DatabaseMediaWindow(QWidget):
         elif action == play_action:
             logger.info(f"Play action triggered from context menu for file_id={file_id}, file_path={file_path}")
             self.play_single_track(file_path, file_id)
+        elif action == verify_action:
+            self.verify_files()
 
     def _analyze_and_store_waveform(self, file_id, file_path, db_writer, show_messages=True):
         """
@@ -258,7 +448,11 @@ class DatabaseMediaWindow(QWidget):
 
         # Determine which tracks to analyze
         selected_indexes = self.tree_view.selectionModel().selectedIndexes()
-        if not selected_indexes:
+        if self._paged:
+            # The catalogue is not in memory: read the tracks of the selected label/release, or all tracks
+            tracks = self.music_db2.query_tracks(TrackQuery(**self._label_release_query))
+            logger.info(f"Analyzing tracks matching: {self._label_release_query or 'all tracks'}")
+        elif not selected_indexes:
             tracks = self.music_db2.get_all_tracks()
             logger.info("No label/release selected: analyzing all tracks.")
         else:
@@ -266,14 +460,13 @@ class DatabaseMediaWindow(QWidget):
             index = selected_indexes[0]
             parent = index.parent()
             if not parent.isValid():
-                label_name = index.data()
+                label_name = index.data(Qt.UserRole)
                 tracks = [track for track in self.music_db2.get_all_tracks() if str(track.label) == str(label_name)]
                 logger.info(f"Analyzing tracks for label: {label_name}")
             else:
-                release_text = index.data()
-                catalog_number = release_text.split(" - ")[0]
-                tracks = [track for track in self.music_db2.get_all_tracks() if str(track.catalog_number) == str(catalog_number)]
-                logger.info(f"Analyzing tracks for release: {release_text}")
+                release_id = index.data(Qt.UserRole)
+                tracks = [track for track in self.music_db2.get_all_tracks() if track.discogs_id == release_id]
+                logger.info(f"Analyzing tracks for release: {index.data()} (Discogs ID: {release_id})")
 
         total_tracks = len(tracks)
         if total_tracks == 0:
@@ -345,6 +538,7 @@ class DatabaseMediaWindow(QWidget):
             self.butt_exp_releases.setIcon(self.icon_expand)
             self._tree_expanded = False
         else:
+            self.label_model.fetch_all()
             self.tree_view.expandAll()
             self.butt_exp_releases.setIcon(self.icon_collapse)
             self._tree_expanded = True
@@ -361,110 +555,64 @@ class DatabaseMediaWindow(QWidget):
         Respects the current label/release filter if present.
         Shows only tracks that match the search term in any column (case-insensitive, substring match).
         """
-        text = text.strip().lower()
-        base_tracks = self._current_label_release_tracks if self._current_label_release_tracks is not None else self.music_db2.get_all_tracks()
-        if not text:
-            self.__populate_view_db_tracks(base_tracks)
-            return
-        filtered_tracks = []
-        for track in base_tracks:
-            for attr in self.TRACK_ATTRS:
-                value = str(getattr(track, attr, "")).lower()
-                if text in value:
-                    filtered_tracks.append(track)
-                    break
-        self.__populate_view_db_tracks(filtered_tracks)
+        self.__apply_track_filters()
 
     def filter_label_viewer(self, text):
         """
         Filters the label viewer tree based on the search text.
         Shows only labels/releases that match the search term (case-insensitive, substring match).
+        Rows are hidden in the view, the model is not rebuilt.
         """
-        label_cache = self.music_db2.get_labels_and_releases()
-        text = text.strip().lower()
-
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(["Labels & Releases"])
-
-        for label_name, release_ids in label_cache.items():
-            label_match = text in label_name.lower()
-            # Build list of matching releases
-            matching_releases = []
-            for release_id in release_ids:
-                release = self.music_db2.get_release_by_id(release_id)
-                if release:
-                    release_text = f"{release.catalog_number} - {release.title}"
-                    if text in release_text.lower():
-                        matching_releases.append((release, release_text))
-            # If label matches or any release matches, show
-            if label_match or matching_releases:
-                label_item = QStandardItem(self.folder_icon, label_name)
-                label_item.setEditable(False)
-                for release, release_text in matching_releases:
-                    release_item = QStandardItem(self.media_icon, release_text)
-                    release_item.setEditable(False)
-                    label_item.appendRow(release_item)
-                # If label matches but no releases match, show all releases
-                if label_match and not matching_releases:
-                    for release_id in release_ids:
-                        release = self.music_db2.get_release_by_id(release_id)
-                        if release:
-                            release_text = f"{release.catalog_number} - {release.title}"
-                            release_item = QStandardItem(self.media_icon, release_text)
-                            release_item.setEditable(False)
-                            label_item.appendRow(release_item)
-                model.appendRow(label_item)
-
-        self.tree_view.setModel(model)
-        self.tree_view.setHeaderHidden(False)
-        # Disconnect previous signal connections to avoid duplicates
-        try:
-            self.tree_view.pressed.disconnect()
-        except Exception:
-            pass
-        try:
-            self.tree_view.selectionModel().selectionChanged.disconnect()
-        except Exception:
-            pass
-        self.tree_view.pressed.connect(lambda index: self.on_row_pressed(self.tree_view, index))
-        self.tree_view.selectionModel().selectionChanged.connect(self.on_label_selected)
+        self.label_model.set_filter(text)
+        self.__apply_label_filter()
+
+    def __apply_label_filter(self) -> None:
+        """Hides/shows the label rows, and any fetched release rows, to match the current filter of the label model."""
+        root = QModelIndex()
+        for row in range(self.label_model.rowCount(root)):
+            hidden = self.label_model.is_label_hidden(row)
+            if self.tree_view.isRowHidden(row, root) != hidden:
+                self.tree_view.setRowHidden(row, root, hidden)
+            if not hidden:
+                self.__apply_release_filter(self.label_model.index(row, 0))
+
+    def __apply_release_filter(self, label_index: QModelIndex) -> None:
+        """Hides/shows the fetched release rows of a single label."""
+        label_row = label_index.row()
+        for row in range(self.label_model.rowCount(label_index)):
+            hidden = self.label_model.is_release_hidden(label_row, row)
+            if self.tree_view.isRowHidden(row, label_index) != hidden:
+                self.tree_view.setRowHidden(row, label_index, hidden)
+
+    def on_label_rows_fetched(self, parent: QModelIndex, first: int, last: int) -> None:
+        """Applies the current filter to release rows as they are lazily fetched."""
+        if parent.isValid():
+            self.__apply_release_filter(parent)
 
     def populate_label_viewer(self):
-        """Populates the label viewer with labels and their associated releases."""
-
-        label_cache = self.music_db2.get_labels_and_releases()
-
-        # Set up the model
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(["Labels & Releases"])
-
-        # For each label, add as a parent item with folder icon
-
-        for label_name, release_ids in label_cache.items():
-            label_item = QStandardItem(self.folder_icon, label_name)
-            label_item.setEditable(False)
-            # For each release under this label, add as child
-            for release_id in release_ids:
-                release = self.music_db2.get_release_by_id(release_id)
-                if release:
-                    # Show media_icon, catalog_number, and title
-                    release_text = f"{release.catalog_number} - {release.title}"
-                    release_item = QStandardItem(self.media_icon, release_text)
-                    release_item.setEditable(False)
-                    label_item.appendRow(release_item)
-            model.appendRow(label_item)
-
-        self.tree_view.setModel(model)
+        """Populates the label viewer with labels. Releases are fetched lazily when a label is expanded."""
+
+        old_model = getattr(self, "label_model", None)
+        old_selection_model = self.tree_view.selectionModel()
+        if self._paged:
+            labels_and_releases, releases = catalog_query.labels_and_releases(self.music_db2.connection)
+            get_release = releases.get
+        else:
+            labels_and_releases, get_release = self.music_db2.get_labels_and_releases(), self.music_db2.get_release_by_id
+        self.label_model = LabelReleaseTreeModel(labels_and_releases, get_release, self.folder_icon, self.media_icon, self)
+        self.label_model.rowsInserted.connect(self.on_label_rows_fetched)
+
+        self.tree_view.setModel(self.label_model)
+        if old_model is not None:
+            old_model.deleteLater()
+        if old_selection_model is not None:
+            old_selection_model.deleteLater()
         self.tree_view.setHeaderHidden(False)
         # Disconnect previous signal connections to avoid duplicates
         try:
             self.tree_view.pressed.disconnect()
         except Exception:
             pass
-        try:
-            self.tree_view.selectionModel().selectionChanged.disconnect()
-        except Exception:
-            pass
         self.tree_view.pressed.connect(lambda index: self.on_row_pressed(self.tree_view, index))
         self.tree_view.selectionModel().selectionChanged.connect(self.on_label_selected)
 
@@ -480,48 +628,25 @@ class DatabaseMediaWindow(QWidget):
         self.lbl_cover_db = self.findChild(QLabel, "lbl_cover_db")
         db_path = self.music_db2.db_path if hasattr(self, "music_db2") else None
         self.player = MediaPlayerController(
-            self, self.slider_db, self.wdgt_wave_db, self.butt_play_db, self.butt_stop_db, self.lbl_current_db, self.lbl_duration_db, self.lbl_info_db, self.lbl_cover_db, db_path
+            self, self.slider_db, self.wdgt_wave_db, self.butt_play_db, self.butt_stop_db, self.lbl_current_db, self.lbl_duration_db, self.lbl_info_db, self.lbl_cover_db, db_path,
+            getattr(self, "music_db2", None),
         )
 
-    def __populate_view_db_tracks(self, filtered_tracks=None):
-        logger.info("DB Media Window: Populating track viewer with filtered tracks" if filtered_tracks else "DB Media Window: Populating track viewer with all tracks")
-        model = QStandardItemModel()
-        model.setHorizontalHeaderLabels(self.TRACK_TABLE_HEADERS)
-
-        tracks = filtered_tracks if filtered_tracks is not None else self.music_db2.get_all_tracks()
-        try:
-            logger.info(f"DB Media Window: Rendering {len(tracks)} tracks in table")
-        except Exception:
-            pass
+    def __setup_track_model(self) -> None:
+        """
+        Sets up the track viewer model. Filtering and sorting are applied to the model, it is never rebuilt.
+        With config.ini [db] paged_track_view set, the viewer reads its rows from the database a page at a time
+        instead of from the in-memory catalogue.
+        """
+        if self._paged:
+            self.track_model = PagedTrackTableModel(self.music_db2.db_path, self.TRACK_TABLE_HEADERS, self.TRACK_ATTRS, parent=self)
+        else:
+            self.track_model = TrackTableModel(self.music_db2, self.TRACK_TABLE_HEADERS, self.TRACK_ATTRS, self)
+        self.track_viewer.setModel(self.track_model)
+        logger.info(f"DB Media Window: Rendering {self.track_model.rowCount()} tracks in table")
 
-        for row_index, track in enumerate(tracks, start=1):
-            items = []
-            for attr in self.TRACK_ATTRS:
-                if attr == "discogs_id":
-                    # Display as plain text but styled as a hyperlink
-                    discogs_id = str(getattr(track, attr, ""))
-                    item = QStandardItem(discogs_id)
-                    item.setData(track.discogs_url, Qt.UserRole)
-                    # Style as hyperlink: blue and underlined
-                    font = item.font()
-                    font.setUnderline(True)
-                    item.setFont(font)
-                    item.setForeground(QtGui.QBrush(QtGui.QColor(0, 102, 204)))
-                    item.setEditable(False)
-                    items.append(item)
-                else:
-                    if attr == "file_id":
-                        item = QStandardItem(str(row_index))
-                    else:
-                        item = QStandardItem(str(getattr(track, attr, "")))
-                    item.setEditable(False)
-                    items.append(item)
-            model.appendRow(items)
-
-        self.track_viewer.setModel(model)
-        # Hide the first and last columns (Track ID and No)
+        # Hide the first column (Track ID)
         self.track_viewer.setColumnHidden(self.COL_IDX["Track ID"], True)
-        # self.track_viewer.setColumnHidden(self.COL_IDX["No"], True)
 
         # Use constants for column indexes
         for col in ["Catalog No", "Discogs ID", "Format", "Disc No", "Track No"]:
@@ -530,7 +655,47 @@ class DatabaseMediaWindow(QWidget):
         for col in ["Album Title", "Track Artist", "Track Title", "Format", "Disc No", "Track No", "Year", "Country", "File Path"]:
             self.track_viewer.resizeColumnToContents(self.COL_IDX[col])
 
-        # No need for rich text rendering; hyperlink is styled with font/brush
+        # Start in load order, header clicks then sort via the catalogue's cached permutations
+        self.track_viewer.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.track_viewer.setSortingEnabled(True)
+
+    def __apply_track_filters(self) -> None:
+        """Applies the label/release selection, the track search text and the facet selection to the track viewer."""
+        text = self.search_bar_tracks.text().strip().lower() if hasattr(self, "search_bar_tracks") else ""
+        if self._paged:
+            # The filters are pushed into the SQL of the paged track model, keeping its sort, and the facet counts
+            # are counted in SQL
+            query = TrackQuery(**self._label_release_query, text=text)
+            facets = {}
+            if hasattr(self, "facet_panel"):
+                self.facet_panel.update_counts(query)
+                facets = self.facet_panel.facet_index.selection()
+            current = self.track_model.query
+            self.track_model.set_query(replace(query, facets=facets, order_by=current.order_by, descending=current.descending))
+            logger.info("DB Media Window: Showing filtered tracks" if query.where()[0] or facets else "DB Media Window: Showing all tracks")
+            return
+
+        mask = self._label_release_mask
+        if text:
+            tracks = self.music_db2.get_all_tracks()
+            text_mask = np.zeros(len(tracks), dtype=bool)
+            for position, track in enumerate(tracks):
+                if mask is not None and not mask[position]:
+                    continue
+                text_mask[position] = any(text in str(getattr(track, attr, "")).lower() for attr in self.TRACK_ATTRS)
+            mask = text_mask
+
+        # Facet counts reflect the label/search filter, the track view additionally applies the facet selection
+        if hasattr(self, "facet_panel"):
+            self.facet_panel.update_counts(mask)
+            mask = combine_masks(mask, self.facet_panel.mask())
+        self.track_model.set_mask(mask)
+        logger.info("DB Media Window: Showing filtered tracks" if mask is not None else "DB Media Window: Showing all tracks")
+
+    def __mask_tracks(self, predicate) -> np.ndarray:
+        """Returns a boolean mask over all tracks, True where the predicate holds."""
+        tracks = self.music_db2.get_all_tracks()
+        return np.fromiter((predicate(track) for track in tracks), dtype=bool, count=len(tracks))
 
     def __center_align_delegate(self, index: int) -> None:
         """
@@ -565,29 +730,30 @@ class DatabaseMediaWindow(QWidget):
         # Get the selected index
         indexes = selected.indexes()
         if not indexes:
-            self._current_label_release_tracks = None
-            self.__populate_view_db_tracks(filtered_tracks=None)
+            self._label_release_mask = None
+            self._label_release_query = {}
+            self.__apply_track_filters()
             return
 
         index = indexes[0]
         parent = index.parent()
 
         if not parent.isValid():
-            # Top-level: label
-            label_name = index.data()
+            # Top-level: label, the model holds the label name as its key
+            label_name = index.data(Qt.UserRole)
             logger.info(f"Label selected: {label_name}")
-            filtered_tracks = [track for track in self.music_db2.get_all_tracks() if str(track.label) == str(label_name)]
-            self._current_label_release_tracks = filtered_tracks
-            self.__populate_view_db_tracks(filtered_tracks)
+            self._label_release_query = {"label": label_name}
+            if not self._paged:
+                self._label_release_mask = self.__mask_tracks(lambda track: str(track.label) == str(label_name))
+            self.__apply_track_filters()
         else:
-            # Child: release
-            release_text = index.data()
-            # Extract catalog number from release_text (format: "CATNO - Title")
-            catalog_number = release_text.split(" - ")[0]
-            logger.info(f"Release selected: {release_text} (Catalog: {catalog_number})")
-            filtered_tracks = [track for track in self.music_db2.get_all_tracks() if str(track.catalog_number) == str(catalog_number)]
-            self._current_label_release_tracks = filtered_tracks
-            self.__populate_view_db_tracks(filtered_tracks)
+            # Child: release, the model holds its Discogs id as its key
+            release_id = index.data(Qt.UserRole)
+            logger.info(f"Release selected: {index.data()} (Discogs ID: {release_id})")
+            self._label_release_query = {"discogs_id": release_id}
+            if not self._paged:
+                self._label_release_mask = self.__mask_tracks(lambda track: track.discogs_id == release_id)
+            self.__apply_track_filters()
 
     def on_track_viewer_double_clicked(self, index: QModelIndex) -> None:
         """Handles the table view double click event. Returns: None"""
@@ -598,8 +764,7 @@ class DatabaseMediaWindow(QWidget):
 
         # If double-clicked on Discogs ID column, open the URL
         if col == self.COL_IDX["Discogs ID"]:
-            item = model.item(row, col)
-            url = item.data(Qt.UserRole)
+            url = index.data(Qt.UserRole)
             logger.debug(f"Double click on Discogs ID: url={url}")
             if url and isinstance(url, str) and url.strip():
                 import webbrowser
@@ -615,21 +780,24 @@ class DatabaseMediaWindow(QWidget):
         file_path_index = model.index(row, self.COL_IDX["File Path"])
         file_path = file_path_index.data()
 
-        file_id_index = model.index(row, self.COL_IDX["No"])
-        file_id = file_id_index.data()
+        track = model.track_at(row)
+        if track is None:
+            logger.debug(f"Double click: no track at row {row}")
+            return
+        file_id = track.file_id
         logger.debug(f"Double click: row={row}, file_id={file_id}, file_path={file_path}")
-        try:
-            file_id = int(file_id)
-        except Exception:
-            file_id = None
 
         # Get track title for info bar
         track_title_index = model.index(row, self.COL_IDX["Track Title"])
         track_title = track_title_index.data() if track_title_index.isValid() else ""
 
         if not file_path or not os.path.isfile(file_path):
-            logger.warning(f"File does not exist: {file_path}")
-            return
+            status = model.file_status.get(file_id)
+            if status is None or status.status != MOVED or not os.path.isfile(status.moved_to):
+                logger.warning(f"File does not exist: {file_path}")
+                return
+            # The last integrity check found the file in another folder
+            file_path = status.moved_to
 
         if self.player:
             logger.info(f"Loading file in media player: {file_path}")
@@ -646,6 +814,8 @@ class DatabaseMediaWindow(QWidget):
         """
         Ensure all timers, media players, and widgets are properly cleaned up on close to avoid QBasicTimer warnings.
         """
+        self.stop_loading()
+        self.track_model.close()
         # Stop and close the media player if it exists
         if hasattr(self, "player") and self.player:
             try:
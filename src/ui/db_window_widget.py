@@ -16,7 +16,9 @@ from PyQt5.QtWidgets import (
     QTableView,
     QStyledItemDelegate,
     QAbstractItemView,
+    QApplication,
 )
+from db.catalogue_loader import DatabaseLoadWorker
 from db.music_db import MusicCatalogDB
 from log_config import get_logger
 from ui.custom_line_edit import MyLineEdit
@@ -40,16 +42,9 @@ class DatabaseWidget(QWidget):
         self.media_icon = QIcon(":/media/icons/media/Oxygen-Icons.org-Oxygen-Actions-media-record.256.png")
 
         db_path = self.__resolve_db_path()
+        # Loaded on a worker thread by setup_ui, the views are populated once it has finished
         self.music_db = MusicCatalogDB(db_path)
-        if not self.music_db.load():
-            logger.warning(f"DB Window: Failed to load database at: {db_path}. Views may be empty.")
-        try:
-            track_count = self.music_db.count_tracks()
-            release_count = self.music_db.count_releases()
-        except Exception:
-            track_count = 0
-            release_count = 0
-        logger.info(f"DB Window: Tracks loaded: {track_count}, Releases loaded: {release_count} (db: {db_path})")
+        self.load_worker = None
 
     def setup_ui(self, path: str):
         """Set up the UI components for the database widget."""
@@ -64,10 +59,23 @@ class DatabaseWidget(QWidget):
 
         self.__set_chevron_icon()
         self.__setup_data_views()
+
+        self.load_worker = DatabaseLoadWorker(self.music_db, self)
+        self.load_worker.loaded.connect(self.on_database_loaded)
+        self.load_worker.start()
+        QApplication.instance().aboutToQuit.connect(self.load_worker.wait)
+
+    def on_database_loaded(self, success: bool) -> None:
+        """Populates the label, release and track views once the database has been loaded in the background."""
+        if not success:
+            logger.warning(f"DB Window: Failed to load database at: {self.music_db.db_path}. Views may be empty.")
+        track_count = self.music_db.count_tracks()
+        logger.info(f"DB Window: Tracks loaded: {track_count}, Releases loaded: {self.music_db.count_releases()} (db: {self.music_db.db_path})")
+
         self.__populate_view_db_labels()
         self.__populate_view_db_releases()
         self.__populate_view_db_tracks()
-        if self.music_db and self.music_db.count_tracks() == 0:
+        if track_count == 0:
             QMessageBox.information(self, "No Tracks", "DB Window: No tracks found in the database.\nPlease check your config.ini [db] path.")
 
     def __setup_line_edit(self, path: str) -> None:
@@ -0,0 +1,82 @@
+from typing import Dict, Optional, Union
+
+import numpy as np
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import QListWidget, QListWidgetItem, QTabWidget
+
+from db.catalog_query import SqlFacetIndex, TrackQuery
+from db.facet_index import FACETS, FacetIndex
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class FacetPanel(QTabWidget):
+    """
+    One tab per facet (genre, style, year, country, format), each a list of checkable values with live track counts.
+    Checking a value updates the selection of the FacetIndex (a SqlFacetIndex in the paged track view) and emits
+    facets_changed.
+    """
+
+    facets_changed = pyqtSignal()
+
+    def __init__(self, facet_index: Union[FacetIndex, SqlFacetIndex], parent=None) -> None:
+        super().__init__(parent)
+        self.facet_index = facet_index
+        self._lists: Dict[str, QListWidget] = {}
+        self._items: Dict[str, Dict[str, QListWidgetItem]] = {}
+
+        for facet in FACETS:
+            list_widget = QListWidget(self)
+            list_widget.setObjectName(f"list_facet_{facet}")
+            items = {}
+            for value in facet_index.values(facet):
+                item = QListWidgetItem(value, list_widget)
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Unchecked)
+                item.setData(Qt.UserRole, value)
+                items[value] = item
+            list_widget.itemChanged.connect(lambda item, facet=facet: self.on_item_changed(facet, item))
+            self._lists[facet] = list_widget
+            self._items[facet] = items
+            self.addTab(list_widget, facet.capitalize())
+
+        self.update_counts()
+
+    def on_item_changed(self, facet: str, item: QListWidgetItem) -> None:
+        value = item.data(Qt.UserRole)
+        checked = item.checkState() == Qt.Checked
+        self.facet_index.select(facet, value, checked)
+        logger.info(f"Facet {facet}: {'selected' if checked else 'deselected'} '{value}'")
+        self.facets_changed.emit()
+
+    def mask(self) -> Optional[np.ndarray]:
+        """Returns the mask of the current facet selection, or None if no facet value is checked."""
+        return self.facet_index.mask()
+
+    def clear(self) -> None:
+        """Unchecks every facet value."""
+        self.facet_index.clear()
+        for facet, items in self._items.items():
+            self._lists[facet].blockSignals(True)
+            for item in items.values():
+                item.setCheckState(Qt.Unchecked)
+            self._lists[facet].blockSignals(False)
+        self.facets_changed.emit()
+
+    def update_counts(self, base: Union[np.ndarray, TrackQuery, None] = None) -> None:
+        """
+        Updates the counts shown next to each value, given the other facets and the label/search filter: a mask over
+        the catalogue tracks for a FacetIndex, a TrackQuery for a SqlFacetIndex. Values with no tracks are hidden
+        unless they are checked.
+        """
+        for facet, items in self._items.items():
+            counts = self.facet_index.counts(facet, base)
+            selected = self.facet_index.selected(facet)
+            list_widget = self._lists[facet]
+            list_widget.blockSignals(True)
+            for value, item in items.items():
+                count = counts.get(value, 0)
+                item.setText(f"{value} ({count})")
+                item.setHidden(count == 0 and value not in selected)
+            list_widget.blockSignals(False)
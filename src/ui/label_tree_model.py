@@ -0,0 +1,176 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+from PyQt5.QtGui import QIcon
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# internalId used for top level (label) rows. Release rows store the row of their label + 1.
+_LABEL_NODE = 0
+
+
+class LabelReleaseTreeModel(QAbstractItemModel):
+    """
+    Lazy two level model for the Labels & Releases viewer.
+
+    Labels are the top level rows. The release rows of a label are only materialised (via canFetchMore/fetchMore)
+    when the label is expanded. Release display strings are built once when the model is created, and filtering only
+    marks rows as hidden - the view is responsible for hiding them, the tree is never rebuilt.
+    """
+
+    HEADER = "Labels & Releases"
+
+    def __init__(self, labels_and_releases: Dict[str, set], get_release: Callable, folder_icon: QIcon, media_icon: QIcon, parent=None) -> None:
+        super().__init__(parent)
+        self.folder_icon = folder_icon
+        self.media_icon = media_icon
+
+        self._labels: List[str] = []
+        self._labels_lower: List[str] = []
+        self._releases: List[List[Tuple[int, str]]] = []
+        self._releases_lower: List[List[str]] = []
+        self._fetched: List[int] = []
+
+        for label_name, release_ids in labels_and_releases.items():
+            releases = []
+            for release_id in release_ids:
+                release = get_release(release_id)
+                if release:
+                    releases.append((release_id, str(release)))
+            releases.sort(key=lambda r: r[1].lower())
+
+            self._labels.append(label_name)
+            self._labels_lower.append(label_name.lower())
+            self._releases.append(releases)
+            self._releases_lower.append([text.lower() for _, text in releases])
+            self._fetched.append(0)
+
+        self._filter_text = ""
+        self._hidden_labels: Set[int] = set()
+        self._hidden_releases: Dict[int, Set[int]] = {}
+
+    # QAbstractItemModel interface
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if column != 0 or row < 0:
+            return QModelIndex()
+
+        if not parent.isValid():
+            if row >= len(self._labels):
+                return QModelIndex()
+            return self.createIndex(row, column, _LABEL_NODE)
+
+        if parent.internalId() != _LABEL_NODE or row >= self._fetched[parent.row()]:
+            return QModelIndex()
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not index.isValid() or index.internalId() == _LABEL_NODE:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, _LABEL_NODE)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._labels)
+        if parent.internalId() == _LABEL_NODE:
+            return self._fetched[parent.row()]
+        return 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if not parent.isValid():
+            return bool(self._labels)
+        if parent.internalId() == _LABEL_NODE:
+            return bool(self._releases[parent.row()])
+        return False
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if not parent.isValid() or parent.internalId() != _LABEL_NODE:
+            return False
+        row = parent.row()
+        return self._fetched[row] < len(self._releases[row])
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        if not self.canFetchMore(parent):
+            return
+        row = parent.row()
+        first, last = self._fetched[row], len(self._releases[row]) - 1
+        self.beginInsertRows(parent, first, last)
+        self._fetched[row] = last + 1
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if index.internalId() == _LABEL_NODE:
+            if role == Qt.DisplayRole:
+                return self._labels[index.row()]
+            if role == Qt.DecorationRole:
+                return self.folder_icon
+            if role == Qt.UserRole:
+                return self._labels[index.row()]
+            return None
+
+        release_id, text = self._releases[index.internalId() - 1][index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.DecorationRole:
+            return self.media_icon
+        if role == Qt.UserRole:
+            return release_id
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return self.HEADER
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    # Lazy loading helpers
+    def fetch_all(self) -> None:
+        """Materialise the releases of every label, e.g. before an expand all."""
+        for row in range(len(self._labels)):
+            self.fetchMore(self.index(row, 0))
+
+    # Filtering
+    def set_filter(self, text: str) -> None:
+        """
+        Work out which rows should be hidden for the given search text (case-insensitive, substring match).
+        A label is shown if its name or any of its releases match. If only the label matches, all its releases are shown.
+        """
+        text = text.strip().lower()
+        self._filter_text = text
+        self._hidden_labels = set()
+        self._hidden_releases = {}
+        if not text:
+            return
+
+        for row, label_lower in enumerate(self._labels_lower):
+            hidden_releases = {i for i, release_lower in enumerate(self._releases_lower[row]) if text not in release_lower}
+            any_release_match = len(hidden_releases) < len(self._releases_lower[row])
+
+            if any_release_match:
+                self._hidden_releases[row] = hidden_releases
+            elif text not in label_lower:
+                self._hidden_labels.add(row)
+
+    def is_label_hidden(self, row: int) -> bool:
+        return row in self._hidden_labels
+
+    def is_release_hidden(self, label_row: int, release_row: int) -> bool:
+        return release_row in self._hidden_releases.get(label_row, ())
+
+    def get_label_name(self, index: QModelIndex) -> Optional[str]:
+        """Returns the label name for a label or release index."""
+        if not index.isValid():
+            return None
+        label_row = index.row() if index.internalId() == _LABEL_NODE else index.internalId() - 1
+        return self._labels[label_row]
@@ -16,6 +16,7 @@ from file_operations.audio_tags import AudioTagHelper
 
 # Set logger instance
 from log_config import get_logger
+from ui.artwork_cache import artwork_cache
 from ui.custom_waveform_widget import WaveformWidget
 
 logger = get_logger(__name__)
@@ -39,6 +40,7 @@ class MediaPlayerController(QWidget):
         lbl_info: QLabel,
         lbl_cover_art: QWidget,
         db_path: str = None,
+        catalogue=None,
     ) -> None:
         super().__init__(parent)
         self.artist = ""
@@ -56,6 +58,7 @@ class MediaPlayerController(QWidget):
         self.media_ready = False
         self._user_is_sliding = None
         self.db_path = db_path
+        self.catalogue = catalogue  # MusicCatalogDB_2 used to find the file_id of files loaded by path
 
         self.__setup_icons()
         self.__setup_media_player()
@@ -140,16 +143,33 @@ class MediaPlayerController(QWidget):
         current_time = rel_pos * duration
         self.lbl_current.setText(self.format_time(current_time))
 
+    def set_catalogue(self, catalogue) -> None:
+        """Sets the catalogue files loaded by path are looked up in, so they reuse its cached waveforms and tags."""
+        self.catalogue = catalogue
+
     def load_media(self, path: str, file_id: int = None) -> None:
-        """Load media from the given path, using cached waveform if available. file_id must be provided for DB lookup."""
+        """
+        Load media from the given path, using cached waveform if available. Without a file_id the path is looked up
+        in the catalogue, if one is set.
+        """
         self.load_start = datetime.datetime.now()
         self.media_ready = False
-        self.load_tag_data(path)
+        track = None
+        if file_id is None and self.catalogue is not None:
+            track = self.catalogue.get_track_by_path(path)
+            if track is not None:
+                file_id = track.file_id
+                logger.info(f"Found '{path}' in the catalogue: file_id={file_id}")
+        db_path = self.db_path or (self.catalogue.db_path if self.catalogue is not None else None)
+
+        self.load_tag_data(path, track)
         self.set_cover_art()
         self.path = path
         self.player.setMedia(QMediaContent(QUrl.fromLocalFile(self.path)))
-        if file_id is not None and self.db_path:
-            self.waveform_widget.load_waveform_from_db_or_file(file_id, path, self.db_path)
+        if file_id is not None and db_path:
+            # The duration from the file header saves decoding the file when the waveform is cached
+            duration = self.audio_tags.get_duration(path) if track is not None else None
+            self.waveform_widget.load_waveform_from_db_or_file(file_id, path, db_path, duration=duration)
         else:
             self.waveform_widget.load_waveform_from_file(path)
         self.on_stop_button_clicked()
@@ -235,23 +255,50 @@ class MediaPlayerController(QWidget):
         return f"{h:02d}:{m:02d}:{s:02d}.{ms:02d}"
 
     def set_cover_art(self) -> None:
-        """Get the cover art from the media file."""
-        pixmap = QPixmap()
-        if self.cover_art:
-            pixmap.loadFromData(self.cover_art[0].data)  # type: ignore[attr-defined]
-        else:
-            pixmap.load("src/qt/white_label_record.jpg")
+        """Show the cover art of the media file, decoded and scaled by the artwork cache on its worker thread."""
+        if not self.cover_art:
+            self.__show_cover_art(None)
+            return
 
+        image = self.cover_art[0]
+        self._cover_art_shown = False
+        artwork_cache().request(image, self.wdgt_cover_art.size(), lambda pixmap, source_size: self.__show_cover_art(pixmap, image))
+        if not self._cover_art_shown:
+            # Not in memory: show the placeholder rather than the previous track's art until the worker is done
+            self.__show_cover_art(None)
+
+    def __show_cover_art(self, pixmap, image=None) -> None:
+        if image is not None and (not self.cover_art or self.cover_art[0] is not image):
+            return  # Another track has been loaded since this image was requested
+        if pixmap is None or pixmap.isNull():
+            pixmap = QPixmap()
+            pixmap.load("src/qt/white_label_record.jpg")
+        else:
+            self._cover_art_shown = True
         scaled_pixmap = pixmap.scaled(self.wdgt_cover_art.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
         self.wdgt_cover_art.setPixmap(scaled_pixmap)
 
-    def load_tag_data(self, path: str) -> None:
-        """Load the ID3 tags from the media file."""
+    def load_tag_data(self, path: str, track=None) -> None:
+        """
+        Load the ID3 tags from the media file, or from its catalogue track if it has one. Only the cover art headers
+        are read from the file here; set_cover_art reads the data of the first image.
+        """
         tags: Dict[str, str]
-        cover_art: list[APIC]
-        tags, cover_art = self.audio_tags.get_tags_and_cover_art(path)
+        if track is not None:
+            tags = {
+                self.audio_tags.TITLE: [str(track.track_title or "")],
+                self.audio_tags.ARTIST: [str(track.track_artist or "")],
+                self.audio_tags.ALBUM: [str(track.album_title or "")],
+                self.audio_tags.LABEL: [str(track.label or "")],
+                self.audio_tags.CATALOGNUMBER: [str(track.catalog_number or "")],
+                self.audio_tags.TRACK_NUMBER: [str(track.track_number or "")],
+                self.audio_tags.DISC_NUMBER: [str(track.disc_number or "")],
+                self.audio_tags.DISCOGS_RELEASE_ID: [str(track.discogs_id or "")],
+            }
+        else:
+            tags = self.audio_tags.get_tags(path)
         self.id3tags = tags
-        self.cover_art = cover_art
+        self.cover_art = self.audio_tags.get_artwork_info(path)
 
     def format_duration_ms(self, delta):
         """Format a timedelta or milliseconds as a human-readable string."""
@@ -0,0 +1,174 @@
+import queue
+import sqlite3
+from collections import OrderedDict
+from dataclasses import replace
+from typing import List, Optional
+
+from PyQt5.QtCore import QModelIndex, QThread, Qt, pyqtSignal
+
+from db import catalog_query
+from db.catalog_query import KeysetKey, TrackQuery
+from db.db_reader import Track
+from log_config import get_logger
+from ui.track_table_model import BaseTrackTableModel
+
+logger = get_logger(__name__)
+
+
+def _fetch_page(conn: sqlite3.Connection, query: TrackQuery, page: int, page_size: int, after: Optional[KeysetKey]) -> List[Track]:
+    """Fetches a page by keyset when the key of the previous page is known, otherwise by OFFSET."""
+    if page == 0 or after is not None:
+        tracks, _ = catalog_query.query_page(conn, query, after, page_size)
+        return tracks
+    return catalog_query.query_tracks(conn, query, page_size, page * page_size)
+
+
+class PageFetcher(QThread):
+    """Fetches pages requested by a PagedTrackTableModel on a worker thread with its own connection."""
+
+    pageFetched = pyqtSignal(int, int, object)  # generation, page, list of Track
+
+    def __init__(self, db_path: str, page_size: int, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.page_size = page_size
+        self._requests: queue.Queue = queue.Queue()
+
+    def request(self, generation: int, query: TrackQuery, page: int, after: Optional[KeysetKey]) -> None:
+        self._requests.put((generation, query, page, after))
+
+    def stop(self) -> None:
+        self._requests.put(None)
+        self.wait()
+
+    def run(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            while True:
+                request = self._requests.get()
+                if request is None:
+                    break
+                generation, query, page, after = request
+                try:
+                    self.pageFetched.emit(generation, page, _fetch_page(connection, query, page, self.page_size, after))
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to prefetch track page {page}: {e}")
+        finally:
+            connection.close()
+
+
+class PagedTrackTableModel(BaseTrackTableModel):
+    """
+    Windowed track table model over the database, for collections too large to hold in memory.
+
+    Rows are fetched a page at a time as the view asks for them, by keyset ((sort column, track_id) > last row of the
+    previous page) when that page has been seen, by OFFSET otherwise. Only the most recently used pages, and the keys
+    of the most recently read pages, are kept, and the page after the one just read is prefetched in the background,
+    so memory stays flat however many rows match.
+    """
+
+    def __init__(self, db_path: str, headers: List[str], attrs: List[str], page_size: int = 200, max_pages: int = 32, max_page_keys: int = 1024, parent=None) -> None:
+        super().__init__(headers, attrs, parent)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_page_keys = max_page_keys
+        self.connection = sqlite3.connect(db_path)
+        self.query = TrackQuery()
+        self._generation = 0
+        self._count = 0
+        self._pages: "OrderedDict[int, List[Track]]" = OrderedDict()  # LRU, most recently used last
+        self._page_keys: "OrderedDict[int, KeysetKey]" = OrderedDict()  # page -> key of its last row, LRU
+        self._requested: set = set()
+
+        self._fetcher = PageFetcher(db_path, page_size, self)
+        self._fetcher.pageFetched.connect(self.on_page_fetched)
+        self._fetcher.start()
+        self.__reset()
+
+    # QAbstractTableModel interface
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._count
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        """Sorts in SQL, by track_id for load order."""
+        self.set_query(replace(self.query, order_by=self.sort_attr(column) or "track_id", descending=order == Qt.DescendingOrder))
+
+    # Helpers
+    def track_at(self, row: int) -> Optional[Track]:
+        """
+        Returns the track displayed at the given row, fetching its page if it is not cached.
+        Returns None if the row no longer exists (the database changed since the rows were counted).
+        """
+        page = row // self.page_size
+        tracks = self.__page(page)
+        self.__prefetch(page + 1)
+        offset = row - page * self.page_size
+        return tracks[offset] if offset < len(tracks) else None
+
+    def set_query(self, query: TrackQuery) -> None:
+        """Shows the tracks matching a TrackQuery."""
+        self.query = query
+        self.__reset()
+
+    def refresh(self) -> None:
+        """Re-reads the database, e.g. after it has changed."""
+        self.__reset()
+
+    def tracks_appended(self) -> None:
+        """Tracks streamed into the in-memory catalogue are not shown by this model: it reads the database."""
+
+    def close(self) -> None:
+        """Stops the prefetch thread. Safe to call more than once."""
+        if self._fetcher.isRunning():
+            self._fetcher.stop()
+        self.connection.close()
+
+    def on_page_fetched(self, generation: int, page: int, tracks: List[Track]) -> None:
+        self._requested.discard(page)
+        if generation != self._generation or page in self._pages:
+            return
+        self.__store_page(page, tracks)
+
+    def __reset(self) -> None:
+        self.beginResetModel()
+        self._generation += 1
+        self._pages.clear()
+        self._page_keys.clear()
+        self._requested.clear()
+        try:
+            self._count = catalog_query.count_tracks(self.connection, self.query)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to count tracks for {self.query}: {e}")
+            self._count = 0
+        self.endResetModel()
+        logger.info(f"Paged track model: {self._count} tracks match, fetched {self.page_size} at a time")
+
+    def __page(self, page: int) -> List[Track]:
+        tracks = self._pages.get(page)
+        if tracks is not None:
+            self._pages.move_to_end(page)
+            return tracks
+        tracks = _fetch_page(self.connection, self.query, page, self.page_size, self._page_keys.get(page - 1))
+        self.__store_page(page, tracks)
+        return tracks
+
+    def __store_page(self, page: int, tracks: List[Track]) -> None:
+        self._pages[page] = tracks
+        if tracks:
+            self._page_keys[page] = self.query.key_of(tracks[-1])
+            self._page_keys.move_to_end(page)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        while len(self._page_keys) > self.max_page_keys:
+            self._page_keys.popitem(last=False)
+
+    def __prefetch(self, page: int) -> None:
+        if page * self.page_size >= self._count or page in self._pages or page in self._requested:
+            return
+        after = self._page_keys.get(page - 1)
+        if after is None:
+            return
+        self._requested.add(page)
+        # The worker gets its own copy of the query
+        query = replace(self.query, facets={facet: list(values) for facet, values in self.query.facets.items()})
+        self._fetcher.request(self._generation, query, page, after)
@@ -87,6 +87,21 @@ class ProgressBarHelper:
             self.update_progress_bar_text(f"\n\{message}")
             self.increment()
 
+    def set_value(self, value: int, message: str = None) -> None:
+        """Set the progress bar value (and text), for progress not counted in files, e.g. bytes copied"""
+
+        if self.progress_bar:
+            self.counter = value
+            self.progress_bar.setValue(value)
+            if message is not None:
+                self.progress_bar.setLabelText(f"\n{message}")
+
+    def on_cancel(self, callback) -> None:
+        """Call callback as soon as the user cancels, e.g. to stop work running on another thread"""
+
+        if self.progress_bar:
+            self.progress_bar.canceled.connect(callback)
+
     def user_has_cancelled(self) -> bool:
         """Check if the user has cancelled the progress bar"""
 
@@ -0,0 +1,105 @@
+import threading
+from typing import Dict, Hashable, Tuple
+
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from file_operations.audio_tags import AudioTagHelper
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+DEBOUNCE_MS = 40  # Selections made faster than this (e.g. holding an arrow key) are not loaded
+
+
+class TagPanelWorker(QThread):
+    """
+    Reads the tags and artwork headers of the selected file of each panel on a worker thread. Only the latest request
+    of a panel is kept: one made while a file is being read replaces any request still waiting.
+    """
+
+    panelLoaded = pyqtSignal(object, int, str, dict, list)  # panel, generation, path, tags, List[ArtworkInfo]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.audio_tags = AudioTagHelper()
+        self._requests: Dict[Hashable, Tuple[int, str]] = {}  # panel -> (generation, path)
+        self._condition = threading.Condition()
+
+    def request(self, panel: Hashable, generation: int, path: str) -> None:
+        with self._condition:
+            self._requests[panel] = (generation, path)
+            self._condition.notify()
+
+    def stop(self) -> None:
+        self.requestInterruption()
+        with self._condition:
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._requests and not self.isInterruptionRequested():
+                    self._condition.wait()
+                if self.isInterruptionRequested():
+                    return
+                panel = next(iter(self._requests))
+                generation, path = self._requests.pop(panel)
+            try:
+                tags = self.audio_tags.get_tags(path) or {}
+                artwork = self.audio_tags.get_artwork_info(path) or []
+            except Exception:
+                logger.exception(f"Cannot read the tags of '{path}'")
+                tags, artwork = {}, []
+            self.panelLoaded.emit(panel, generation, path, tags, artwork)
+
+
+class TagPanelLoader(QObject):
+    """
+    Loads the tags and artwork shown for the selected file of a panel (e.g. a tree view) without blocking the GUI.
+
+    Each load() bumps the panel's generation and restarts a short debounce timer, so only the file the selection
+    settles on is read. Results are read on a TagPanelWorker and emitted by panelLoaded only if no newer load() was
+    made for the panel in the meantime.
+    """
+
+    panelLoaded = pyqtSignal(object, str, dict, list)  # panel, path, tags, List[ArtworkInfo]
+
+    def __init__(self, delay_ms: int = DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.worker = TagPanelWorker()
+        self.worker.panelLoaded.connect(self.__on_worker_loaded)
+        self._generations: Dict[Hashable, int] = {}
+        self._waiting: Dict[Hashable, str] = {}  # panel -> path waiting for the debounce timer
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.__dispatch)
+
+    def load(self, panel: Hashable, path: str) -> None:
+        self._generations[panel] = self._generations.get(panel, 0) + 1
+        self._waiting[panel] = path
+        self._timer.start()
+
+    def cancel(self, panel: Hashable) -> None:
+        """Drops the pending load of a panel, e.g. when a file that has no tags is selected."""
+        self._generations[panel] = self._generations.get(panel, 0) + 1
+        self._waiting.pop(panel, None)
+
+    def close(self) -> None:
+        self._timer.stop()
+        if self.worker.isRunning():
+            self.worker.stop()
+
+    def __dispatch(self) -> None:
+        if not self.worker.isRunning():
+            self.worker.start()
+        for panel, path in self._waiting.items():
+            self.worker.request(panel, self._generations[panel], path)
+        self._waiting = {}
+
+    def __on_worker_loaded(self, panel: Hashable, generation: int, path: str, tags: dict, artwork: list) -> None:
+        if generation != self._generations.get(panel):
+            logger.debug(f"Dropped stale tags of '{path}'")
+            return
+        self.panelLoaded.emit(panel, path, tags, artwork)
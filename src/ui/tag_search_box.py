@@ -0,0 +1,89 @@
+import os
+import time
+from typing import List
+
+from PyQt5.QtCore import QModelIndex, Qt, QTimer
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from PyQt5.QtWidgets import QLineEdit
+
+from file_operations.tag_index import IndexedFile, TagIndex
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+SEARCH_DELAY_MS = 150
+RESULT_HEADERS = ["Name", "Artist", "Title", "Label", "Catalog", "Folder"]
+
+
+class SearchResultsModel(QStandardItemModel):
+    """
+    The files found by a tag search, one row each. Answers filePath(), isDir() and rootPath() like QFileSystemModel,
+    so a MyTreeView showing the results keeps its selection, move, copy and repackage actions.
+    """
+
+    def __init__(self, files: List[IndexedFile], parent=None):
+        super().__init__(parent)
+        self.setHorizontalHeaderLabels(RESULT_HEADERS)
+        directories = {os.path.dirname(file.path) for file in files}
+        try:
+            self._root = os.path.commonpath(list(directories)) if directories else ""
+        except ValueError:
+            # Files on different drives (or mixing absolute and relative paths) have no common folder: show full folders
+            self._root = ""
+        for file in files:
+            folder = os.path.dirname(file.path)
+            row = [os.path.basename(file.path), file.artist, file.title, file.label, file.catalog, os.path.relpath(folder, self._root) if self._root else folder]
+            items = [QStandardItem(value) for value in row]
+            for item in items:
+                item.setEditable(False)
+                item.setToolTip(file.path)
+            items[0].setData(file.path, Qt.UserRole)
+            self.appendRow(items)
+
+    def filePath(self, index: QModelIndex) -> str:
+        if not index.isValid():
+            return self._root
+        return self.index(index.row(), 0, index.parent()).data(Qt.UserRole) or ""
+
+    def isDir(self, index: QModelIndex) -> bool:
+        return not index.isValid()
+
+    def rootPath(self) -> str:
+        return self._root
+
+
+class TagSearchBox(QLineEdit):
+    """
+    Search box of a file tree: searches the tag index as the user types and shows the matching files in the tree in
+    place of the folder, e.g. 'label:warp' for everything on a label. Clearing the box (or Escape) shows the folder again.
+    """
+
+    def __init__(self, tag_index: TagIndex, tree_view, parent=None):
+        super().__init__(parent)
+        self.tag_index = tag_index
+        self.tree_view = tree_view
+        self.setPlaceholderText("Search tags, e.g. label:warp aphex")
+        self.setClearButtonEnabled(True)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SEARCH_DELAY_MS)
+        self._timer.timeout.connect(self.search)
+        self.textChanged.connect(lambda _: self._timer.start())
+
+    def search(self) -> None:
+        text = self.text().strip()
+        if not text:
+            self.tree_view.clear_search()
+            self.setToolTip("")
+            return
+        started = time.perf_counter()
+        files = self.tag_index.search(text)
+        self.tree_view.show_search_results(SearchResultsModel(files))
+        self.setToolTip(f"{len(files)} files found in {(time.perf_counter() - started) * 1000:.0f} ms")
+        logger.info(f"Tag search '{text}': {len(files)} files in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.clear()
+            return
+        super().keyPressEvent(event)
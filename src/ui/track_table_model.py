@@ -0,0 +1,204 @@
+from abc import ABCMeta, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QBrush, QColor, QFont
+
+from db.db_reader import MusicCatalogDB_2, Track
+from file_operations.integrity_checker import OK, FileStatus
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+HYPERLINK_COLOR = QColor(0, 102, 204)
+FILE_PROBLEM_COLOR = QColor(204, 0, 0)
+
+
+class _AbstractModelMeta(type(QAbstractTableModel), ABCMeta):
+    """Lets a Qt model declare abstract methods: PyQt's metaclass combined with ABCMeta."""
+
+
+class BaseTrackTableModel(QAbstractTableModel, metaclass=_AbstractModelMeta):
+    """Columns and display roles shared by the track table models. Subclasses provide rowCount() and track_at()."""
+
+    def __init__(self, headers: List[str], attrs: List[str], parent=None) -> None:
+        super().__init__(parent)
+        self.headers = headers
+        self.attrs = attrs
+        self._link_font = QFont()
+        self._link_font.setUnderline(True)
+        self._link_brush = QBrush(HYPERLINK_COLOR)
+        self._problem_brush = QBrush(FILE_PROBLEM_COLOR)
+        self.file_status: Dict[int, FileStatus] = {}  # file_id -> FileStatus of the last integrity check
+
+    # QAbstractTableModel interface
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if 0 <= section < len(self.headers) else None
+        return section + 1
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        attr = self.attrs[index.column()]
+        if role == Qt.DisplayRole:
+            if attr == "file_id":
+                # The "No" column is the position of the track in the current view
+                return str(index.row() + 1)
+            track = self.track_at(index.row())
+            if track is None:
+                return None
+            if attr == "file_status":
+                status = self.file_status.get(track.file_id)
+                return status.status if status is not None else ""
+            return str(getattr(track, attr, ""))
+
+        if attr == "file_status":
+            if role not in (Qt.ForegroundRole, Qt.ToolTipRole):
+                return None
+            track = self.track_at(index.row())
+            status = self.file_status.get(track.file_id) if track is not None else None
+            if status is None:
+                return None
+            if role == Qt.ToolTipRole:
+                return status.moved_to
+            return self._problem_brush if status.status != OK else None
+
+        if attr != "discogs_id":
+            return None
+
+        # Display the discogs id as plain text but styled as a hyperlink
+        if role == Qt.UserRole:
+            track = self.track_at(index.row())
+            return track.discogs_url if track is not None else None
+        if role == Qt.FontRole:
+            return self._link_font
+        if role == Qt.ForegroundRole:
+            return self._link_brush
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def sort_attr(self, column: int) -> Optional[str]:
+        """Returns the attribute to sort by for a column, None for load order (negative column, the "No" or "Status" column)."""
+        attr = self.attrs[column] if 0 <= column < len(self.attrs) else None
+        return None if attr in ("file_id", "file_status") else attr
+
+    def set_file_status(self, statuses: Dict[int, FileStatus]) -> None:
+        """Shows the result of an integrity check: FileStatus by file_id."""
+        self.file_status = statuses
+        if "file_status" in self.attrs and self.rowCount():
+            column = self.attrs.index("file_status")
+            self.dataChanged.emit(self.index(0, column), self.index(self.rowCount() - 1, column))
+
+    @abstractmethod
+    def track_at(self, row: int) -> Optional[Track]:
+        """Returns the track displayed at the given row, None if there is none."""
+
+    def close(self) -> None:
+        """Releases anything held by the model, e.g. worker threads."""
+
+
+class TrackTableModel(BaseTrackTableModel):
+    """
+    Table model over the tracks held by a MusicCatalogDB_2.
+
+    The model never copies the tracks: it holds an array of row positions into catalogue.get_all_tracks().
+    Filtering is a boolean mask over those positions, and sorting swaps in one of the catalogue's cached sort
+    permutations, so neither allocates items per row.
+    """
+
+    def __init__(self, catalogue: MusicCatalogDB_2, headers: List[str], attrs: List[str], parent=None) -> None:
+        super().__init__(headers, attrs, parent)
+        self.catalogue = catalogue
+        self._mask: Optional[np.ndarray] = None
+        self._sort_attr: Optional[str] = None
+        self._sort_order = Qt.AscendingOrder
+        self._rows = np.arange(len(self.catalogue.get_all_tracks()), dtype=np.int64)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        """Sorts by swapping in the catalogue's cached permutation for the column. A negative column restores load order."""
+        self._sort_attr = self.sort_attr(column)
+        self._sort_order = order
+        self.__update_rows(layout_only=True)
+
+    # Helpers
+    def track_at(self, row: int) -> Track:
+        """Returns the track displayed at the given row."""
+        return self.catalogue.get_all_tracks()[self._rows[row]]
+
+    def get_tracks(self) -> List[Track]:
+        """Returns the tracks currently displayed, in display order."""
+        tracks = self.catalogue.get_all_tracks()
+        return [tracks[position] for position in self._rows]
+
+    def set_mask(self, mask: Optional[np.ndarray]) -> None:
+        """Sets the filter: a boolean array over the catalogue tracks (True = shown), or None to show all tracks."""
+        self._mask = mask
+        self.__update_rows(layout_only=False)
+
+    def refresh(self) -> None:
+        """Re-reads the catalogue, e.g. after tracks have been loaded."""
+        self.__update_rows(layout_only=False)
+
+    def tracks_appended(self) -> None:
+        """
+        Shows tracks appended to the catalogue, e.g. by a background load. In load order without a filter the new
+        rows are inserted at the end, so the view keeps its scroll position and selection.
+        """
+        total = len(self.catalogue.get_all_tracks())
+        first = len(self._rows)
+        if self._mask is not None or self._sort_attr is not None or total < first:
+            self.refresh()
+            return
+        if total == first:
+            return
+        self.beginInsertRows(QModelIndex(), first, total - 1)
+        self._rows = np.arange(total, dtype=np.int64)
+        self.endInsertRows()
+
+    def __compute_rows(self) -> np.ndarray:
+        """Composes the active sort permutation with the active filter mask."""
+        total = len(self.catalogue.get_all_tracks())
+        if self._sort_attr is None:
+            rows = np.arange(total, dtype=np.int64)
+        else:
+            rows = self.catalogue.get_sort_permutation(self._sort_attr, self._sort_order == Qt.DescendingOrder)
+
+        if self._mask is not None:
+            if len(self._mask) < total:
+                # Tracks appended since the mask was computed are filtered out until a new mask is set
+                self._mask = np.concatenate([self._mask, np.zeros(total - len(self._mask), dtype=bool)])
+            rows = rows[self._mask[rows]]
+        return rows
+
+    def __update_rows(self, layout_only: bool) -> None:
+        if not layout_only:
+            self.beginResetModel()
+            self._rows = self.__compute_rows()
+            self.endResetModel()
+            return
+
+        # Same set of rows in a new order: keep persistent indexes (e.g. the current index) pointing at the same tracks
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        positions = [self._rows[index.row()] for index in persistent]
+        self._rows = self.__compute_rows()
+        if persistent:
+            new_row_of = {position: row for row, position in enumerate(self._rows.tolist())}
+            new_indexes = [self.index(new_row_of[position], index.column()) if position in new_row_of else QModelIndex() for index, position in zip(persistent, positions)]
+            self.changePersistentIndexList(persistent, new_indexes)
+        self.layoutChanged.emit()
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The application imports its modules relative to src (e.g. "from db.db_reader import ...")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# log_config reads config.ini from the working directory when the first logger is created, so the tests run in a
+# scratch directory with a config.ini that logs there
+_WORK_DIR = tempfile.mkdtemp(prefix="music-catalogue-tests-")
+os.chdir(_WORK_DIR)
+with open("config.ini", "w") as config_file:
+    config_file.write(f"[main_logger]\nlog_dir = {os.path.join(_WORK_DIR, 'logs')}\nclear_log_each_run = False\nmax_log_size = 2MB\nbackup_count = 1\n")
+
+
+@pytest.fixture
+def db_config(tmp_path, monkeypatch):
+    """Returns a function that sets config.ini [db] options for the test, e.g. db_config(change_log=True)."""
+    with open("config.ini") as config_file:
+        base_config = config_file.read()
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+
+    def set_options(**options):
+        with open("config.ini", "w") as config_file:
+            config_file.write(base_config + "[db]\n" + "".join(f"{name} = {value}\n" for name, value in options.items()))
+
+    set_options()
+    return set_options
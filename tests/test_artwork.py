@@ -0,0 +1,108 @@
+import struct
+import zlib
+
+import pytest
+
+pytest.importorskip("taglib")
+pytest.importorskip("mutagen")
+
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import APIC, ID3, TIT2
+from mutagen.wave import WAVE
+
+from file_operations.artwork import ArtworkInfo, ArtworkParseError, read_artwork_info
+from file_operations.audio_tags import AudioTagHelper
+from tests.test_library_scanner import write_wav
+
+FRONT = b"\xff\xd8\xff\xe0front cover" + bytes(range(256)) * 8
+BACK = b"\x89PNG\r\n\x1a\nback cover\xff\x00\xff\xe0"
+
+
+def pictures():
+    return [APIC(encoding=3, mime="image/jpeg", type=3, desc="Front", data=FRONT), APIC(encoding=1, mime="image/png", type=4, desc="Rückseite", data=BACK)]
+
+
+def assert_matches(images, path, expected):
+    """The images read from the headers describe the pictures mutagen reads, and their offsets point at the image data."""
+    with open(path, "rb") as file:
+        content = file.read()
+    assert [(image.type, image.mime, image.desc, image.size) for image in images] == [(art.type, art.mime, art.desc, len(art.data)) for art in expected]
+    for image, art in zip(images, expected):
+        assert content[image.offset : image.offset + image.size] == art.data
+        assert image.data == art.data
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_apic_frames_of_an_id3_tag_are_found_from_their_headers(tmp_path, version):
+    path = str(tmp_path / "tagged.mp3")
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="One"))
+    for art in pictures():
+        tags.add(art)
+    tags.save(path, v2_version=version)
+
+    assert_matches(read_artwork_info(path), path, ID3(path).getall("APIC"))
+
+
+def test_flac_picture_blocks_are_found_from_their_headers(tmp_path):
+    path = str(tmp_path / "tagged.flac")
+    # STREAMINFO: 4096 sample blocks, unknown frame sizes, 44.1kHz, 2 channels, 16 bits, no samples
+    stream_info = struct.pack(">HH", 4096, 4096) + bytes(6) + ((44100 << 44) | (1 << 41) | (15 << 36)).to_bytes(8, "big") + bytes(16)
+    with open(path, "wb") as file:
+        file.write(b"fLaC" + bytes([0x80, 0, 0, len(stream_info)]) + stream_info)
+    flac = FLAC(path)
+    for art in pictures():
+        picture = Picture()
+        picture.type, picture.mime, picture.desc, picture.data = art.type, art.mime, art.desc, art.data
+        flac.add_picture(picture)
+    flac["TITLE"] = "One"
+    flac.save()
+
+    assert_matches(read_artwork_info(path), path, FLAC(path).pictures)
+
+
+def test_apic_frames_of_the_id3_chunk_of_a_wav_file_are_found(tmp_path):
+    wav_path = str(tmp_path / "tagged.wav")
+    write_wav(wav_path, title="One")
+    song = WAVE(wav_path)
+    for art in pictures():
+        song.tags.add(art)
+    song.save()
+
+    assert_matches(read_artwork_info(wav_path), wav_path, WAVE(wav_path).tags.getall("APIC"))
+
+
+def id3v23(frames, flags=0):
+    """An ID3v2.3 tag of (frame id, frame flags, frame body) written by hand, for the frame forms mutagen does not write."""
+    body = b"".join(frame_id + struct.pack(">IH", len(data), frame_flags) + data for frame_id, frame_flags, data in frames)
+    if flags & 0x80:
+        body = body.replace(b"\xff", b"\xff\x00")  # Unsynchronisation
+    size = len(body)
+    return b"ID3\x03\x00" + bytes([flags, size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F]) + body
+
+
+def apic_body(art):
+    return bytes([3]) + art.mime.encode() + b"\0" + bytes([art.type]) + art.desc.encode() + b"\0" + art.data
+
+
+@pytest.mark.parametrize(
+    "tag",
+    [
+        id3v23([(b"APIC", 0x0080, struct.pack(">I", len(apic_body(pictures()[0]))) + zlib.compress(apic_body(pictures()[0])))]),
+        id3v23([(b"APIC", 0, apic_body(pictures()[0]))], flags=0x80),
+    ],
+    ids=["compressed frame", "unsynchronised tag"],
+)
+def test_tags_that_cannot_be_walked_are_read_in_full_with_mutagen(tmp_path, tag):
+    path = str(tmp_path / "tagged.mp3")
+    with open(path, "wb") as file:
+        file.write(tag)
+    front = pictures()[0]
+    assert [(art.mime, art.desc, art.data) for art in ID3(path).getall("APIC")] == [(front.mime, front.desc, front.data)]
+
+    with pytest.raises(ArtworkParseError):
+        read_artwork_info(path)
+    images = AudioTagHelper().get_artwork_info(path)
+
+    assert [(image.type, image.mime, image.desc, image.size, image.offset) for image in images] == [(3, "image/jpeg", "Front", len(FRONT), -1)]
+    assert isinstance(images[0], ArtworkInfo) and images[0].data == FRONT
@@ -0,0 +1,163 @@
+import itertools
+import os
+import threading
+import time
+import wave
+
+import pytest
+
+pytest.importorskip("taglib")
+pytest.importorskip("mutagen")
+
+from mutagen.id3 import TIT2
+from mutagen.wave import WAVE
+
+from file_operations import audio_tags
+from file_operations.audio_tags import AudioTagHelper, TagCache
+
+
+@pytest.fixture
+def wav_path(tmp_path):
+    path = str(tmp_path / "01 One.wav")
+    with wave.open(path, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(8000)
+        audio.writeframes(b"\0\0" * 800)
+    song = WAVE(path)
+    song.add_tags()
+    song.tags.add(TIT2(encoding=3, text="One"))
+    song.save()
+    os.utime(path, ns=(0, 0))
+    return path
+
+
+def test_reading_the_tags_does_not_save_the_file(wav_path):
+    with AudioTagHelper().transaction(wav_path) as transaction:
+        assert str(transaction.tags["TIT2"]) == "One"
+        assert transaction.text_tags()["TITLE"] == ["One"]
+
+    assert os.stat(wav_path).st_mtime_ns == 0
+
+
+def test_added_and_replaced_tags_are_saved(wav_path):
+    with AudioTagHelper().transaction(wav_path) as transaction:
+        transaction.add(TIT2(encoding=3, text="Uno"))
+    assert os.stat(wav_path).st_mtime_ns != 0
+    assert str(WAVE(wav_path).tags["TIT2"]) == "Uno"
+
+    with AudioTagHelper().transaction(wav_path) as transaction:
+        transaction.tags = [TIT2(encoding=3, text="Eins")]
+    assert str(WAVE(wav_path).tags["TIT2"]) == "Eins"
+
+
+def test_nothing_is_written_if_the_block_raises(wav_path):
+    with pytest.raises(RuntimeError):
+        with AudioTagHelper().transaction(wav_path) as transaction:
+            transaction.add(TIT2(encoding=3, text="Uno"))
+            raise RuntimeError("stop")
+
+    assert str(WAVE(wav_path).tags["TIT2"]) == "One"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    tag_cache = TagCache()
+    monkeypatch.setattr(audio_tags, "TAG_CACHE", tag_cache)
+    return tag_cache
+
+
+def test_cached_tags_are_read_again_when_the_size_or_mtime_of_the_file_changes(wav_path, cache):
+    helper = AudioTagHelper()
+    assert helper.get_tags(wav_path)["TITLE"] == ["One"]
+    assert helper.get_tags(wav_path)["TITLE"] == ["One"]
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.stale) == (1, 1, 0)
+
+    os.utime(wav_path, ns=(0, 1))
+    helper.get_tags(wav_path)
+    assert (cache.stats.hits, cache.stats.stale) == (1, 1)
+
+    with open(wav_path, "ab") as audio:
+        audio.write(b"\0\0")
+    os.utime(wav_path, ns=(0, 1))
+    helper.get_tags(wav_path)
+    assert (cache.stats.hits, cache.stats.stale) == (1, 2)
+    helper.get_tags(wav_path)
+    assert cache.stats.hits == 2
+
+
+def test_writing_the_tags_evicts_the_cached_entry(wav_path, cache):
+    helper = AudioTagHelper()
+    tags = helper.get_tags(wav_path)
+    tags["TITLE"] = ["Uno"]
+    # The mtime of a file written within its timestamp resolution may not change, so the entry must go on the write
+    stat = os.stat(wav_path)
+    helper.write_tags(wav_path, tags)
+    os.utime(wav_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert cache.stats.invalidations == 1
+    assert helper.get_tags(wav_path)["TITLE"] == ["Uno"]
+
+
+def test_committing_a_transaction_evicts_the_cached_entry(wav_path, cache):
+    helper = AudioTagHelper()
+    helper.get_tags(wav_path)
+    with helper.transaction(wav_path) as transaction:
+        transaction.add(TIT2(encoding=3, text="Eins"))
+    os.utime(wav_path, ns=(0, 0))
+
+    assert cache.stats.invalidations == 1
+    assert helper.get_tags(wav_path)["TITLE"] == ["Eins"]
+
+
+def test_tags_of_many_files_are_yielded_in_the_order_of_the_paths(monkeypatch):
+    helper = AudioTagHelper()
+    # Later paths finish first
+    monkeypatch.setattr(helper, "get_tags", lambda path: time.sleep(0.01 * (5 - int(path))) or {"TITLE": [path]})
+
+    assert list(helper.get_tags_many(str(number) for number in range(5))) == [(str(number), {"TITLE": [str(number)]}) for number in range(5)]
+
+
+def test_unordered_tags_are_yielded_as_each_read_completes(monkeypatch):
+    helper = AudioTagHelper()
+    first_read_may_finish = threading.Event()
+    monkeypatch.setattr(helper, "get_tags", lambda path: (path != "slow" or first_read_may_finish.wait(5)) and {"TITLE": [path]})
+
+    results = helper.get_tags_many(["slow", "fast"], ordered=False, workers=2)
+    assert next(results) == ("fast", {"TITLE": ["fast"]})
+    first_read_may_finish.set()
+    assert next(results) == ("slow", {"TITLE": ["slow"]})
+
+
+def test_a_file_that_cannot_be_read_yields_none(wav_path, monkeypatch):
+    helper = AudioTagHelper()
+    read = helper.get_tags
+
+    def read_or_fail(path):
+        if path == "locked.wav":
+            raise PermissionError(path)
+        return read(path)
+
+    monkeypatch.setattr(helper, "get_tags", read_or_fail)
+
+    assert [(path, tags and tags["TITLE"]) for path, tags in helper.get_tags_many([wav_path, "locked.wav"])] == [(wav_path, ["One"]), ("locked.wav", None)]
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_only_a_bounded_window_of_reads_runs_ahead_of_the_consumer(monkeypatch, ordered):
+    helper = AudioTagHelper()
+    read = []
+    monkeypatch.setattr(helper, "get_tags", lambda path: read.append(path) or {})
+    taken = itertools.count()
+
+    def paths():
+        for number in range(1000):
+            next(taken)
+            yield str(number)
+
+    results = helper.get_tags_many(paths(), ordered=ordered, workers=2)
+    next(results)
+    # The window of 4 reads per worker, and the read started to replace the one yielded
+    assert next(taken) == 2 * 4 + 1
+    results.close()
+    assert len(read) <= 2 * 4 + 1
@@ -0,0 +1,135 @@
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from db import catalog_query
+from db.catalog_query import SqlFacetIndex, TrackQuery
+from db.db_reader import MusicCatalogDB_2
+from db.facet_index import FACETS, FacetIndex
+
+COLUMNS = ("track_id", "label", "catalog_number", "discogs_id", "album_title", "track_artist", "track_title", "year", "country", "format", "genre", "style", "file_id", "file_location")
+
+
+@pytest.fixture
+def conn(tmp_path):
+    rng = random.Random(3)
+    connection = sqlite3.connect(str(tmp_path / "catalogue.db"))
+    connection.execute(f"CREATE TABLE uber_tracks ({', '.join(COLUMNS)})")
+    rows = []
+    for track_id in range(1, 238):
+        release = rng.randint(1, 30)
+        rows.append(
+            (
+                track_id,
+                rng.choice(["Warp", "Ninja Tune", None]),
+                f"CAT {release}",
+                release,
+                f"Album {release}",
+                f"Artist {release}",
+                f"Track {track_id}",
+                rng.choice([1995, 2001, None]),
+                rng.choice(["UK", "US", ""]),
+                rng.choice(["Vinyl", "CD"]),
+                rng.choice(["Electronic", "Electronic, Hip Hop", "Jazz", None]),
+                rng.choice(["House, Techno", "Techno", " Trip Hop ,Techno", ""]),
+                track_id + 1000,
+                f"/music/{track_id}.flac",
+            )
+        )
+    # Rows are stored out of track_id order
+    rng.shuffle(rows)
+    connection.executemany(f"INSERT INTO uber_tracks VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def all_pages(conn, query, limit):
+    tracks, after = catalog_query.query_page(conn, query, None, limit)
+    pages = [tracks]
+    while after is not None:
+        tracks, after = catalog_query.query_page(conn, query, after, limit)
+        pages.append(tracks)
+    return pages
+
+
+@pytest.mark.parametrize("order_by", ["track_id", "year", "label", "catalog_number"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 7, 237, 500])
+def test_keyset_pages_match_offset_order_without_gaps_or_duplicates(conn, order_by, descending, limit):
+    query = TrackQuery(order_by=order_by, descending=descending)
+    expected = [track.track_id for track in catalog_query.query_tracks(conn, query)]
+
+    pages = all_pages(conn, query, limit)
+
+    assert [track.track_id for page in pages for track in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages[-1]) <= limit
+
+
+def test_keyset_pages_respect_the_filters(conn):
+    query = TrackQuery(label="Warp", facets={"style": ["Techno"]}, text="track 1", order_by="year", descending=True)
+    expected = [track.track_id for track in catalog_query.query_tracks(conn, query)]
+    assert expected
+
+    assert [track.track_id for page in all_pages(conn, query, 3) for track in page] == expected
+    assert catalog_query.count_tracks(conn, query) == len(expected)
+
+
+def test_a_page_after_the_last_row_is_empty(conn):
+    last = catalog_query.query_tracks(conn, TrackQuery(order_by="year"))[-1]
+    assert catalog_query.query_page(conn, TrackQuery(order_by="year"), (last.year, last.track_id), 10) == ([], None)
+
+
+def test_facet_counts_match_the_in_memory_facet_index(conn):
+    tracks = catalog_query.query_tracks(conn, TrackQuery())
+    index = FacetIndex(tracks)
+    sql_index = SqlFacetIndex(conn)
+    base = TrackQuery(label="Warp")
+    base_mask = np.array([track.label == "Warp" for track in tracks])
+
+    for facet in FACETS:
+        assert sql_index.values(facet) == index.values(facet)
+        assert sql_index.counts(facet) == {value: count for value, count in index.counts(facet).items() if count}
+        for value in index.values(facet):
+            # The SQL filter matches the same tracks as the value's bitset
+            assert catalog_query.count_tracks(conn, TrackQuery(facets={facet: [value]})) == index.counts(facet)[value]
+
+    for selected_facet, value in (("style", "Techno"), ("year", "1995")):
+        index.select(selected_facet, value)
+        sql_index.select(selected_facet, value)
+    for facet in FACETS:
+        expected = {value: count for value, count in index.counts(facet, base_mask).items() if count}
+        assert sql_index.counts(facet, base) == expected
+    assert sql_index.mask() is None
+
+
+def test_labels_and_releases_match_the_catalogue(conn, tmp_path):
+    catalogue = MusicCatalogDB_2(str(tmp_path / "unused.db"))
+    catalogue.add_tracks(catalog_query.query_tracks(conn, TrackQuery()))
+
+    label_to_releases, releases = catalog_query.labels_and_releases(conn)
+
+    assert label_to_releases == catalogue.get_labels_and_releases()
+    assert releases == {release_id: catalogue.get_release_by_id(release_id) for release_id in releases}
+    catalogue.close()
+
+
+def test_track_files_lists_every_file(conn):
+    assert sorted(catalog_query.track_files(conn)) == [(track_id + 1000, f"/music/{track_id}.flac") for track_id in range(1, 238)]
+
+
+def test_track_by_path_matches_the_path_as_written_or_normalised(conn):
+    assert catalog_query.track_by_path(conn, "/music/12.flac").track_id == 12
+    assert catalog_query.track_by_path(conn, "/music/./12.flac").track_id == 12
+    assert catalog_query.track_by_path(conn, "/music/999.flac") is None
+
+
+def test_a_catalogue_without_tracks_in_memory_looks_paths_up_in_the_database(conn, tmp_path):
+    catalogue = MusicCatalogDB_2(str(tmp_path / "catalogue.db"))
+
+    assert catalogue.get_track_by_path("/music/12.flac").track_id == 12
+    assert catalogue.get_track_by_path("/elsewhere/12.flac") is None
+    catalogue.close()
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from db.catalog_sync import sync, table_specs
+
+SCHEMA = """
+CREATE TABLE releases (release_id INTEGER PRIMARY KEY, title TEXT, year INTEGER);
+CREATE TABLE release_labels (release_id INTEGER, label TEXT, catalog_number TEXT, PRIMARY KEY(release_id, label)) WITHOUT ROWID;
+CREATE TABLE changes (seq INTEGER PRIMARY KEY, table_name TEXT);
+"""
+
+
+def create_db(path, releases, labels):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO releases VALUES (?, ?, ?)", releases)
+    conn.executemany("INSERT INTO release_labels VALUES (?, ?, ?)", labels)
+    conn.commit()
+    conn.close()
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    result = {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall() for table in ("releases", "release_labels", "changes")}
+    conn.close()
+    return result
+
+
+RELEASES = [(release_id, f"Album {release_id}", 1990 + release_id % 30) for release_id in range(1, 1001)]
+LABELS = [(release_id, label, f"CAT-{release_id}-{label}") for release_id in range(1, 501) for label in ("Label A", "Label B")]
+
+
+@pytest.fixture
+def catalogues(tmp_path):
+    """A source catalogue, and a target one with rows inserted, updated and deleted in both the INTEGER and composite key tables."""
+    source, target = str(tmp_path / "source.db"), str(tmp_path / "target.db")
+    create_db(source, RELEASES, LABELS)
+    target_releases = [row for row in RELEASES if row[0] not in (5, 500)] + [(1001, "Extra", 2000)]
+    target_releases = [(release_id, "Old title", year) if release_id == 700 else (release_id, title, year) for release_id, title, year in target_releases]
+    target_labels = [row for row in LABELS if row[:2] != (10, "Label B")] + [(10, "Label C", "CAT-X")]
+    target_labels = [(release_id, label, "OLD") if (release_id, label) == (250, "Label A") else (release_id, label, number) for release_id, label, number in target_labels]
+    create_db(target, target_releases, target_labels)
+    conn = sqlite3.connect(target)
+    conn.execute("INSERT INTO changes VALUES (1, 'releases')")
+    conn.commit()
+    conn.close()
+    return source, target
+
+
+def test_tables_are_keyed_on_their_integer_or_composite_primary_key(catalogues):
+    conn = sqlite3.connect(catalogues[0])
+    specs = table_specs(conn)
+    conn.close()
+
+    assert specs["releases"].key_columns == ["release_id"]
+    assert specs["release_labels"].key_columns == ["release_id", "label"]
+    assert "changes" not in specs
+
+
+def test_sync_inserts_updates_and_deletes_rows_until_the_target_equals_the_source(catalogues):
+    source, target = catalogues
+
+    result = sync(source, target)
+
+    releases, labels = result.tables["releases"], result.tables["release_labels"]
+    assert sorted(releases.inserts) == [RELEASES[4], RELEASES[499]]
+    assert releases.updates == [RELEASES[699]]
+    assert releases.deletes == [(1001,)]
+    assert labels.inserts == [(10, "Label B", "CAT-10-Label B")]
+    assert labels.updates == [(250, "Label A", "CAT-250-Label A")]
+    assert labels.deletes == [(10, "Label C")]
+    assert result.changes == 7
+    # Only the rows under differing leaves are read
+    assert result.rows_compared < len(RELEASES) + len(LABELS)
+
+    synced, expected = rows(target), rows(source)
+    assert synced["releases"] == expected["releases"]
+    assert synced["release_labels"] == expected["release_labels"]
+    assert synced["changes"] == [(1, "releases")]  # Local to the target
+
+    second = sync(source, target)
+    assert second.changes == 0
+    assert second.rows_compared == 0
+
+
+def test_a_dry_run_reports_the_changes_and_writes_nothing(catalogues):
+    source, target = catalogues
+    before = rows(target)
+
+    assert sync(source, target, dry_run=True).changes == 7
+    assert rows(target) == before
+
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    output = subprocess.run(
+        [sys.executable, "-m", "db.catalog_sync", source, target, "--dry-run"], env={**os.environ, "PYTHONPATH": src}, capture_output=True, text=True, check=True
+    ).stdout
+    assert "releases: 2 inserted, 1 updated, 1 deleted" in output
+    assert rows(target) == before
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+from db.catalogue_snapshot import CatalogueSnapshot, db_signature
+from db.db_reader import Release
+from db.facet_index import FacetIndex
+from tests.test_track_sorting import make_track
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "catalogue.db"
+    path.write_bytes(b"database")
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    return str(path)
+
+
+@pytest.fixture
+def tracks():
+    return [
+        make_track(1, track_title="Xtal", label="Warp", discogs_id=10, year=1992, style="Ambient, Techno"),
+        make_track(2, track_title="Tha", label="Warp", discogs_id=10, year=None, style="Ambient"),
+        make_track(3, track_title="Bug", label="Ninja Tune", discogs_id=20, year=1996, genre="Electronic"),
+    ]
+
+
+def save(db_path, tracks, permutations=None):
+    releases = {10: Release(10, "1992", "UK", "SAW 85-92", "Aphex Twin", "AMB 3922", "Warp"), 20: Release(20, "1996", "UK", "Bug", "Coldcut", "ZEN 1", "Ninja Tune")}
+    label_to_releases = {"Warp": {10}, "Ninja Tune": {20}}
+    facet_index = FacetIndex(tracks)
+    return CatalogueSnapshot(db_path).save(db_signature(db_path), tracks, releases, sorted(label_to_releases), label_to_releases, permutations or {}, facet_index)
+
+
+def test_a_saved_snapshot_maps_back_the_same_catalogue(db_path, tracks):
+    assert save(db_path, tracks, {("year", False): np.array([1, 0, 2])})
+
+    contents = CatalogueSnapshot(db_path).load()
+
+    assert list(contents.tracks) == tracks
+    assert contents.tracks_by_id[3] == tracks[2]
+    assert dict(contents.release_to_tracks) == {10: {1, 2}, 20: {3}}
+    assert contents.releases[10].catalog_number == "AMB 3922"
+    assert contents.label_to_releases == {"Warp": {10}, "Ninja Tune": {20}}
+    assert contents.permutations[("year", False)].tolist() == [1, 0, 2]
+    facet_index = contents.load_facet_index()
+    facet_index.select("style", "Techno")
+    assert facet_index.mask().tolist() == [True, False, False]
+
+
+@pytest.mark.parametrize("suffix", ["", "-wal"])
+def test_a_snapshot_is_rejected_once_the_database_or_its_wal_changes(db_path, tracks, suffix):
+    if suffix:
+        with open(db_path + suffix, "wb") as wal:
+            wal.write(b"wal")
+    assert save(db_path, tracks)
+
+    with open(db_path + suffix, "ab") as f:
+        f.write(b"more")
+    assert CatalogueSnapshot(db_path).load() is None
+
+
+def test_a_snapshot_is_rejected_when_only_the_mtime_changes(db_path, tracks):
+    assert save(db_path, tracks)
+
+    os.utime(db_path, ns=(2_000_000_000, 2_000_000_000))
+
+    assert CatalogueSnapshot(db_path).load() is None
+
+
+def test_permutations_are_not_added_once_the_database_changed(db_path, tracks):
+    assert save(db_path, tracks)
+    snapshot = CatalogueSnapshot(db_path)
+    assert snapshot.save_permutations({("track_title", False): np.array([2, 1, 0])})
+    assert snapshot.load().permutations[("track_title", False)].tolist() == [2, 1, 0]
+
+    os.utime(db_path, ns=(2_000_000_000, 2_000_000_000))
+
+    assert not snapshot.save_permutations({("year", True): np.array([2, 0, 1])})
+    os.utime(db_path, ns=(1_000_000_000, 1_000_000_000))
+    assert set(snapshot.load().permutations) == {("track_title", False)}
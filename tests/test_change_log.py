@@ -0,0 +1,176 @@
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from db import change_log
+from db.db_reader import MusicCatalogDB_2
+
+SCHEMA = """
+CREATE TABLE releases (release_id INTEGER PRIMARY KEY, title TEXT, label TEXT, discogs_id INTEGER);
+CREATE TABLE tracks (track_id INTEGER PRIMARY KEY, release_id INTEGER, track_title TEXT, track_number INTEGER);
+CREATE TABLE files (file_id INTEGER PRIMARY KEY, track_id INTEGER, file_location TEXT);
+CREATE VIEW uber_tracks AS
+    SELECT t.track_id, t.track_title, t.track_number, r.release_id, r.title AS album_title, r.label, r.discogs_id,
+           f.file_id, f.file_location
+    FROM tracks t JOIN releases r ON r.release_id = t.release_id JOIN files f ON f.track_id = t.track_id;
+"""
+
+
+@pytest.fixture(autouse=True)
+def change_log_enabled(db_config):
+    db_config(change_log=True)
+    return db_config
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "library.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO releases VALUES (1, 'Album', 'Label A', 100)")
+    conn.executemany("INSERT INTO tracks VALUES (?, 1, ?, ?)", [(1, "One", 1), (2, "Two", 2)])
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?)", [(11, 1, "/music/1.flac"), (12, 2, "/music/2.flac")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def catalogue(db_path):
+    db = MusicCatalogDB_2(db_path)
+    assert db.load(use_snapshot=False)
+    yield db
+    db.close()
+
+
+def write(db_path, *statements):
+    conn = sqlite3.connect(db_path)
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def titles(catalogue):
+    return [track.track_title for track in catalogue.get_all_tracks()]
+
+
+def test_triggers_log_changes_to_the_base_tables_of_the_view(db_path, catalogue):
+    write(db_path, "UPDATE tracks SET track_title = 'Uno' WHERE track_id = 1", "DELETE FROM files WHERE file_id = 12")
+
+    conn = sqlite3.connect(db_path)
+    assert change_log.view_base_tables(conn) == ["files", "releases", "tracks"]
+    assert [(table, row_id, op) for _, table, row_id, _, op in change_log.changes_since(conn, 0)] == [("tracks", 1, "U"), ("tracks", 1, "U"), ("files", 12, "D")]
+    conn.close()
+
+
+def test_refresh_applies_updates_inserts_and_deletes_in_place(db_path, catalogue):
+    write(
+        db_path,
+        "UPDATE tracks SET track_title = 'Uno' WHERE track_id = 1",
+        "INSERT INTO tracks VALUES (3, 1, 'Three', 3)",
+        "INSERT INTO files VALUES (13, 3, '/music/3.flac')",
+        "DELETE FROM files WHERE file_id = 12",
+    )
+
+    assert catalogue.refresh()
+    assert titles(catalogue) == ["Uno", "Three"]
+    assert catalogue.get_track_by_path("/music/2.flac") is None
+    assert catalogue.refresh() is False
+
+
+def test_refresh_updates_the_tracks_of_a_changed_release(db_path, catalogue):
+    write(db_path, "UPDATE releases SET label = 'Label B' WHERE release_id = 1")
+
+    assert catalogue.refresh()
+    assert {track.label for track in catalogue.get_all_tracks()} == {"Label B"}
+    assert catalogue.get_labels_and_releases() == {"Label B": {100}}
+
+
+def test_apply_changes_keeps_positions_and_relinks_releases(catalogue):
+    first, second = catalogue.get_all_tracks()
+    moved = replace(first, track_title="Uno", discogs_id=200, label="Label B")
+
+    catalogue.apply_changes([moved], {second.track_id})
+
+    assert titles(catalogue) == ["Uno"]
+    assert catalogue.get_labels_and_releases() == {"Label B": {200}}
+
+
+def test_applied_changes_are_pruned_but_the_mark_is_kept(db_path, catalogue):
+    write(db_path, "UPDATE tracks SET track_title = 'Uno' WHERE track_id = 1", "UPDATE tracks SET track_title = 'Dos' WHERE track_id = 2")
+    assert catalogue.refresh()
+
+    catalogue.prune_change_log()
+
+    conn = sqlite3.connect(db_path)
+    assert [seq for seq, *_ in change_log.changes_since(conn, 0)] == [change_log.high_water_mark(conn)]
+    conn.close()
+    assert catalogue.refresh() is False
+
+
+def test_a_reader_behind_a_prune_reloads_in_full(db_path, catalogue):
+    ahead = MusicCatalogDB_2(db_path)
+    assert ahead.load(use_snapshot=False)
+    write(db_path, "UPDATE tracks SET track_title = 'Uno' WHERE track_id = 1", "UPDATE tracks SET track_title = 'Dos' WHERE track_id = 2")
+    assert ahead.refresh()
+    ahead.prune_change_log()
+    ahead.close()
+
+    assert catalogue.refresh()
+    assert titles(catalogue) == ["Uno", "Dos"]
+
+
+def test_nothing_is_written_to_the_database_unless_the_change_log_is_enabled(db_path, change_log_enabled):
+    change_log_enabled(change_log=False)
+    db = MusicCatalogDB_2(db_path)
+
+    assert db.load(use_snapshot=False)
+    write(db_path, "UPDATE tracks SET track_title = 'Uno' WHERE track_id = 1")
+    assert db.refresh()
+    assert titles(db) == ["Uno", "Two"]
+    db.close()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'changes%'").fetchall() == []
+    conn.close()
+
+
+MEDIA_SCHEMA = """
+CREATE TABLE releases (release_id INTEGER PRIMARY KEY, title TEXT, label TEXT, discogs_id INTEGER);
+CREATE TABLE tracks (track_id INTEGER PRIMARY KEY, release_id INTEGER, track_title TEXT, track_number INTEGER);
+CREATE TABLE digital_media (release_id INTEGER, track_number INTEGER, file_location TEXT, PRIMARY KEY(release_id, track_number, file_location));
+CREATE VIEW uber_tracks AS
+    SELECT t.track_id, t.track_title, t.track_number, r.release_id, r.title AS album_title, r.label, r.discogs_id,
+           t.track_id AS file_id, d.file_location
+    FROM tracks t JOIN releases r ON r.release_id = t.release_id
+    JOIN digital_media d ON d.release_id = t.release_id AND d.track_number = t.track_number;
+"""
+
+
+def test_digital_media_changes_are_applied_by_file_location(tmp_path):
+    path = str(tmp_path / "media.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(MEDIA_SCHEMA)
+    conn.execute("INSERT INTO releases VALUES (1, 'Album', 'Label A', 100)")
+    conn.executemany("INSERT INTO tracks VALUES (?, 1, ?, ?)", [(1, "One", 1), (2, "Two", 2), (3, "Three", 3)])
+    conn.executemany("INSERT INTO digital_media VALUES (1, ?, ?)", [(1, "/music/1.flac"), (2, "/music/2.flac"), (3, "/music/3.flac")])
+    conn.commit()
+    conn.close()
+    db = MusicCatalogDB_2(path)
+    assert db.load(use_snapshot=False)
+    untouched = db.get_all_tracks()[2]
+
+    # A moved file and a deleted file, as the library scanner writes them
+    write(path, "UPDATE digital_media SET file_location = '/moved/1.flac' WHERE track_number = 1", "DELETE FROM digital_media WHERE track_number = 2")
+    conn = sqlite3.connect(path)
+    assert change_log.view_key_columns(conn)["digital_media"] == "file_location"
+    conn.close()
+
+    assert db.refresh()
+    assert [track.file_location for track in db.get_all_tracks()] == ["/moved/1.flac", "/music/3.flac"]
+    # Applied in place rather than by a full reload
+    assert db.get_all_tracks()[1] is untouched
+    assert db.get_track_by_path("/music/2.flac") is None
+    db.close()
@@ -0,0 +1,98 @@
+import errno
+import os
+
+import pytest
+
+from file_operations import copy_engine
+from file_operations.copy_engine import PARTIAL_SUFFIX, CopyCancelled, CopyEngine, CopyJob, copy_file, plan_copy
+
+DATA = bytes(range(256)) * 1024  # 256 KB
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(copy_engine, "CHUNK_BYTES", 16 * 1024)
+    monkeypatch.setattr(copy_engine, "BUFFER_BYTES", 16 * 1024)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.wav"
+    path.write_bytes(DATA)
+    os.utime(path, (1_000_000, 1_000_000))
+    return str(path)
+
+
+def test_a_copy_keeps_data_and_times_and_leaves_no_partial_file(tmp_path, source, small_chunks):
+    target = str(tmp_path / "target.wav")
+    chunks = []
+
+    assert copy_file(source, target, on_bytes=chunks.append) == len(DATA)
+
+    assert open(target, "rb").read() == DATA
+    assert os.stat(target).st_mtime == 1_000_000
+    assert sum(chunks) == len(DATA) and len(chunks) > 1
+    assert not os.path.exists(target + PARTIAL_SUFFIX)
+
+
+def test_buffered_copy_when_the_kernel_cannot_copy(tmp_path, source, small_chunks, monkeypatch):
+    def unsupported(*args):
+        raise OSError(errno.ENOSYS, "not supported")
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    target = str(tmp_path / "target.wav")
+
+    assert copy_file(source, target) == len(DATA)
+    assert open(target, "rb").read() == DATA
+
+
+def test_a_cancelled_copy_removes_the_partial_file_and_writes_no_target(tmp_path, source, small_chunks):
+    target = str(tmp_path / "target.wav")
+    chunks = []
+
+    with pytest.raises(CopyCancelled):
+        copy_file(source, target, on_bytes=chunks.append, should_stop=lambda: len(chunks) >= 2)
+
+    assert len(chunks) == 2
+    assert os.listdir(tmp_path) == ["source.wav"]
+
+
+def test_an_existing_target_is_kept_until_the_copy_is_complete(tmp_path, source, small_chunks):
+    target = tmp_path / "target.wav"
+    target.write_bytes(b"old")
+
+    with pytest.raises(CopyCancelled):
+        copy_file(source, str(target), should_stop=lambda: True)
+    assert target.read_bytes() == b"old"
+
+    copy_file(source, str(target))
+    assert target.read_bytes() == DATA
+
+
+def test_plan_copy_lists_files_and_folders_as_copytree_would(tmp_path, source):
+    folder = tmp_path / "Album"
+    (folder / "Disc 1").mkdir(parents=True)
+    (folder / "Empty").mkdir()
+    (folder / "Disc 1" / "01.wav").write_bytes(b"12345")
+    target_dir = str(tmp_path / "out")
+
+    jobs, directories = plan_copy([source, str(folder), str(tmp_path / "missing.wav")], target_dir)
+
+    assert sorted((os.path.relpath(job.target, target_dir), job.size) for job in jobs) == [(os.path.join("Album", "Disc 1", "01.wav"), 5), ("source.wav", len(DATA))]
+    assert sorted(os.path.relpath(directory, target_dir) for directory in directories) == ["Album", os.path.join("Album", "Disc 1"), os.path.join("Album", "Empty")]
+
+
+def test_the_engine_reports_failures_and_stops_on_cancel(tmp_path, source, small_chunks):
+    jobs = [CopyJob(source, str(tmp_path / "out" / "a.wav"), len(DATA)), CopyJob(str(tmp_path / "missing.wav"), str(tmp_path / "out" / "b.wav"), 0)]
+
+    result = CopyEngine(workers=2).run(jobs, [str(tmp_path / "out" / "empty")])
+    assert (result.copied, result.bytes, result.cancelled) == (1, len(DATA), False)
+    assert [file for file, _ in result.failed] == [str(tmp_path / "missing.wav")]
+    assert sorted(os.listdir(tmp_path / "out")) == ["a.wav", "empty"]
+
+    engine = CopyEngine(workers=1)
+    engine.cancel()
+    cancelled = engine.run([CopyJob(source, str(tmp_path / "out" / "c.wav"), len(DATA))])
+    assert (cancelled.copied, cancelled.cancelled) == (0, True)
+    assert not os.path.exists(tmp_path / "out" / "c.wav")
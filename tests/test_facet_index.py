@@ -0,0 +1,63 @@
+import numpy as np
+
+from db.facet_index import FacetIndex, combine_masks
+from tests.test_track_sorting import make_track
+
+TRACKS = [
+    make_track(0, genre="Electronic", style="House, Techno", year=1995, country="UK", format="Vinyl"),
+    make_track(1, genre="Electronic", style="Techno", year=1996, country="Germany", format="Vinyl"),
+    make_track(2, genre="Electronic, Hip Hop", style="Trip Hop", year=1995, country="UK", format="CD"),
+    make_track(3, genre="Jazz", style="", year=None, country="US", format="Vinyl"),
+]
+
+
+def test_values_are_split_sorted_and_skip_empty_values():
+    index = FacetIndex(TRACKS)
+
+    assert index.values("genre") == ["Electronic", "Hip Hop", "Jazz"]
+    assert index.values("style") == ["House", "Techno", "Trip Hop"]
+    assert index.values("year") == ["1995", "1996"]
+    assert index.bitsets("style")["Techno"].tolist() == [True, True, False, False]
+
+
+def test_selection_ors_within_a_facet_and_ands_across_facets():
+    index = FacetIndex(TRACKS)
+    assert index.mask() is None
+
+    index.select("style", "House")
+    index.select("style", "Trip Hop")
+    assert index.mask().tolist() == [True, False, True, False]
+
+    index.select("format", "Vinyl")
+    assert index.mask().tolist() == [True, False, False, False]
+
+    index.select("format", "Vinyl", selected=False)
+    index.clear(["style"])
+    assert not index.is_active()
+
+
+def test_counts_apply_the_other_facets_and_the_base_mask():
+    index = FacetIndex(TRACKS)
+    index.select("country", "UK")
+
+    # The country selection does not narrow its own counts
+    assert index.counts("country") == {"Germany": 1, "UK": 2, "US": 1}
+    assert index.counts("format") == {"CD": 1, "Vinyl": 1}
+    assert index.counts("format", base_mask=np.array([False, False, True, True])) == {"CD": 1, "Vinyl": 0}
+
+
+def test_from_bitsets_restores_an_index_without_the_tracks():
+    built = FacetIndex(TRACKS)
+    restored = FacetIndex.from_bitsets(built.size, {facet: built.bitsets(facet) for facet in ("genre", "style")})
+
+    assert restored.values("genre") == built.values("genre")
+    assert restored.values("year") == []
+    restored.select("genre", "Hip Hop")
+    assert restored.mask().tolist() == [False, False, True, False]
+
+
+def test_combine_masks_treats_none_as_all_tracks():
+    mask = np.array([True, False])
+    assert combine_masks(None, None) is None
+    assert combine_masks(mask, None) is mask
+    assert combine_masks(mask, np.array([True, True])).tolist() == [True, False]
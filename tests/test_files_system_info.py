@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from file_operations.files_system_info import DirStats, DirStatsCache, count_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "music"
+    (root / "Album" / "Disc 1").mkdir(parents=True)
+    (root / "Empty").mkdir()
+    (root / "Album" / "01.wav").write_bytes(b"x" * 100)
+    (root / "Album" / "Disc 1" / "01.flac").write_bytes(b"x" * 50)
+    (root / "Album" / "cover.jpg").write_bytes(b"x" * 10)
+    (root / "notes.txt").write_bytes(b"x" * 5)
+    return root
+
+
+# The root, Album, Disc 1 and Empty; 01.wav and 01.flac are the audio files
+EXPECTED = DirStats(files=4, dirs=4, audio_files=2, audio_bytes=150, all_bytes=165)
+
+
+def test_files_and_folders_are_counted_once_even_if_nested(tree):
+    paths = [str(tree), str(tree / "Album"), str(tree / "Album" / "01.wav"), str(tree / "Album" / "Disc 1") + os.sep, str(tree / "missing")]
+
+    assert count_files(paths, cache=DirStatsCache()) == EXPECTED
+
+
+def test_a_file_and_a_sibling_folder_are_both_counted(tree):
+    stats = count_files([str(tree / "notes.txt"), str(tree / "Album")], cache=DirStatsCache())
+
+    assert stats == DirStats(files=4, dirs=2, audio_files=2, audio_bytes=150, all_bytes=165)
+
+
+def test_a_prefix_of_a_folder_name_is_not_a_parent(tmp_path):
+    (tmp_path / "Album").mkdir()
+    (tmp_path / "Album 2").mkdir()
+    (tmp_path / "Album 2" / "01.mp3").write_bytes(b"x" * 7)
+
+    stats = count_files([str(tmp_path / "Album"), str(tmp_path / "Album 2")], cache=DirStatsCache())
+
+    assert (stats.dirs, stats.audio_files) == (2, 1)
+
+
+def test_unchanged_folders_are_read_from_the_cache(tree, monkeypatch):
+    cache = DirStatsCache()
+    assert count_files([str(tree)], cache=cache) == EXPECTED
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: listed.append(path) or scandir(path))
+    assert count_files([str(tree)], cache=cache) == EXPECTED
+    assert listed == []
+
+    (tree / "Album" / "Disc 1" / "02.flac").write_bytes(b"x" * 20)
+    stats = count_files([str(tree)], cache=cache)
+    assert listed == [str(tree / "Album" / "Disc 1")]
+    assert (stats.files, stats.audio_bytes) == (5, 170)
+
+
+def test_the_cache_keeps_the_most_recent_folders(tree):
+    cache = DirStatsCache(max_dirs=2)
+    count_files([str(tree)], cache=cache)
+
+    assert len(cache._dirs) == 2
+
+
+def test_a_stopped_count_returns_partial_totals(tree):
+    stats = count_files([str(tree)], should_stop=lambda: True, cache=DirStatsCache())
+
+    assert stats.dirs <= EXPECTED.dirs and stats.files <= EXPECTED.files
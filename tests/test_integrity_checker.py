@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import pytest
+
+from file_operations.integrity_checker import MISSING, MOVED, OK, SIZE_CHANGED, FileStatus, IntegrityChecker, load_file_status
+
+
+@pytest.fixture
+def library(tmp_path):
+    for folder, names in {"Album A": ["01.flac", "02.flac", "03.flac"], "Album B": ["01.flac"]}.items():
+        (tmp_path / "library" / folder).mkdir(parents=True)
+        for number, name in enumerate(names, start=1):
+            (tmp_path / "library" / folder / name).write_bytes(b"x" * number)
+    return tmp_path / "library", str(tmp_path / "catalogue.db")
+
+
+def files(library):
+    root = library[0]
+    return [(1, str(root / "Album A" / "01.flac")), (2, str(root / "Album A" / "02.flac")), (3, str(root / "Album A" / "03.flac")), (4, str(root / "Album B" / "01.flac"))]
+
+
+def test_present_deleted_and_moved_files_are_classified(library):
+    root, db_path = library
+    IntegrityChecker(db_path).check(files(library))
+
+    os.remove(root / "Album A" / "02.flac")
+    (root / "Album A (2019)").mkdir()
+    os.rename(root / "Album A" / "03.flac", root / "Album A (2019)" / "03.flac")
+    statuses = IntegrityChecker(db_path).check(files(library))
+
+    assert statuses[1] == FileStatus(OK, 1)
+    assert statuses[2] == FileStatus(MISSING, 2)
+    assert statuses[3] == FileStatus(MOVED, 3, str(root / "Album A (2019)" / "03.flac"))
+    assert statuses[4] == FileStatus(OK, 1)
+    conn = sqlite3.connect(db_path)
+    assert load_file_status(conn) == statuses
+    conn.close()
+
+
+def test_a_file_moved_up_to_the_parent_folder_is_found(library):
+    root, db_path = library
+    os.rename(root / "Album A" / "03.flac", root / "03.flac")
+
+    assert IntegrityChecker(db_path).check(files(library))[3] == FileStatus(MOVED, None, str(root / "03.flac"))
+
+
+def test_catalogued_files_and_files_of_another_size_are_not_taken_for_moved_ones(library):
+    root, db_path = library
+    IntegrityChecker(db_path).check(files(library))
+
+    # Album B/01.flac is catalogued itself, and the stray 02.flac is not the size first recorded for Album A/02.flac
+    os.remove(root / "Album A" / "01.flac")
+    os.remove(root / "Album A" / "02.flac")
+    (root / "Album B" / "02.flac").write_bytes(b"x" * 5)
+    statuses = IntegrityChecker(db_path).check(files(library))
+
+    assert statuses[1] == FileStatus(MISSING, 1)
+    assert statuses[2] == FileStatus(MISSING, 2)
+
+
+def test_a_file_whose_size_changed_since_it_was_first_found_is_reported(library):
+    root, db_path = library
+    IntegrityChecker(db_path).check(files(library))
+
+    (root / "Album B" / "01.flac").write_bytes(b"longer")
+
+    assert IntegrityChecker(db_path).check(files(library))[4] == FileStatus(SIZE_CHANGED, 1)
+
+
+def test_a_stopped_check_writes_nothing(library):
+    _, db_path = library
+
+    assert IntegrityChecker(db_path).check(files(library), should_stop=lambda: True) == {}
+    conn = sqlite3.connect(db_path)
+    assert load_file_status(conn) == {}
+    conn.close()
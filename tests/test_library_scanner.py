@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import wave
+
+import pytest
+
+taglib = pytest.importorskip("taglib")
+
+from db.db_manager import create_tables
+from file_operations.library_scanner import LibraryScanner
+
+
+def write_wav(path, **tags):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(8000)
+        audio.writeframes(b"\0\0" * 800)
+    with taglib.File(path) as file:
+        file.tags = {name.upper(): [value] for name, value in tags.items()}
+        file.save()
+
+
+def write_release(folder, discogs_id, titles):
+    for number, title in enumerate(titles, start=1):
+        write_wav(os.path.join(folder, f"{number:02} {title}.wav"), title=title, tracknumber=str(number), discogs_release_id=str(discogs_id), album="Album")
+
+
+def rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(conn.execute(sql).fetchall())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / "library"
+    write_release(str(root / "Album [WAV]"), 123, ["One", "Two"])
+    write_release(str(root / "Album [MP3 copy]"), 123, ["One", "Two"])
+    return str(root), str(tmp_path / "library.db")
+
+
+def test_copies_of_a_release_keep_their_own_rows(library):
+    root, db_path = library
+
+    result = LibraryScanner(db_path, workers=2).scan(root)
+
+    assert (result.files, result.releases) == (4, 2)
+    assert len(rows(db_path, "SELECT file_location FROM digital_media")) == 4
+    assert rows(db_path, "SELECT release_id, track_number, name FROM tracks") == [(123, 1, "One"), (123, 2, "Two")]
+
+
+def test_rescans_are_idempotent(library):
+    root, db_path = library
+    LibraryScanner(db_path, workers=2).scan(root)
+    before = rows(db_path, "SELECT rowid, * FROM digital_media")
+
+    incremental = LibraryScanner(db_path, workers=2).scan(root)
+    assert (incremental.files, incremental.unchanged, incremental.moved, incremental.deleted) == (0, 4, 0, 0)
+    assert rows(db_path, "SELECT rowid, * FROM digital_media") == before
+
+    full = LibraryScanner(db_path, workers=2).scan(root, full=True)
+    assert full.files == 4
+    assert rows(db_path, "SELECT * FROM digital_media") == sorted(row[1:] for row in before)
+    assert len(rows(db_path, "SELECT * FROM tracks")) == 2
+
+
+def test_deleting_one_copy_keeps_the_tracks_of_the_other(library):
+    root, db_path = library
+    LibraryScanner(db_path, workers=2).scan(root)
+
+    for name in os.listdir(os.path.join(root, "Album [MP3 copy]")):
+        os.remove(os.path.join(root, "Album [MP3 copy]", name))
+    assert LibraryScanner(db_path, workers=2).scan(root).deleted == 2
+    assert {row[0] for row in rows(db_path, "SELECT file_path FROM digital_media")} == {os.path.join(root, "Album [WAV]")}
+    assert len(rows(db_path, "SELECT * FROM tracks")) == 2
+
+    for name in os.listdir(os.path.join(root, "Album [WAV]")):
+        os.remove(os.path.join(root, "Album [WAV]", name))
+    assert LibraryScanner(db_path, workers=2).scan(root).deleted == 2
+    assert rows(db_path, "SELECT * FROM tracks") == []
+
+
+def test_tables_keyed_on_the_track_only_are_rekeyed_keeping_rowids_and_views(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE digital_media (release_id INTEGER, track_name TEXT, track_artist TEXT, track_number INTEGER, file_path TEXT, file_name TEXT, "
+        "file_location TEXT, file_size INTEGER, media_type INTEGER, PRIMARY KEY(release_id, track_number))"
+    )
+    conn.execute("CREATE VIEW files AS SELECT rowid AS file_id, file_location FROM digital_media")
+    conn.execute("INSERT INTO digital_media (rowid, release_id, track_number, file_location) VALUES (7, 123, 1, '/a/1.wav')")
+    conn.commit()
+
+    create_tables(conn)
+    conn.execute("INSERT INTO digital_media (release_id, track_number, file_location) VALUES (123, 1, '/b/1.wav')")
+
+    assert conn.execute("SELECT file_id, file_location FROM files ORDER BY file_id").fetchall() == [(7, "/a/1.wav"), (8, "/b/1.wav")]
+    assert {row[1] for row in conn.execute("PRAGMA table_info(digital_media)")} >= {"file_mtime_ns", "file_inode"}
+    conn.close()
+
+
+def test_moved_hard_links_sharing_a_fingerprint_are_all_moved(tmp_path):
+    root = tmp_path / "library"
+    write_release(str(root / "Album"), 123, ["One"])
+    first = str(root / "Album" / "01 One.wav")
+    os.link(first, str(root / "Album" / "02 One again.wav"))
+    db_path = str(tmp_path / "library.db")
+    LibraryScanner(db_path, workers=2).scan(str(root))
+
+    os.rename(str(root / "Album"), str(root / "Album (moved)"))
+    result = LibraryScanner(db_path, workers=2).scan(str(root))
+
+    assert (result.files, result.moved, result.deleted) == (0, 2, 0)
+    assert rows(db_path, "SELECT file_name, file_path FROM digital_media") == [
+        ("01 One.wav", str(root / "Album (moved)")),
+        ("02 One again.wav", str(root / "Album (moved)")),
+    ]
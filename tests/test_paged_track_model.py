@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+from ui.paged_track_model import PagedTrackTableModel
+
+
+@pytest.fixture
+def model(tmp_path):
+    db_path = str(tmp_path / "catalogue.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE uber_tracks (track_id, track_title, year, file_id)")
+    conn.executemany("INSERT INTO uber_tracks VALUES (?, ?, ?, ?)", [(i, f"Track {i}", 1990 + i % 7, i) for i in range(1, 101)])
+    conn.commit()
+    conn.close()
+
+    paged = PagedTrackTableModel(db_path, ["Title", "Year"], ["track_title", "year"], page_size=4, max_pages=3, max_page_keys=5)
+    yield paged
+    paged.close()
+
+
+def test_rows_are_read_in_query_order_with_bounded_pages_and_keys(model):
+    assert model.rowCount() == 100
+
+    assert [model.track_at(row).track_id for row in range(100)] == list(range(1, 101))
+    assert len(model._pages) <= 3
+    assert list(model._page_keys) == [20, 21, 22, 23, 24]
+
+
+def test_sorting_pages_by_keyset_and_dropping_rows_past_the_end(model):
+    model.sort(1)
+    expected = sorted(range(1, 101), key=lambda track_id: (1990 + track_id % 7, track_id))
+
+    assert [model.track_at(row).track_id for row in range(100)] == expected
+    assert model.track_at(100) is None
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from file_operations.repackage_plan import UNKNOWN_LABEL, execute_plan, plan_repackage
+from tests.test_library_scanner import write_wav
+
+
+@pytest.fixture
+def folders(tmp_path):
+    source, target = tmp_path / "incoming", tmp_path / "labels"
+    write_wav(str(source / "a.wav"), label="Warp")
+    write_wav(str(source / "b.wav"), label="Warp")
+    write_wav(str(source / "c.wav"), title="No label")
+    write_wav(str(source / "sub" / "b.wav"), label="Warp")
+    (source / "notes.txt").write_text("not audio")
+    write_wav(str(target / "Warp" / "b.wav"), label="Warp")
+    return str(source), str(target)
+
+
+def test_the_plan_flags_existing_targets_and_skips_clashing_moves(folders):
+    source, target = folders
+
+    plan = plan_repackage(["a.wav", "b.wav", "c.wav", os.path.join("sub", "b.wav"), "notes.txt", "sub"], source, target)
+
+    moves = {os.path.relpath(move.source, source): move for move in plan.moves}
+    assert set(moves) == {"a.wav", "b.wav", "c.wav"}
+    assert moves["a.wav"].target == os.path.join(target, "Warp", "a.wav")
+    assert moves["c.wav"].label == UNKNOWN_LABEL
+    assert [os.path.relpath(move.source, source) for move in plan.conflicts] == ["b.wav"]
+    assert all(move.same_device for move in plan.moves)
+    assert sorted(os.path.relpath(file, source) for file, _ in plan.skipped) == ["notes.txt", os.path.join("sub", "b.wav")]
+
+
+def test_conflicts_are_skipped_unless_overwritten(folders):
+    source, target = folders
+    plan = plan_repackage(["a.wav", "b.wav"], source, target)
+
+    skipped = execute_plan(plan, overwrite=False)
+    assert (skipped.moved, skipped.overwritten, skipped.skipped, skipped.failed) == (1, 0, 1, [])
+    assert os.path.exists(os.path.join(source, "b.wav"))
+
+    overwritten = execute_plan(plan_repackage(["b.wav"], source, target), overwrite=True)
+    assert (overwritten.moved, overwritten.overwritten) == (1, 1)
+    assert not os.path.exists(os.path.join(source, "b.wav"))
+
+
+def test_failed_and_stopped_moves_are_reported(folders):
+    source, target = folders
+    plan = plan_repackage(["a.wav", "c.wav"], source, target)
+    os.remove(os.path.join(source, "a.wav"))
+
+    result = execute_plan(plan)
+    assert [os.path.basename(file) for file, _ in result.failed] == ["a.wav"]
+    assert result.moved == 1
+
+    stopped = execute_plan(plan_repackage(["b.wav"], source, target), overwrite=True, should_stop=lambda: True)
+    assert (stopped.moved, stopped.skipped) == (0, 1)
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from file_operations.tag_index import IndexedFile, TagIndex, TagIndexer, match_expression
+from tests.test_library_scanner import write_wav
+from ui.tag_search_box import SearchResultsModel
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("aphex", '"aphex"*'),
+        ("label:warp aphex", 'label : "warp"* AND "aphex"*'),
+        ("LABEL:Warp", 'label : "Warp"*'),
+        ("nosuchcolumn:warp", '"nosuchcolumn:warp"*'),
+        ("title:", '"title:"*'),
+        ('"selected ambient" works', '"selected ambient"* AND "works"*'),
+        ('say "hi', '"say"* AND """hi"*'),
+        ("", ""),
+    ],
+)
+def test_match_expression(text, expected):
+    assert match_expression(text) == expected
+
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / "library"
+    write_wav(str(root / "Warp" / "01 Xtal.wav"), artist="Aphex Twin", title="Xtal", label="Warp")
+    write_wav(str(root / "Warp" / "02 Tha.wav"), artist="Aphex Twin", title="Tha", label="Warp")
+    write_wav(str(root / "Ninja" / "01 Bug.wav"), artist="Coldcut", title="Bug", label="Ninja Tune")
+    return str(root), str(tmp_path / "tag_index.db")
+
+
+def search(db_path, text):
+    index = TagIndex(db_path)
+    try:
+        return [os.path.basename(file.path) for file in index.search(text)]
+    finally:
+        index.close()
+
+
+def test_a_crawl_indexes_changed_files_and_removes_deleted_ones(library):
+    root, db_path = library
+    first = TagIndexer(db_path).crawl([root])
+    assert (first.files, first.indexed, first.completed) == (3, 3, True)
+    assert search(db_path, "label:warp") == ["01 Xtal.wav", "02 Tha.wav"]
+
+    os.remove(os.path.join(root, "Warp", "02 Tha.wav"))
+    second = TagIndexer(db_path).crawl([root])
+
+    assert (second.files, second.indexed, second.unchanged, second.deleted) == (2, 0, 2, 1)
+    assert search(db_path, "aphex") == ["01 Xtal.wav"]
+
+
+def test_a_stopped_crawl_keeps_the_files_it_did_not_see(library):
+    root, db_path = library
+    TagIndexer(db_path).crawl([root])
+    os.remove(os.path.join(root, "Ninja", "01 Bug.wav"))
+
+    stopped = TagIndexer(db_path).crawl([root], should_stop=lambda: True)
+
+    assert (stopped.completed, stopped.deleted) == (False, 0)
+    assert search(db_path, "coldcut") == ["01 Bug.wav"]
+
+
+def test_results_without_a_common_folder_show_their_full_folder(monkeypatch):
+    files = [IndexedFile("C:/music/a.wav", "", "", "", "", ""), IndexedFile("D:/music/b.wav", "", "", "", "", "")]
+
+    def no_common_path(paths):
+        raise ValueError("Paths don't have the same drive")
+
+    monkeypatch.setattr(os.path, "commonpath", no_common_path)
+    model = SearchResultsModel(files)
+
+    assert model.rootPath() == ""
+    assert [model.item(row, 5).text() for row in range(2)] == ["C:/music", "D:/music"]
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from db.db_reader import MusicCatalogDB_2, Track, natural_sort_key, sort_key
+
+
+def make_track(track_id: int, **values) -> Track:
+    fields = dict(
+        catalog_number="",
+        label="",
+        album_title="",
+        disc_number=0,
+        track_artist="",
+        track_title="",
+        format="",
+        track_number=0,
+        discogs_id=None,
+        year=0,
+        country="",
+        discogs_url="",
+        album_artist="",
+        file_location="",
+        style="",
+        genre="",
+        file_id=track_id,
+    )
+    fields.update(values)
+    return Track(track_id=track_id, **fields)
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    db = MusicCatalogDB_2(str(tmp_path / "catalogue.db"))
+    yield db
+    db.close()
+
+
+def test_natural_sort_key_orders_digit_runs_numerically():
+    values = ["CAT 10", "cat 9", "CAT 100", "CAT 9a", "A2", "A10", "B1", None]
+    assert sorted(values, key=natural_sort_key) == [None, "A2", "A10", "B1", "cat 9", "CAT 9a", "CAT 10", "CAT 100"]
+
+
+def test_sort_key_orders_numbers_before_text_before_none():
+    assert sorted(["b", None, 3, "A", 1.5], key=sort_key) == [1.5, 3, "A", "b", None]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_sort_permutation_matches_a_stable_python_sort(catalogue, descending):
+    rng = random.Random(7)
+    tracks = [make_track(i, catalog_number=f"CAT {rng.randint(1, 12)}", year=rng.choice([1995, 2001, None, "2001"])) for i in range(500)]
+    catalogue.add_tracks(tracks)
+
+    for attr, key_fn in (("catalog_number", natural_sort_key), ("year", sort_key)):
+        expected = sorted(range(len(tracks)), key=lambda position: key_fn(getattr(tracks[position], attr)), reverse=descending)
+        assert catalogue.get_sort_permutation(attr, descending).tolist() == expected
+
+
+def test_sort_permutation_keeps_load_order_of_equal_keys(catalogue):
+    catalogue.add_tracks([make_track(i, label="Same" if i % 2 else "Other") for i in range(10)])
+
+    assert catalogue.get_sort_permutation("label").tolist() == [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+    assert catalogue.get_sort_permutation("label", descending=True).tolist() == [1, 3, 5, 7, 9, 0, 2, 4, 6, 8]
+
+
+def test_sort_permutation_is_cached_until_tracks_change(catalogue):
+    catalogue.add_tracks([make_track(i, track_title=title) for i, title in enumerate(["b", "a"])])
+    first = catalogue.get_sort_permutation("track_title")
+    assert catalogue.get_sort_permutation("track_title") is first
+
+    catalogue.add_tracks([make_track(2, track_title="0")])
+    assert catalogue.get_sort_permutation("track_title").tolist() == [2, 1, 0]
+
+
+def test_base_track_model_cannot_be_used_without_track_at():
+    from ui.track_table_model import BaseTrackTableModel
+
+    with pytest.raises(TypeError):
+        BaseTrackTableModel(["Title"], ["track_title"])